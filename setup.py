@@ -57,6 +57,7 @@ setup(
     entry_points={
         "console_scripts": [
             "gui-dtgen=main:main",
+            "dtgen-kconfig=kconfig_cli:main",
         ],
     },
     include_package_data=True,
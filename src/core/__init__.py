@@ -2,5 +2,22 @@
 
 from .processor import DeviceTreeProcessor
 from .validator import ImageValidator
+from .fdt import FlattenedDeviceTree, split_dtbs, parse_dt_table
+from .fdt_overlay import DeviceTreeIndex, apply_overlay, resolve_board_variants
+from .kernel import KernelAnalyzer, parse_kernel_config
+from .kconfig_store import KernelConfigStore
+from .extraction_cache import ExtractionCache
+from .fingerprint import FingerprintService
+from .toolchain import ToolchainRegistry, get_toolchain
+from .native_generator import NativeTreeGenerator
+from .image_extraction import ImageExtraction
+from .pipeline import Pipeline, Stage, StageError, StageMemo
+from .batch import BatchProcessor, BatchJob, find_images, plan_workers
 
-__all__ = ['DeviceTreeProcessor', 'ImageValidator']
+__all__ = ['DeviceTreeProcessor', 'ImageValidator',
+           'FlattenedDeviceTree', 'split_dtbs', 'parse_dt_table',
+           'DeviceTreeIndex', 'apply_overlay', 'resolve_board_variants',
+           'KernelAnalyzer', 'parse_kernel_config', 'KernelConfigStore',
+           'ExtractionCache', 'FingerprintService', 'ToolchainRegistry', 'get_toolchain',
+           'NativeTreeGenerator', 'ImageExtraction', 'Pipeline', 'Stage', 'StageError', 'StageMemo',
+           'BatchProcessor', 'BatchJob', 'find_images', 'plan_workers']
@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+Batch Processor - Many images through DeviceTreeProcessor at once
+
+Each image is one job, run by a DeviceTreeProcessor in a worker process
+of a ProcessPoolExecutor: jobs do not share an interpreter (twrpdtgen
+keeps global state and serialises in-process runs), and a crashing job
+takes only its worker down. Every job gets its own work directory and
+its own output directory, output_dir/<image name>, so two images of the
+same device do not overwrite each other. The extraction cache is shared;
+it is safe for concurrent processes.
+
+How many jobs run at once follows from the CPU count, the available
+memory (via psutil when installed) and the free space in the work
+directory, against what a job needs for the largest image.
+
+Workers report status and log lines through a queue; the caller sees
+them as BatchJob updates, together with the throughput so far. Kernel
+configs of the generated devices go to the kernel config store once
+the batch is done, from this process only.
+"""
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, Any, Callable, Iterable, List, Optional
+
+from .kconfig_store import record_results
+from .validator import ImageValidator
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+# Interpreter, twrpdtgen and its imports, before any image data
+JOB_BASE_MEMORY = 256 * 1024 * 1024
+# Mapped image, decompressed ramdisk and the tree held before writing
+JOB_MEMORY_PER_IMAGE_BYTE = 3
+# Extracted input, AIK layout, generated tree and memo entries
+JOB_DISK_PER_IMAGE_BYTE = 4
+JOB_BASE_DISK = 64 * 1024 * 1024
+
+_BOOT_MAGICS = (b'ANDROID!', b'VNDRBOOT')
+
+# Set in each worker by _init_worker
+_events = None
+
+
+def find_images(paths: Iterable[str]) -> List[str]:
+    """
+    Expand files and directories into the images to process.
+    
+    Files are taken as given. Directories are searched recursively for
+    files with an image extension; .img files must be boot, recovery or
+    vendor_boot images, so system.img, super.img and the like in a
+    firmware dump are left out.
+    """
+    images = []
+    seen = set()
+    
+    def add(path: str):
+        path = os.path.abspath(path)
+        if path not in seen:
+            seen.add(path)
+            images.append(path)
+    
+    for path in paths:
+        if not os.path.isdir(path):
+            add(path)
+            continue
+        for root, dirs, names in os.walk(path):
+            dirs.sort()
+            for name in sorted(names):
+                if _is_candidate(os.path.join(root, name)):
+                    add(os.path.join(root, name))
+    return images
+
+
+def _is_candidate(path: str) -> bool:
+    extension = Path(path).suffix.lower()
+    if extension not in ImageValidator.VALID_EXTENSIONS:
+        return False
+    if extension != '.img':
+        return True
+    try:
+        with open(path, 'rb') as f:
+            return f.read(8) in _BOOT_MAGICS
+    except OSError:
+        return False
+
+
+def available_memory() -> Optional[int]:
+    """Bytes of memory available to new processes, or None if unknown."""
+    if psutil is not None:
+        return psutil.virtual_memory().available
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def plan_workers(images: List[str], work_root: Optional[str] = None,
+                 max_workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Pick how many jobs to run at once.
+    
+    Args:
+        images: The images of the batch
+        work_root: Directory the jobs' work directories go to
+        max_workers: Upper bound set by the user
+    
+    Returns:
+        Dict with workers and the limit each resource imposes (cpu,
+        memory, disk; None where unknown)
+    """
+    largest = 0
+    for image in images:
+        try:
+            largest = max(largest, os.path.getsize(image))
+        except OSError:
+            pass
+    
+    limits = {'cpu': os.cpu_count() or 1, 'memory': None, 'disk': None}
+    
+    memory = available_memory()
+    if memory is not None:
+        limits['memory'] = max(1, memory // (JOB_BASE_MEMORY + JOB_MEMORY_PER_IMAGE_BYTE * largest))
+    
+    try:
+        free = shutil.disk_usage(work_root or tempfile.gettempdir()).free
+        limits['disk'] = max(1, free // (JOB_BASE_DISK + JOB_DISK_PER_IMAGE_BYTE * largest))
+    except OSError:
+        pass
+    
+    workers = min(limit for limit in limits.values() if limit is not None)
+    workers = min(workers, max(1, len(images)))
+    if max_workers:
+        workers = min(workers, max_workers)
+    return {
+        'workers': max(1, workers),
+        **limits
+    }
+
+
+class BatchJob:
+    """
+    State of one image in a batch.
+    
+    Attributes:
+        index: Position in the batch
+        image_path: Input image
+        output_dir: Directory the job's tree is written to
+        status: queued, running, done, failed or cancelled
+        progress: 0..1 within the job
+        message: Last progress or log message
+        result: process_image() result once finished
+    """
+    
+    def __init__(self, index: int, image_path: str, output_dir: str):
+        self.index = index
+        self.image_path = image_path
+        self.output_dir = output_dir
+        self.status = 'queued'
+        self.progress = 0.0
+        self.message = ''
+        self.result: Optional[Dict[str, Any]] = None
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+    
+    @property
+    def name(self) -> str:
+        return os.path.basename(self.image_path)
+    
+    @property
+    def duration(self) -> Optional[float]:
+        if self.started is None:
+            return None
+        return (self.finished or time.time()) - self.started
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'index': self.index,
+            'image_path': self.image_path,
+            'output_dir': self.output_dir,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'duration': self.duration,
+            'error': self.result.get('error') if self.result else None,
+            'device_name': self.result.get('device_name') if self.result else None,
+        }
+
+
+def _init_worker(events):
+    global _events
+    _events = events
+
+
+def _emit(index: int, event_type: str, **fields):
+    if _events is not None:
+        _events.put({'job': index, 'type': event_type, **fields})
+
+
+def _run_job(index: int, image_path: str, output_dir: str, work_root: str,
+             options: Dict[str, Any]) -> Dict[str, Any]:
+    """Process one image in a worker process."""
+    from .processor import DeviceTreeProcessor
+    
+    _emit(index, 'started', time=time.time())
+    work_dir = tempfile.mkdtemp(prefix=f"job{index}_", dir=work_root)
+    try:
+        processor = DeviceTreeProcessor(work_root=work_dir)
+        result = processor.process_image(
+            image_path=image_path,
+            output_dir=output_dir,
+            progress_callback=lambda value, message="": _emit(index, 'progress', progress=value,
+                                                               message=message),
+            log_callback=lambda message: _emit(index, 'log', message=message),
+            **options
+        )
+    except Exception as e:
+        result = {
+            'success': False,
+            'error': f"{type(e).__name__}: {e}"
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return result
+
+
+class BatchProcessor:
+    """
+    Runs DeviceTreeProcessor jobs for many images on a process pool.
+    
+    Args:
+        output_dir: Each image's tree goes to output_dir/<image name>
+        generator: Generator for every job (see processor.GENERATORS)
+        init_git: Initialize a git repository in every tree
+        validate: Validate every tree
+        max_workers: Upper bound on concurrent jobs; the resources of
+            the machine decide below it
+        work_root: Directory for the jobs' work directories
+    """
+    
+    def __init__(self, output_dir: str, generator: str = "twrpdtgen", init_git: bool = True,
+                 validate: bool = True, max_workers: Optional[int] = None,
+                 work_root: Optional[str] = None):
+        self.output_dir = output_dir
+        self.options = {
+            'generator': generator,
+            'init_git': init_git,
+            'validate': validate,
+        }
+        self.max_workers = max_workers
+        self.work_root = work_root
+        self.jobs: List[BatchJob] = []
+        self.plan: Dict[str, Any] = {}
+        self._start: Optional[float] = None
+        self._futures = []
+    
+    def run(self, paths: Iterable[str],
+            status_callback: Optional[Callable[[BatchJob, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        Process every image found in paths; blocks until the batch is done.
+        
+        Args:
+            paths: Image files and directories holding images
+            status_callback: Called as (job, stats) whenever a job's
+                status, progress or message changes; from helper
+                threads, so GUIs must hand it to their main loop
+        
+        Returns:
+            Dict with success (every job succeeded), jobs, the stats
+            (see stats()), plan (see plan_workers()) and kernel_configs
+            (devices added to the kernel config store)
+        """
+        images = find_images(paths)
+        if not images:
+            return {
+                'success': False,
+                'error': 'No images found',
+                'jobs': [],
+            }
+        
+        self.jobs = self._make_jobs(images)
+        self.plan = plan_workers(images, self.work_root, self.max_workers)
+        self._start = time.time()
+        
+        def notify(job: BatchJob):
+            if status_callback is None:
+                return
+            try:
+                status_callback(job, self.stats())
+            except Exception:
+                # A failing observer (e.g. a closed dialog) must not stop the batch
+                pass
+        
+        work_root = tempfile.mkdtemp(prefix="dtgen_batch_", dir=self.work_root)
+        # spawn: forking a process that runs a Tk main loop and threads is unsafe
+        context = multiprocessing.get_context('spawn')
+        events = context.Queue()
+        reader = threading.Thread(target=self._read_events, args=(events, notify), daemon=True)
+        reader.start()
+        
+        try:
+            with ProcessPoolExecutor(max_workers=self.plan['workers'], mp_context=context,
+                                     initializer=_init_worker, initargs=(events,)) as pool:
+                futures = {}
+                for job in self.jobs:
+                    future = pool.submit(_run_job, job.index, job.image_path, job.output_dir,
+                                         work_root, self.options)
+                    futures[future] = job
+                    self._futures.append(future)
+                
+                for future in as_completed(futures):
+                    job = futures[future]
+                    if future.cancelled():
+                        job.status = 'cancelled'
+                        job.message = 'Cancelled'
+                    else:
+                        try:
+                            job.result = future.result()
+                        except BrokenProcessPool:
+                            job.result = {
+                                'success': False,
+                                'error': 'Worker process died'
+                            }
+                        except Exception as e:
+                            job.result = {
+                                'success': False,
+                                'error': f"{type(e).__name__}: {e}"
+                            }
+                        job.status = 'done' if job.result['success'] else 'failed'
+                        job.progress = 1.0 if job.result['success'] else job.progress
+                        job.message = job.result.get('error') or f"Generated {job.result.get('device_name', 'Unknown')}"
+                    job.started = job.started or time.time()
+                    job.finished = time.time()
+                    notify(job)
+        finally:
+            events.put(None)
+            reader.join(timeout=5)
+            shutil.rmtree(work_root, ignore_errors=True)
+            self._futures = []
+        
+        try:
+            kernel_configs = record_results(job.result for job in self.jobs if job.result)
+        except (OSError, ValueError):
+            kernel_configs = 0
+        
+        stats = self.stats()
+        return {
+            'success': stats['failed'] == 0 and stats['cancelled'] == 0,
+            'jobs': [job.to_dict() for job in self.jobs],
+            'stats': stats,
+            'plan': self.plan,
+            'kernel_configs': kernel_configs,
+        }
+    
+    def cancel(self):
+        """Cancel the jobs that have not started; running ones finish."""
+        for future in self._futures:
+            future.cancel()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Counts per status, elapsed seconds and images/minute so far."""
+        counts = {status: 0 for status in ('queued', 'running', 'done', 'failed', 'cancelled')}
+        for job in self.jobs:
+            counts[job.status] += 1
+        elapsed = time.time() - self._start if self._start is not None else 0.0
+        finished = counts['done'] + counts['failed']
+        return {
+            'total': len(self.jobs),
+            **counts,
+            'elapsed': elapsed,
+            'images_per_minute': finished * 60.0 / elapsed if elapsed > 0 else 0.0,
+            'workers': self.plan.get('workers'),
+        }
+    
+    def _make_jobs(self, images: List[str]) -> List[BatchJob]:
+        jobs = []
+        used = set()
+        for index, image in enumerate(images):
+            name = Path(image).name
+            stem = name.split('.')[0] or name
+            candidate = stem
+            number = 2
+            while candidate in used:
+                candidate = f"{stem}_{number}"
+                number += 1
+            used.add(candidate)
+            jobs.append(BatchJob(index, image, os.path.join(self.output_dir, candidate)))
+        return jobs
+    
+    def _read_events(self, events, notify: Callable[[BatchJob], None]):
+        """Apply worker events to the jobs until the None sentinel."""
+        while True:
+            try:
+                event = events.get()
+            except (EOFError, OSError):
+                return
+            if event is None:
+                return
+            job = self.jobs[event['job']]
+            if job.status in ('done', 'failed', 'cancelled'):
+                continue
+            if event['type'] == 'started':
+                job.status = 'running'
+                job.started = event['time']
+                job.message = 'Started'
+            elif event['type'] == 'progress':
+                job.progress = event['progress']
+                job.message = event['message'] or job.message
+            elif event['type'] == 'log':
+                job.message = event['message']
+            notify(job)
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Extraction Cache - Content-addressed store of memoized stage outputs
+
+Generating a tree for an image that was already processed (different
+options, a rerun after template changes, CI) repeats the whole unpack
+and analysis. The processor's pipeline memoizes the outputs of its pure
+stages (image analysis, collected device facts, the rendered or
+twrpdtgen-generated tree) in this cache under ~/.cache, keyed by a hash
+of the stage, its version and its inputs (see pipeline.StageMemo). A
+warm run loads them instead of extracting.
+
+An entry is JSON info plus named binary files (kernels, prebuilts).
+
+Entries are built in a scratch directory and renamed into place, so a
+reader never sees half an entry. A lock file serialises writers and
+eviction against readers, which lets concurrent jobs share one cache.
+Once the total size passes the byte budget, least recently used
+entries are evicted.
+"""
+
+import errno
+import json
+import os
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+
+# Bump whenever the cached artifacts or device info change shape
+EXTRACTOR_VERSION = 1
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "gui-dtgen" / "extraction"
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+# Scratch directories older than this belong to a crashed job
+STALE_SCRATCH_SECONDS = 3600
+
+# How long to wait for the cache lock where only msvcrt is available
+LOCK_TIMEOUT_SECONDS = 60
+LOCK_RETRY_SECONDS = 0.05
+
+# errno values msvcrt.locking raises while another process holds the lock
+_LOCK_CONTENTION = (errno.EDEADLOCK, errno.EACCES)
+
+_META_FILE = 'meta.json'
+_INFO_FILE = 'info.json'
+_FILES_DIR = 'files'
+
+
+def extractor_version() -> str:
+    """Version tag of everything that shapes a cache entry."""
+    try:
+        from importlib.metadata import version, PackageNotFoundError
+        try:
+            twrpdtgen_version = version('twrpdtgen')
+        except PackageNotFoundError:
+            twrpdtgen_version = 'none'
+    except ImportError:
+        twrpdtgen_version = 'unknown'
+    return f"{EXTRACTOR_VERSION}+twrpdtgen-{twrpdtgen_version}"
+
+
+def _tree_size(path: Path) -> int:
+    total = 0
+    for directory, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(directory, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class CacheEntry:
+    """
+    A complete cache entry.
+    
+    Attributes:
+        key: Cache key
+        path: Entry directory
+        info: JSON data stored with the entry
+        meta: Key, version, size and creation time of the entry
+    """
+    
+    def __init__(self, key: str, path: Path):
+        self.key = key
+        self.path = path
+        with open(path / _META_FILE, 'r', encoding='utf-8') as f:
+            self.meta: Dict[str, Any] = json.load(f)
+        info_path = path / _INFO_FILE
+        self.info: Dict[str, Any] = {}
+        if info_path.exists():
+            with open(info_path, 'r', encoding='utf-8') as f:
+                self.info = json.load(f)
+    
+    @property
+    def files(self) -> List[str]:
+        """Names of the stored artifacts, e.g. ['dtb', 'kernel', 'ramdisk']."""
+        files_dir = self.path / _FILES_DIR
+        return sorted(os.listdir(files_dir)) if files_dir.is_dir() else []
+    
+    def file_path(self, name: str) -> Optional[Path]:
+        """Path of a stored artifact, or None if the entry has none."""
+        path = self.path / _FILES_DIR / name
+        return path if path.is_file() else None
+    
+    def read_file(self, name: str) -> Optional[bytes]:
+        path = self.file_path(name)
+        if path is None:
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+
+class ExtractionCache:
+    """
+    Content-addressed, size-bounded store of extraction results.
+    
+    Args:
+        root: Cache directory
+        max_bytes: Total size above which LRU entries are evicted
+    """
+    
+    def __init__(self, root: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = Path(root) if root is not None else DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+        self._scratch = self.root / 'tmp'
+    
+    def _entry_path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+    
+    @contextmanager
+    def _lock(self, shared: bool = False) -> Iterator[None]:
+        """Hold the cache lock: shared for readers, exclusive for writers."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / '.lock', 'a+b') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            elif msvcrt is not None:
+                # msvcrt has no shared locks; poll until the deadline
+                f.seek(0)
+                deadline = time.monotonic() + LOCK_TIMEOUT_SECONDS
+                while True:
+                    try:
+                        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                        break
+                    except OSError as e:
+                        if e.errno not in _LOCK_CONTENTION or time.monotonic() >= deadline:
+                            raise
+                        time.sleep(LOCK_RETRY_SECONDS)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                elif msvcrt is not None:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    
+    @contextmanager
+    def lookup(self, key: str) -> Iterator[Optional[CacheEntry]]:
+        """
+        Look up an entry and keep it from being evicted while in use.
+        
+        Yields:
+            The CacheEntry, or None on a miss
+        """
+        with self._lock(shared=True):
+            path = self._entry_path(key)
+            entry = None
+            if (path / _META_FILE).exists():
+                try:
+                    entry = CacheEntry(key, path)
+                    # The meta file's mtime is the entry's last use
+                    os.utime(path / _META_FILE)
+                except (OSError, ValueError):
+                    entry = None
+            yield entry
+    
+    def contains(self, key: str) -> bool:
+        return (self._entry_path(key) / _META_FILE).exists()
+    
+    def put(self, key: str, files: Optional[Dict[str, Any]] = None,
+            info: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Store an entry, unless another job already stored it.
+        
+        Args:
+            key: Cache key, e.g. a stage key
+            files: Artifact name -> bytes-like content
+            info: JSON-serialisable data
+        
+        Returns:
+            True if this call created the entry
+        """
+        self._scratch.mkdir(parents=True, exist_ok=True)
+        scratch = self._scratch / f"{key}.{os.getpid()}.{uuid.uuid4().hex[:8]}"
+        try:
+            files_dir = scratch / _FILES_DIR
+            files_dir.mkdir(parents=True)
+            for name, data in (files or {}).items():
+                with open(files_dir / name, 'wb') as f:
+                    f.write(data)
+            
+            with open(scratch / _INFO_FILE, 'w', encoding='utf-8') as f:
+                json.dump(info or {}, f, default=str)
+            
+            meta = {
+                'key': key,
+                'version': extractor_version(),
+                'created': time.time(),
+                'size': _tree_size(scratch),
+            }
+            with open(scratch / _META_FILE, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            
+            with self._lock():
+                target = self._entry_path(key)
+                if target.exists():
+                    return False
+                target.parent.mkdir(parents=True, exist_ok=True)
+                os.rename(scratch, target)
+                self._evict(keep=key)
+            return True
+        finally:
+            if scratch.exists():
+                shutil.rmtree(scratch, ignore_errors=True)
+    
+    def entries(self) -> List[Dict[str, Any]]:
+        """Meta of every entry plus its last use time, oldest use first."""
+        result = []
+        if not self.root.is_dir():
+            return result
+        for shard in self.root.iterdir():
+            if not shard.is_dir() or shard == self._scratch:
+                continue
+            for path in shard.iterdir():
+                meta_path = path / _META_FILE
+                try:
+                    with open(meta_path, 'r', encoding='utf-8') as f:
+                        meta = json.load(f)
+                    meta['last_used'] = meta_path.stat().st_mtime
+                except (OSError, ValueError):
+                    continue
+                meta['path'] = str(path)
+                result.append(meta)
+        result.sort(key=lambda meta: meta['last_used'])
+        return result
+    
+    def total_size(self) -> int:
+        return sum(meta['size'] for meta in self.entries())
+    
+    def evict(self) -> int:
+        """Evict LRU entries down to the byte budget; returns the bytes freed."""
+        with self._lock():
+            return self._evict()
+    
+    def clear(self):
+        """Remove every entry."""
+        with self._lock():
+            for meta in self.entries():
+                self._remove(Path(meta['path']))
+    
+    def _evict(self, keep: Optional[str] = None) -> int:
+        """Evict with the lock held; the entry named keep is never evicted."""
+        self._remove_stale_scratch()
+        entries = self.entries()
+        total = sum(meta['size'] for meta in entries)
+        freed = 0
+        for meta in entries:
+            if total <= self.max_bytes:
+                break
+            if meta['key'] == keep:
+                continue
+            self._remove(Path(meta['path']))
+            total -= meta['size']
+            freed += meta['size']
+        return freed
+    
+    def _remove(self, path: Path):
+        # Rename first so the entry disappears atomically
+        trash = self._scratch / f"evict.{uuid.uuid4().hex[:8]}"
+        self._scratch.mkdir(parents=True, exist_ok=True)
+        try:
+            os.rename(path, trash)
+        except OSError:
+            return
+        shutil.rmtree(trash, ignore_errors=True)
+        try:
+            path.parent.rmdir()
+        except OSError:
+            # Other entries share the shard directory
+            pass
+    
+    def _remove_stale_scratch(self):
+        if not self._scratch.is_dir():
+            return
+        cutoff = time.time() - STALE_SCRATCH_SECONDS
+        for path in self._scratch.iterdir():
+            try:
+                if path.stat().st_mtime < cutoff:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                pass
@@ -1,6 +1,29 @@
 """Extractors Package - Boot image extraction modules"""
 
 from .twrp_extractor import TWRPExtractor
-from .image_unpacker import ImageUnpacker
+from .image_unpacker import ImageUnpacker, BootImage
+from .vendor_boot import VendorBootImage
+from .decompress import open_decompressed, detect_compression
+from .cpio import CpioReader, CpioEntry, RAMDISK_PATTERNS
+from .avb import AvbReader, read_avb_info, board_partition_sizes
+from .sparse import SparseImage, is_sparse, open_image
+from .image_source import FileImage, ImageWindow, open_image_source
+from .ext4 import Ext4Image
+from .erofs import ErofsImage, is_erofs
+from .super_image import SuperImage, board_super_variables, read_super_info
+from .filesystem import open_filesystem, read_partition_files
+from .payload import PayloadReader, extract_payload_partitions, is_ota_package
+from .container import ContainerMember, find_boot_members, open_boot_member, is_container
+from .twrpdtgen_engine import TwrpdtgenEngine, PreExtractedAIK
 
-__all__ = ['TWRPExtractor', 'ImageUnpacker']
+__all__ = ['TWRPExtractor', 'ImageUnpacker', 'BootImage', 'VendorBootImage',
+           'open_decompressed', 'detect_compression',
+           'CpioReader', 'CpioEntry', 'RAMDISK_PATTERNS',
+           'AvbReader', 'read_avb_info', 'board_partition_sizes',
+           'SparseImage', 'is_sparse', 'open_image',
+           'FileImage', 'ImageWindow', 'open_image_source', 'Ext4Image', 'ErofsImage', 'is_erofs',
+           'SuperImage', 'board_super_variables', 'read_super_info',
+           'open_filesystem', 'read_partition_files',
+           'PayloadReader', 'extract_payload_partitions', 'is_ota_package',
+           'ContainerMember', 'find_boot_members', 'open_boot_member', 'is_container',
+           'TwrpdtgenEngine', 'PreExtractedAIK']
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+AVB - Android Verified Boot footer and vbmeta reader
+
+Reads the 64-byte AVB footer at the end of a partition image and then
+only the vbmeta blob it points to, so partition sizes, hash/hashtree
+descriptors and rollback indexes are available with a constant amount
+of I/O however large the image is. Standalone vbmeta images (starting
+with AVB0) are read the same way.
+"""
+
+import os
+import struct
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+
+AVB_FOOTER_MAGIC = b'AVBf'
+AVB_VBMETA_MAGIC = b'AVB0'
+
+# Layouts, see external/avb/libavb/avb_footer.h and avb_vbmeta_image.h
+_FOOTER = struct.Struct('!4s2L3Q28x')
+_VBMETA_HEADER = struct.Struct('!4s2L2QL11QLL47sx80x')
+_DESCRIPTOR_HEADER = struct.Struct('!2Q')
+_PROPERTY_DESCRIPTOR = struct.Struct('!2Q2Q')
+_HASHTREE_DESCRIPTOR = struct.Struct('!2QL3Q3L2Q32s4L60x')
+_HASH_DESCRIPTOR = struct.Struct('!2QQ32s4L60x')
+_KERNEL_CMDLINE_DESCRIPTOR = struct.Struct('!2Q2L')
+_CHAIN_PARTITION_DESCRIPTOR = struct.Struct('!2Q4L60x')
+
+DESCRIPTOR_PROPERTY = 0
+DESCRIPTOR_HASHTREE = 1
+DESCRIPTOR_HASH = 2
+DESCRIPTOR_KERNEL_CMDLINE = 3
+DESCRIPTOR_CHAIN_PARTITION = 4
+
+AVB_ALGORITHMS = {
+    0: 'NONE',
+    1: 'SHA256_RSA2048',
+    2: 'SHA256_RSA4096',
+    3: 'SHA256_RSA8192',
+    4: 'SHA512_RSA2048',
+    5: 'SHA512_RSA4096',
+    6: 'SHA512_RSA8192',
+}
+
+# vbmeta header flags
+AVB_FLAG_HASHTREE_DISABLED = 1 << 0
+AVB_FLAG_VERIFICATION_DISABLED = 1 << 1
+
+# Partition name -> BoardConfig.mk variable holding its size
+BOARD_PARTITION_SIZE_VARIABLES = {
+    'boot': 'BOARD_BOOTIMAGE_PARTITION_SIZE',
+    'init_boot': 'BOARD_INIT_BOOT_IMAGE_PARTITION_SIZE',
+    'vendor_boot': 'BOARD_VENDOR_BOOTIMAGE_PARTITION_SIZE',
+    'recovery': 'BOARD_RECOVERYIMAGE_PARTITION_SIZE',
+    'dtbo': 'BOARD_DTBOIMG_PARTITION_SIZE',
+    'system': 'BOARD_SYSTEMIMAGE_PARTITION_SIZE',
+    'vendor': 'BOARD_VENDORIMAGE_PARTITION_SIZE',
+    'product': 'BOARD_PRODUCTIMAGE_PARTITION_SIZE',
+    'odm': 'BOARD_ODMIMAGE_PARTITION_SIZE',
+}
+
+
+def _cstring(raw: bytes) -> str:
+    return raw.split(b'\x00', 1)[0].decode('utf-8', errors='replace')
+
+
+def _read_at(f, offset: int, size: int) -> bytes:
+    f.seek(offset)
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError(f"Truncated AVB data at offset {offset} ({len(data)} of {size} bytes)")
+    return data
+
+
+def parse_footer(raw: bytes) -> Optional[Dict[str, int]]:
+    """Parse the last 64 bytes of an image; None if there is no AVB footer."""
+    if len(raw) < _FOOTER.size or raw[-_FOOTER.size:][:4] != AVB_FOOTER_MAGIC:
+        return None
+    (_, major, minor, original_image_size,
+     vbmeta_offset, vbmeta_size) = _FOOTER.unpack(raw[-_FOOTER.size:])
+    return {
+        'version': f"{major}.{minor}",
+        'original_image_size': original_image_size,
+        'vbmeta_offset': vbmeta_offset,
+        'vbmeta_size': vbmeta_size,
+    }
+
+
+def parse_descriptors(data: bytes) -> List[Dict[str, Any]]:
+    """Parse a vbmeta descriptor area into a list of dicts."""
+    descriptors = []
+    offset = 0
+    while offset + _DESCRIPTOR_HEADER.size <= len(data):
+        tag, following = _DESCRIPTOR_HEADER.unpack_from(data, offset)
+        end = offset + _DESCRIPTOR_HEADER.size + following
+        if end > len(data):
+            raise ValueError(f"AVB descriptor at {offset} overruns the descriptor area")
+        raw = data[offset:end]
+        
+        if tag == DESCRIPTOR_PROPERTY:
+            _, _, key_size, value_size = _PROPERTY_DESCRIPTOR.unpack_from(raw)
+            key_start = _PROPERTY_DESCRIPTOR.size
+            value_start = key_start + key_size + 1
+            descriptors.append({
+                'type': 'property',
+                'key': raw[key_start:key_start + key_size].decode('utf-8', errors='replace'),
+                'value': raw[value_start:value_start + value_size].decode('utf-8', errors='replace'),
+            })
+        
+        elif tag == DESCRIPTOR_HASHTREE:
+            (_, _, dm_verity_version, image_size, tree_offset, tree_size,
+             data_block_size, hash_block_size, fec_num_roots, fec_offset, fec_size,
+             hash_algorithm, name_len, salt_len, digest_len, flags) = _HASHTREE_DESCRIPTOR.unpack_from(raw)
+            position = _HASHTREE_DESCRIPTOR.size
+            name = raw[position:position + name_len]
+            salt = raw[position + name_len:position + name_len + salt_len]
+            digest = raw[position + name_len + salt_len:position + name_len + salt_len + digest_len]
+            descriptors.append({
+                'type': 'hashtree',
+                'partition_name': name.decode('utf-8', errors='replace'),
+                'dm_verity_version': dm_verity_version,
+                'image_size': image_size,
+                'tree_offset': tree_offset,
+                'tree_size': tree_size,
+                'data_block_size': data_block_size,
+                'hash_block_size': hash_block_size,
+                'fec_num_roots': fec_num_roots,
+                'fec_offset': fec_offset,
+                'fec_size': fec_size,
+                'hash_algorithm': _cstring(hash_algorithm),
+                'salt': salt.hex(),
+                'root_digest': digest.hex(),
+                'flags': flags,
+            })
+        
+        elif tag == DESCRIPTOR_HASH:
+            (_, _, image_size, hash_algorithm, name_len, salt_len,
+             digest_len, flags) = _HASH_DESCRIPTOR.unpack_from(raw)
+            position = _HASH_DESCRIPTOR.size
+            name = raw[position:position + name_len]
+            salt = raw[position + name_len:position + name_len + salt_len]
+            digest = raw[position + name_len + salt_len:position + name_len + salt_len + digest_len]
+            descriptors.append({
+                'type': 'hash',
+                'partition_name': name.decode('utf-8', errors='replace'),
+                'image_size': image_size,
+                'hash_algorithm': _cstring(hash_algorithm),
+                'salt': salt.hex(),
+                'digest': digest.hex(),
+                'flags': flags,
+            })
+        
+        elif tag == DESCRIPTOR_KERNEL_CMDLINE:
+            _, _, flags, length = _KERNEL_CMDLINE_DESCRIPTOR.unpack_from(raw)
+            start = _KERNEL_CMDLINE_DESCRIPTOR.size
+            descriptors.append({
+                'type': 'kernel_cmdline',
+                'flags': flags,
+                'cmdline': raw[start:start + length].decode('utf-8', errors='replace'),
+            })
+        
+        elif tag == DESCRIPTOR_CHAIN_PARTITION:
+            (_, _, rollback_index_location, name_len, key_len,
+             flags) = _CHAIN_PARTITION_DESCRIPTOR.unpack_from(raw)
+            position = _CHAIN_PARTITION_DESCRIPTOR.size
+            descriptors.append({
+                'type': 'chain_partition',
+                'partition_name': raw[position:position + name_len].decode('utf-8', errors='replace'),
+                'rollback_index_location': rollback_index_location,
+                'public_key_size': key_len,
+                'flags': flags,
+            })
+        
+        else:
+            descriptors.append({'type': f'unknown({tag})', 'size': following})
+        
+        offset = end
+    return descriptors
+
+
+class AvbReader:
+    """Reads AVB metadata from a seekable binary file with O(1) I/O."""
+    
+    def __init__(self, f, size: Optional[int] = None):
+        self._file = f
+        if size is None:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+        self.size = size
+    
+    def read(self) -> Optional[Dict[str, Any]]:
+        """
+        Read the footer (if any) and the vbmeta blob.
+        
+        Returns:
+            Dict with partition size, footer fields, vbmeta header fields
+            and descriptors, or None if the image carries no AVB metadata
+        """
+        footer = None
+        vbmeta_offset = 0
+        if self.size >= _FOOTER.size:
+            footer = parse_footer(_read_at(self._file, self.size - _FOOTER.size, _FOOTER.size))
+        if footer is not None:
+            vbmeta_offset = footer['vbmeta_offset']
+        
+        if vbmeta_offset + _VBMETA_HEADER.size > self.size:
+            if footer is None:
+                return None
+            raise ValueError(f"AVB footer points past the end of the image (offset {vbmeta_offset})")
+        
+        header = _read_at(self._file, vbmeta_offset, _VBMETA_HEADER.size)
+        if header[:4] != AVB_VBMETA_MAGIC:
+            if footer is None:
+                return None
+            raise ValueError(f"AVB footer points to invalid vbmeta at offset {vbmeta_offset}")
+        
+        (_, libavb_major, libavb_minor, auth_size, aux_size, algorithm,
+         _, _, _, _, public_key_offset, public_key_size, _, _,
+         descriptors_offset, descriptors_size, rollback_index, flags,
+         rollback_index_location, release_string) = _VBMETA_HEADER.unpack(header)
+        
+        # Only the descriptor area of the auxiliary block is read
+        descriptors = []
+        if descriptors_size:
+            aux_start = vbmeta_offset + _VBMETA_HEADER.size + auth_size
+            if descriptors_offset + descriptors_size > aux_size:
+                raise ValueError("vbmeta descriptors extend past the auxiliary data block")
+            descriptors = parse_descriptors(
+                _read_at(self._file, aux_start + descriptors_offset, descriptors_size)
+            )
+        
+        info = {
+            'partition_size': self.size if footer is not None else None,
+            'original_image_size': footer['original_image_size'] if footer else self.size,
+            'footer_version': footer['version'] if footer else None,
+            'vbmeta_offset': vbmeta_offset,
+            'vbmeta_size': footer['vbmeta_size'] if footer else _VBMETA_HEADER.size + auth_size + aux_size,
+            'required_libavb_version': f"{libavb_major}.{libavb_minor}",
+            'algorithm': AVB_ALGORITHMS.get(algorithm, f'unknown({algorithm})'),
+            'public_key_size': public_key_size,
+            'rollback_index': rollback_index,
+            'rollback_index_location': rollback_index_location,
+            'flags': flags,
+            'hashtree_disabled': bool(flags & AVB_FLAG_HASHTREE_DISABLED),
+            'verification_disabled': bool(flags & AVB_FLAG_VERIFICATION_DISABLED),
+            'release_string': _cstring(release_string),
+            'descriptors': descriptors,
+        }
+        info['properties'] = {d['key']: d['value'] for d in descriptors if d['type'] == 'property'}
+        info['partitions'] = {
+            d['partition_name']: d for d in descriptors if d['type'] in ('hash', 'hashtree')
+        }
+        return info
+
+
+def read_avb_info(image_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Read AVB metadata of an image file.
+    
+    Args:
+        image_path: Partition image with an AVB footer, or a vbmeta image
+    
+    Returns:
+        AVB info dict (see AvbReader.read), or None without AVB metadata
+    """
+    with open(image_path, 'rb') as f:
+        return AvbReader(f, os.fstat(f.fileno()).st_size).read()
+
+
+def board_partition_sizes(avb_info: Dict[str, Any], image_path: Optional[str] = None) -> Dict[str, int]:
+    """
+    Map AVB partition sizes to BoardConfig.mk variables.
+    
+    The partition size is the size of the footed image; the partition it
+    belongs to is named by its hash descriptor, or else by the file name.
+    """
+    sizes = {}
+    if not avb_info or not avb_info.get('partition_size'):
+        return sizes
+    
+    names = [name for name, d in avb_info['partitions'].items() if d['type'] == 'hash']
+    if not names and image_path:
+        names = [Path(image_path).stem]
+    
+    for name in names:
+        variable = BOARD_PARTITION_SIZE_VARIABLES.get(name)
+        if variable:
+            sizes[variable] = avb_info['partition_size']
+    return sizes
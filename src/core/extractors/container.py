@@ -0,0 +1,550 @@
+#!/usr/bin/env python3
+"""
+Container - Boot images inside .tar/.tar.md5/.zip/.gz/.lz4 inputs
+
+Firmware rarely comes as a bare boot.img: Samsung ships Odin .tar.md5
+archives of lz4-compressed images, other vendors zip them or gzip them
+on their own. This module finds the boot/recovery/vendor_boot members
+of such a file by name and magic and opens them as seekable streams.
+
+Members stored uncompressed in a tar or zip are read in place from the
+container file, and can be mapped as a zero-copy buffer. Compressed
+members (a deflated zip entry, boot.img.lz4 inside a tar, a .gz file)
+are decompressed as a stream; backward seeks restart the decoder
+instead of spilling a decompressed copy to disk.
+"""
+
+import io
+import mmap
+import os
+import posixpath
+import shutil
+import tarfile
+import zipfile
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from .decompress import detect_compression, open_decompressed
+from .image_unpacker import BootImage
+from .vendor_boot import VendorBootImage
+
+
+# Preferred first: recovery, then boot (A/B devices boot recovery from
+# it), then vendor_boot
+BOOT_IMAGE_KINDS = ('recovery', 'boot', 'vendor_boot')
+
+BOOT_MAGIC = b'ANDROID!'
+VENDOR_BOOT_MAGIC = b'VNDRBOOT'
+
+# Suffixes stripped from member names before matching, innermost last
+_MEMBER_SUFFIXES = ('.md5', '.lz4', '.gz', '.xz', '.img')
+
+# Unnamed members larger than this are never sniffed for boot magic;
+# system/vendor/super images in the same archive are gigabytes
+MAX_SNIFF_SIZE = 256 * 1024 * 1024
+
+_SKIP_CHUNK_SIZE = 1024 * 1024
+
+
+def _kind_from_name(name: str) -> Optional[str]:
+    """Map 'AP/recovery.img.lz4' or 'boot_a.img' to its image kind."""
+    base = posixpath.basename(name.replace('\\', '/')).lower()
+    stripped = True
+    while stripped:
+        stripped = False
+        for suffix in _MEMBER_SUFFIXES:
+            if base.endswith(suffix):
+                base = base[:-len(suffix)]
+                stripped = True
+    if base.endswith(('_a', '_b')):
+        base = base[:-2]
+    return base if base in BOOT_IMAGE_KINDS else None
+
+
+def _kind_from_magic(header: bytes) -> Optional[str]:
+    if header.startswith(VENDOR_BOOT_MAGIC):
+        return 'vendor_boot'
+    if header.startswith(BOOT_MAGIC):
+        return 'boot'
+    return None
+
+
+def _stream_compression(header: bytes) -> Optional[str]:
+    """Compression of a member, ignoring the weak cpio 'none' match."""
+    compression = detect_compression(header)
+    return None if compression == 'none' else compression
+
+
+class MemberStream(io.RawIOBase):
+    """
+    Seekable raw stream over a byte range of a file.
+    
+    Reads go straight to the container with pread, so several streams
+    over one archive share nothing but the file. Also offers read_at()
+    and size, the positional-read interface of the filesystem readers.
+    
+    Args:
+        path: Container file
+        offset: Start of the member data in the file
+        size: Length of the member data
+    """
+    
+    def __init__(self, path: str, offset: int, size: int):
+        super().__init__()
+        self.source_name = path
+        self.offset = offset
+        self.size = size
+        self._fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        self._position = 0
+    
+    def readable(self) -> bool:
+        return True
+    
+    def seekable(self) -> bool:
+        return True
+    
+    def tell(self) -> int:
+        return self._position
+    
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError("negative seek position")
+        self._position = offset
+        return offset
+    
+    def readinto(self, buffer) -> int:
+        data = self.read_at(self._position, len(buffer))
+        n = len(data)
+        buffer[:n] = data
+        self._position += n
+        return n
+    
+    def read_at(self, offset: int, size: int) -> bytes:
+        """Read up to size bytes at offset of the member."""
+        if offset >= self.size or size <= 0:
+            return b''
+        size = min(size, self.size - offset)
+        if hasattr(os, 'pread'):
+            return os.pread(self._fd, size, self.offset + offset)
+        os.lseek(self._fd, self.offset + offset, os.SEEK_SET)
+        return os.read(self._fd, size)
+    
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        super().close()
+
+
+class _ArchiveReader(io.RawIOBase):
+    """Raw adapter over an archive's member file that also closes the archive."""
+    
+    def __init__(self, member_file, archive):
+        super().__init__()
+        self._member_file = member_file
+        self._archive = archive
+    
+    def readable(self) -> bool:
+        return True
+    
+    def seekable(self) -> bool:
+        return self._member_file.seekable()
+    
+    def tell(self) -> int:
+        return self._member_file.tell()
+    
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self._member_file.seek(offset, whence)
+    
+    def readinto(self, buffer) -> int:
+        data = self._member_file.read(len(buffer))
+        n = len(data)
+        buffer[:n] = data
+        return n
+    
+    def close(self):
+        if self._archive is not None:
+            self._member_file.close()
+            self._archive.close()
+            self._archive = None
+        super().close()
+
+
+class DecompressedStream(io.RawIOBase):
+    """
+    Seekable view of a compressed member, decompressed on demand.
+    
+    Forward seeks decode and discard; backward seeks reopen the
+    compressed source and decode again from the start. Parsers read
+    headers front to back, so in practice the stream is decoded once.
+    
+    Args:
+        opener: Returns a fresh binary file object over the compressed bytes
+        compression: Format name from detect_compression()
+        source_name: Name used in error messages
+    """
+    
+    def __init__(self, opener: Callable, compression: str, source_name: str = '<member>'):
+        super().__init__()
+        self.source_name = source_name
+        self.compression = compression
+        self._opener = opener
+        self._source = None
+        self._stream = None
+        self._position = 0
+        self._size = None
+        self._restart()
+    
+    @property
+    def size(self) -> int:
+        """Decompressed size; the first access decodes to the end."""
+        if self._size is None:
+            position = self._position
+            self._skip(-1)
+            self._size = self._position
+            self.seek(position)
+        return self._size
+    
+    def readable(self) -> bool:
+        return True
+    
+    def seekable(self) -> bool:
+        return True
+    
+    def tell(self) -> int:
+        return self._position
+    
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError("negative seek position")
+        if offset < self._position:
+            self._restart()
+        self._skip(offset - self._position)
+        return self._position
+    
+    def readinto(self, buffer) -> int:
+        n = self._stream.readinto(buffer)
+        if not n and len(buffer):
+            self._size = self._position
+        self._position += n
+        return n
+    
+    def _skip(self, count: int):
+        """Decode and drop count bytes, or everything if count is negative."""
+        scratch = bytearray(_SKIP_CHUNK_SIZE)
+        view = memoryview(scratch)
+        while count:
+            n = self.readinto(view if count < 0 else view[:min(count, len(view))])
+            if not n:
+                break
+            if count > 0:
+                count -= n
+    
+    def _restart(self):
+        self._close_streams()
+        self._source = self._opener()
+        self._stream = open_decompressed(self._source, self.compression)
+        self._position = 0
+    
+    def _close_streams(self):
+        if self._stream is not None and self._stream is not self._source:
+            self._stream.close()
+        if self._source is not None:
+            self._source.close()
+        self._stream = self._source = None
+    
+    def close(self):
+        self._close_streams()
+        super().close()
+
+
+class ContainerMember:
+    """
+    Boot, recovery or vendor_boot image found inside a container file.
+    
+    Attributes:
+        container: Path of the container file
+        name: Member name inside the container
+        kind: 'boot', 'recovery' or 'vendor_boot'
+        compression: Compression of the member itself (e.g. 'lz4' for
+            boot.img.lz4), or None
+        offset: Data offset in the container file if the member is
+            stored uncompressed by the container, else None
+        size: Stored size of the member data
+    """
+    
+    def __init__(self, container: str, name: str, kind: str, size: int,
+                 offset: Optional[int] = None, compression: Optional[str] = None,
+                 opener: Optional[Callable] = None):
+        self.container = container
+        self.name = name
+        self.kind = kind
+        self.size = size
+        self.offset = offset
+        self.compression = compression
+        self._opener = opener
+    
+    def __repr__(self) -> str:
+        return f"ContainerMember({self.container!r}, {self.name!r}, kind={self.kind!r})"
+    
+    @property
+    def is_zero_copy(self) -> bool:
+        """True if the image bytes can be read in place from the container."""
+        return self.offset is not None and self.compression is None
+    
+    def _open_stored(self):
+        """Open the member bytes as stored in the container (possibly compressed)."""
+        if self.offset is not None:
+            return MemberStream(self.container, self.offset, self.size)
+        return self._opener()
+    
+    def open_raw(self) -> io.RawIOBase:
+        """Open the decompressed image as a seekable raw stream."""
+        if self.compression is None:
+            return self._open_stored()
+        return DecompressedStream(self._open_stored, self.compression,
+                                  source_name=f"{self.container}:{self.name}")
+    
+    def open(self) -> io.BufferedReader:
+        """Open the decompressed image as a seekable buffered stream."""
+        return io.BufferedReader(self.open_raw())
+    
+    def open_image(self):
+        """
+        Parse the member as a BootImage or VendorBootImage.
+        
+        Zero-copy members are backed by a memory map of the container;
+        compressed members are decompressed into memory once.
+        """
+        image_class = VendorBootImage if self.kind == 'vendor_boot' else BootImage
+        source_name = f"{self.container}:{self.name}"
+        
+        if not self.is_zero_copy:
+            with self.open() as stream:
+                return image_class(stream.read(), source_name=source_name)
+        
+        f = open(self.container, 'rb')
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            f.close()
+            raise
+        try:
+            image = image_class(memoryview(mm)[self.offset:self.offset + self.size],
+                                source_name=source_name)
+        except Exception:
+            mm.close()
+            f.close()
+            raise
+        image._mmap = mm
+        image._file = f
+        return image
+    
+    def extract(self, output_dir: str) -> str:
+        """
+        Write the decompressed image to output_dir/<kind>.img.
+        
+        For tools that only take a path. Zero-copy members are copied
+        by the kernel (sendfile) where the platform allows it.
+        
+        Returns:
+            Path of the written image
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        output_path = str(Path(output_dir) / f"{self.kind}.img")
+        partial_path = output_path + '.partial'
+        try:
+            with open(partial_path, 'wb') as out:
+                if self.is_zero_copy and hasattr(os, 'sendfile'):
+                    self._sendfile(out)
+                else:
+                    with self.open() as stream:
+                        shutil.copyfileobj(stream, out, _SKIP_CHUNK_SIZE)
+            os.replace(partial_path, output_path)
+        except BaseException:
+            try:
+                os.remove(partial_path)
+            except OSError:
+                pass
+            raise
+        return output_path
+    
+    def _sendfile(self, out):
+        with open(self.container, 'rb') as f:
+            offset, remaining = self.offset, self.size
+            while remaining:
+                sent = os.sendfile(out.fileno(), f.fileno(), offset, remaining)
+                if not sent:
+                    raise ValueError(f"{self.container}: {self.name} is truncated")
+                offset += sent
+                remaining -= sent
+
+
+def _sniff(open_stream: Callable, compression: Optional[str]) -> Optional[str]:
+    """Image kind from the first decompressed bytes of a member."""
+    try:
+        with open_stream() as stream:
+            if compression is not None:
+                with open_decompressed(stream, compression) as decompressed:
+                    header = decompressed.read(8)
+            else:
+                header = stream.read(8)
+    except Exception:
+        return None
+    return _kind_from_magic(bytes(header))
+
+
+def _add_member(members: List[ContainerMember], member: ContainerMember, header: bytes):
+    """Accept a member whose name or magic marks it as a boot image."""
+    member.compression = _stream_compression(header)
+    named = member.kind
+    if named is None and member.size > MAX_SNIFF_SIZE:
+        return
+    
+    if member.compression is None:
+        sniffed = _kind_from_magic(header)
+    else:
+        sniffed = _sniff(member._open_stored, member.compression)
+    if sniffed is None:
+        return
+    if named is None:
+        member.kind = sniffed
+    elif (named == 'vendor_boot') != (sniffed == 'vendor_boot'):
+        # Named like a boot image but holding something else
+        return
+    members.append(member)
+
+
+def _zip_members(path: str) -> List[ContainerMember]:
+    from .payload import _member_offset
+    
+    members = []
+    with zipfile.ZipFile(path) as archive:
+        infos = [info for info in archive.infolist() if not info.is_dir()]
+        for info in infos:
+            kind = _kind_from_name(info.filename)
+            if kind is None and info.file_size > MAX_SNIFF_SIZE:
+                continue
+            with archive.open(info) as f:
+                header = f.read(8)
+            
+            if info.compress_type == zipfile.ZIP_STORED:
+                member = ContainerMember(path, info.filename, kind, info.file_size,
+                                         offset=_member_offset(path, info.filename))
+            else:
+                def opener(name=info.filename):
+                    archive = zipfile.ZipFile(path)
+                    try:
+                        return _ArchiveReader(archive.open(name), archive)
+                    except Exception:
+                        archive.close()
+                        raise
+                member = ContainerMember(path, info.filename, kind, info.file_size, opener=opener)
+            _add_member(members, member, header)
+    return members
+
+
+def _tar_members(path: str) -> List[ContainerMember]:
+    try:
+        archive = tarfile.open(path, 'r:')
+        stored = True
+    except tarfile.ReadError:
+        archive = tarfile.open(path, 'r:*')
+        stored = False
+    
+    members = []
+    with archive:
+        for info in archive:
+            if not info.isfile():
+                continue
+            kind = _kind_from_name(info.name)
+            if kind is None and info.size > MAX_SNIFF_SIZE:
+                continue
+            with archive.extractfile(info) as f:
+                header = f.read(8)
+            
+            if stored:
+                member = ContainerMember(path, info.name, kind, info.size, offset=info.offset_data)
+            else:
+                def opener(name=info.name):
+                    archive = tarfile.open(path, 'r:*')
+                    try:
+                        return _ArchiveReader(archive.extractfile(name), archive)
+                    except Exception:
+                        archive.close()
+                        raise
+                member = ContainerMember(path, info.name, kind, info.size, opener=opener)
+            _add_member(members, member, header)
+    return members
+
+
+def _container_type(path: str, header: bytes) -> Optional[str]:
+    if _kind_from_magic(header):
+        return None
+    if zipfile.is_zipfile(path):
+        return 'zip'
+    if header[257:262] == b'ustar' or (_stream_compression(header) and tarfile.is_tarfile(path)):
+        return 'tar'
+    if _stream_compression(header):
+        return 'compressed'
+    return None
+
+
+def is_container(path: str) -> bool:
+    """Check for a tar, zip or compressed file that may hold boot images."""
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(512)
+        return _container_type(path, header) is not None
+    except OSError:
+        return False
+
+
+def find_boot_members(path: str) -> List[ContainerMember]:
+    """
+    List the boot/recovery/vendor_boot images inside a container.
+    
+    Members are matched by name (recovery.img, boot.img.lz4,
+    AP/vendor_boot.img, ...) and confirmed by their ANDROID!/VNDRBOOT
+    magic; unnamed members small enough to be boot images are matched
+    by magic alone.
+    
+    Args:
+        path: .tar, .tar.md5, .tar.gz, .zip, .gz, .lz4 or .xz file
+    
+    Returns:
+        Members in preference order (recovery, boot, vendor_boot); empty
+        if the file is not a container or holds no boot image
+    """
+    with open(path, 'rb') as f:
+        header = f.read(512)
+    container_type = _container_type(path, header)
+    
+    if container_type == 'zip':
+        members = _zip_members(path)
+    elif container_type == 'tar':
+        members = _tar_members(path)
+    elif container_type == 'compressed':
+        # A bare compressed image such as recovery.img.lz4
+        members = []
+        name = os.path.basename(path)
+        _add_member(members, ContainerMember(path, name, _kind_from_name(name),
+                                             os.path.getsize(path), offset=0), header)
+    else:
+        return []
+    
+    return sorted(members, key=lambda member: BOOT_IMAGE_KINDS.index(member.kind))
+
+
+def open_boot_member(path: str) -> Optional[ContainerMember]:
+    """Get the preferred boot image inside a container, or None."""
+    members = find_boot_members(path)
+    return members[0] if members else None
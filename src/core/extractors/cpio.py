@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+CPIO Reader - Streaming ramdisk archive reader
+
+Iterates newc ("070701"/"070702") and odc ("070707") cpio archives
+straight from a forward-only stream such as the output of
+open_decompressed(). Only entries that pass a glob/predicate filter are
+materialised; everything else is skipped without being buffered.
+"""
+
+import fnmatch
+import os
+import stat
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Union
+
+
+NEWC_MAGICS = (b'070701', b'070702')
+ODC_MAGIC = b'070707'
+NEWC_HEADER_SIZE = 110
+ODC_HEADER_SIZE = 76
+TRAILER_NAME = 'TRAILER!!!'
+SKIP_CHUNK_SIZE = 64 * 1024
+
+# Files the generator actually needs from a recovery/vendor ramdisk
+RAMDISK_PATTERNS = [
+    '*fstab*',
+    'prop.default',
+    'default.prop',
+    '*/build.prop',
+    'init*.rc',
+    '*/init/*.rc',
+    'ueventd*.rc',
+    '*file_contexts',
+    'modules.load*',
+    'modules.dep',
+    '*/modules.load*',
+    '*/modules.dep',
+]
+
+Matcher = Union[None, str, List[str], Callable[['CpioEntry'], bool]]
+
+
+class CpioEntry:
+    """Header fields of a cpio entry, plus its data when materialised."""
+    
+    def __init__(self, name: str, mode: int, size: int, uid: int = 0, gid: int = 0,
+                 nlink: int = 1, mtime: int = 0, ino: int = 0):
+        self.name = name
+        self.mode = mode
+        self.size = size
+        self.uid = uid
+        self.gid = gid
+        self.nlink = nlink
+        self.mtime = mtime
+        self.ino = ino
+        self.data: Optional[bytes] = None
+    
+    @property
+    def is_file(self) -> bool:
+        return stat.S_ISREG(self.mode)
+    
+    @property
+    def is_dir(self) -> bool:
+        return stat.S_ISDIR(self.mode)
+    
+    @property
+    def is_symlink(self) -> bool:
+        return stat.S_ISLNK(self.mode)
+    
+    @property
+    def link_target(self) -> Optional[str]:
+        if not self.is_symlink or self.data is None:
+            return None
+        return self.data.decode('utf-8', errors='surrogateescape')
+    
+    def __repr__(self):
+        return f"CpioEntry({self.name!r}, mode={oct(self.mode)}, size={self.size})"
+
+
+def _compile_matcher(match: Matcher) -> Callable[[CpioEntry], bool]:
+    """Turn a glob, list of globs or predicate into a predicate."""
+    if match is None:
+        return lambda entry: True
+    if callable(match):
+        return match
+    
+    patterns = [match] if isinstance(match, str) else list(match)
+    
+    def matches(entry: CpioEntry) -> bool:
+        basename = entry.name.rsplit('/', 1)[-1]
+        for pattern in patterns:
+            if fnmatch.fnmatchcase(entry.name, pattern):
+                return True
+            if '/' not in pattern and fnmatch.fnmatchcase(basename, pattern):
+                return True
+        return False
+    
+    return matches
+
+
+class CpioReader:
+    """
+    Forward-only reader for (possibly concatenated) cpio archives.
+    
+    Android ramdisks are frequently several archives appended to each
+    other (e.g. a generic ramdisk followed by a vendor one); reading
+    continues past each TRAILER!!! as long as another header follows.
+    """
+    
+    def __init__(self, stream):
+        self._stream = stream
+        self._seekable = False
+        try:
+            self._seekable = stream.seekable()
+        except Exception:
+            pass
+        self._newc = True
+        self.bytes_skipped = 0
+    
+    def iter_entries(self, match: Matcher = None, include_unmatched: bool = False) -> Iterator[CpioEntry]:
+        """
+        Iterate over archive entries.
+        
+        Args:
+            match: Glob (matched against the full path, or the basename for
+                patterns without '/'), list of globs, or a predicate called
+                with the header-only entry
+            include_unmatched: Also yield entries that did not match, with
+                data left as None
+        
+        Yields:
+            CpioEntry objects; matching entries carry their data
+        """
+        matcher = _compile_matcher(match)
+        
+        while True:
+            entry = self._read_header()
+            if entry is None:
+                return
+            
+            if matcher(entry):
+                entry.data = self._read_exact(entry.size)
+                self._skip_padding(entry.size)
+                yield entry
+            else:
+                self._skip(entry.size)
+                self._skip_padding(entry.size)
+                if include_unmatched:
+                    yield entry
+    
+    def read_files(self, match: Matcher = RAMDISK_PATTERNS) -> Dict[str, bytes]:
+        """Read the contents of all matching regular files and symlinks into a dict."""
+        return {
+            entry.name: entry.data
+            for entry in self.iter_entries(match)
+            if entry.is_file or entry.is_symlink
+        }
+    
+    def list_names(self) -> List[str]:
+        """List every entry name, skipping all file data."""
+        return [entry.name for entry in self.iter_entries(lambda entry: False, include_unmatched=True)]
+    
+    def extract(self, dest_dir: str, match: Matcher = RAMDISK_PATTERNS) -> List[str]:
+        """
+        Extract only matching entries below dest_dir.
+        
+        Returns:
+            List of extracted paths relative to dest_dir
+        """
+        dest = Path(dest_dir).resolve()
+        extracted = []
+        
+        for entry in self.iter_entries(match):
+            target = (dest / entry.name).resolve()
+            if target != dest and dest not in target.parents:
+                continue
+            
+            if entry.is_dir:
+                target.mkdir(parents=True, exist_ok=True)
+            elif entry.is_file:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                with open(target, 'wb') as f:
+                    f.write(entry.data)
+            elif entry.is_symlink:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                try:
+                    if target.is_symlink() or target.exists():
+                        target.unlink()
+                    os.symlink(entry.link_target, target)
+                except OSError:
+                    continue
+            else:
+                continue
+            
+            extracted.append(entry.name)
+        
+        return extracted
+    
+    def _read_header(self) -> Optional[CpioEntry]:
+        """Read the next header, skipping trailers and inter-archive padding."""
+        while True:
+            magic = self._read_magic()
+            if magic is None:
+                return None
+            
+            if magic in NEWC_MAGICS:
+                raw = self._read_exact(NEWC_HEADER_SIZE - 6)
+                fields = [int(raw[i:i + 8], 16) for i in range(0, 104, 8)]
+                (ino, mode, uid, gid, nlink, mtime, size,
+                 _, _, _, _, namesize, _) = fields
+                name = self._read_exact(namesize)
+                self._skip((-(NEWC_HEADER_SIZE + namesize)) % 4)
+                self._newc = True
+            elif magic == ODC_MAGIC:
+                raw = self._read_exact(ODC_HEADER_SIZE - 6)
+                ino = int(raw[6:12], 8)
+                mode = int(raw[12:18], 8)
+                uid = int(raw[18:24], 8)
+                gid = int(raw[24:30], 8)
+                nlink = int(raw[30:36], 8)
+                mtime = int(raw[42:53], 8)
+                namesize = int(raw[53:59], 8)
+                size = int(raw[59:70], 8)
+                name = self._read_exact(namesize)
+                self._newc = False
+            else:
+                raise ValueError(f"Invalid cpio header magic: {magic!r}")
+            
+            name = name.rstrip(b'\x00').decode('utf-8', errors='surrogateescape')
+            if name == TRAILER_NAME:
+                self._skip(size)
+                self._skip_padding(size)
+                continue
+            
+            while name.startswith('./'):
+                name = name[2:]
+            name = name.lstrip('/')
+            
+            return CpioEntry(name, mode, size, uid, gid, nlink, mtime, ino)
+    
+    def _read_magic(self) -> Optional[bytes]:
+        """Read a header magic, skipping NUL padding between archives."""
+        magic = b''
+        while True:
+            chunk = self._stream.read(6 - len(magic))
+            if not chunk:
+                return None
+            magic += chunk
+            stripped = magic.lstrip(b'\x00')
+            if len(stripped) != len(magic):
+                magic = stripped
+                continue
+            if len(magic) == 6:
+                return magic
+    
+    def _read_exact(self, size: int) -> bytes:
+        data = self._stream.read(size)
+        if len(data) != size:
+            # Buffered readers may return short reads on pipes
+            parts = [data]
+            remaining = size - len(data)
+            while remaining > 0:
+                chunk = self._stream.read(remaining)
+                if not chunk:
+                    raise EOFError("Truncated cpio archive")
+                parts.append(chunk)
+                remaining -= len(chunk)
+            data = b''.join(parts)
+        return bytes(data)
+    
+    def _skip_padding(self, size: int):
+        if self._newc:
+            self._skip((-size) % 4)
+    
+    def _skip(self, size: int):
+        """Discard size bytes without buffering them."""
+        if size <= 0:
+            return
+        self.bytes_skipped += size
+        
+        if self._seekable:
+            self._stream.seek(size, os.SEEK_CUR)
+            return
+        
+        while size > 0:
+            chunk = self._stream.read(min(size, SKIP_CHUNK_SIZE))
+            if not chunk:
+                raise EOFError("Truncated cpio archive")
+            size -= len(chunk)
@@ -0,0 +1,538 @@
+#!/usr/bin/env python3
+"""
+Decompress - Streaming ramdisk/kernel decompression
+
+Sniffs the compression format of a blob and wraps it in a file-like
+reader that decompresses chunk by chunk. Only one input chunk and one
+decoded block are held in memory at a time, so large ramdisks are never
+materialised in full, neither in memory nor on disk.
+
+gzip, xz, legacy lzma and bzip2 use the standard library. LZ4 (legacy
+and frame format) has a pure-Python decoder that is transparently
+replaced by the 'lz4' package when it is installed. zstd requires the
+optional 'zstandard' package.
+"""
+
+import bz2
+import io
+import lzma
+import struct
+import zlib
+from typing import Optional
+
+try:
+    import lz4.block as _lz4_block
+except ImportError:
+    _lz4_block = None
+
+try:
+    import zstandard as _zstandard
+except ImportError:
+    _zstandard = None
+
+
+DEFAULT_CHUNK_SIZE = 256 * 1024
+
+LZ4_LEGACY_MAGIC = 0x184C2102
+LZ4_FRAME_MAGIC = 0x184D2204
+LZ4_LEGACY_BLOCK_SIZE = 8 << 20
+
+# (magic, offset, format) - checked in order
+COMPRESSION_MAGICS = [
+    (b'\x1f\x8b', 0, 'gzip'),
+    (b'\x02\x21\x4c\x18', 0, 'lz4_legacy'),
+    (b'\x04\x22\x4d\x18', 0, 'lz4'),
+    (b'\xfd7zXZ\x00', 0, 'xz'),
+    (b'\x28\xb5\x2f\xfd', 0, 'zstd'),
+    (b'BZh', 0, 'bzip2'),
+    (b'\x5d\x00\x00', 0, 'lzma'),
+    (b'070701', 0, 'none'),
+    (b'070702', 0, 'none'),
+    (b'070707', 0, 'none'),
+]
+
+
+def detect_compression(header) -> Optional[str]:
+    """
+    Detect the compression format from the first bytes of a blob.
+    
+    Args:
+        header: At least the first 8 bytes of the blob
+    
+    Returns:
+        Format name ('gzip', 'lz4_legacy', 'lz4', 'xz', 'zstd', 'bzip2',
+        'lzma', or 'none' for an uncompressed cpio archive), or None
+        if the format is not recognised
+    """
+    header = bytes(header[:8])
+    for magic, offset, name in COMPRESSION_MAGICS:
+        if header[offset:offset + len(magic)] == magic:
+            return name
+    return None
+
+
+def lz4_block_decompress(src, max_output: int = -1, prefix: bytes = b'') -> bytes:
+    """
+    Decompress a single raw LZ4 block.
+    
+    Args:
+        src: Compressed block
+        max_output: Stop once this many bytes were produced (-1: no limit)
+        prefix: Previously decoded data that matches may reference
+    
+    Returns:
+        Decompressed bytes, excluding the prefix
+    """
+    if _lz4_block is not None and max_output > 0:
+        try:
+            if prefix:
+                return _lz4_block.decompress(bytes(src), uncompressed_size=max_output, dict=bytes(prefix))
+            return _lz4_block.decompress(bytes(src), uncompressed_size=max_output)
+        except Exception:
+            # Partial decodes (output limit below the block size) are
+            # handled by the pure-Python path
+            pass
+    
+    src = bytes(src)
+    dst = bytearray(prefix)
+    base = len(dst)
+    limit = base + max_output if max_output >= 0 else -1
+    position = 0
+    end = len(src)
+    
+    while position < end:
+        token = src[position]
+        position += 1
+        
+        literal_length = token >> 4
+        if literal_length == 15:
+            while True:
+                extra = src[position]
+                position += 1
+                literal_length += extra
+                if extra != 255:
+                    break
+        if literal_length:
+            dst += src[position:position + literal_length]
+            position += literal_length
+        
+        if position >= end or (limit >= 0 and len(dst) >= limit):
+            break
+        
+        offset = src[position] | (src[position + 1] << 8)
+        position += 2
+        if offset == 0 or offset > len(dst):
+            raise ValueError("Corrupt LZ4 block: invalid match offset")
+        
+        match_length = token & 15
+        if match_length == 15:
+            while True:
+                extra = src[position]
+                position += 1
+                match_length += extra
+                if extra != 255:
+                    break
+        match_length += 4
+        
+        start = len(dst) - offset
+        if offset >= match_length:
+            dst += dst[start:start + match_length]
+        else:
+            pattern = bytes(dst[start:])
+            repeats, remainder = divmod(match_length, offset)
+            dst += pattern * repeats + pattern[:remainder]
+        
+        if limit >= 0 and len(dst) >= limit:
+            break
+    
+    if limit >= 0:
+        del dst[limit:]
+    return bytes(dst[base:])
+
+
+class _ZlibDecoder:
+    """Adapter giving zlib the needs_input/eof interface of lzma and bz2."""
+    
+    def __init__(self, wbits: int):
+        self._obj = zlib.decompressobj(wbits)
+        self._tail = b''
+        self.needs_input = True
+    
+    @property
+    def eof(self) -> bool:
+        return self._obj.eof
+    
+    @property
+    def unused_data(self) -> bytes:
+        return self._obj.unused_data
+    
+    def decompress(self, data, max_length: int) -> bytes:
+        if self._tail:
+            data = self._tail + bytes(data)
+        out = self._obj.decompress(data, max_length)
+        self._tail = self._obj.unconsumed_tail
+        self.needs_input = not self._tail and len(out) < max_length
+        return out
+
+
+class _ZstdDecoder:
+    """Adapter for the optional zstandard package."""
+    
+    def __init__(self):
+        if _zstandard is None:
+            raise RuntimeError("zstd compression requires the 'zstandard' package: pip install zstandard")
+        self._obj = _zstandard.ZstdDecompressor().decompressobj()
+        self._pending = b''
+        self.needs_input = True
+    
+    @property
+    def eof(self) -> bool:
+        return self._obj.eof and not self._pending
+    
+    @property
+    def unused_data(self) -> bytes:
+        return self._obj.unused_data
+    
+    def decompress(self, data, max_length: int) -> bytes:
+        if data:
+            self._pending += self._obj.decompress(bytes(data))
+        out, self._pending = self._pending[:max_length], self._pending[max_length:]
+        self.needs_input = not self._pending
+        return out
+
+
+class _LZ4Decoder:
+    """Incremental decoder for LZ4 legacy and frame streams."""
+    
+    def __init__(self, legacy: bool):
+        self.legacy = legacy
+        self.eof = False
+        self.needs_input = True
+        self.unused_data = b''
+        self._input = bytearray()
+        self._output = b''
+        self._output_pos = 0
+        self._history = b''
+        self._header_done = False
+        self._block_checksum = False
+        self._content_checksum = False
+        self._independent = True
+    
+    def decompress(self, data, max_length: int) -> bytes:
+        if data:
+            self._input += data
+        
+        while len(self._output) - self._output_pos == 0 and not self.eof:
+            if not self._decode_next():
+                break
+        
+        available = len(self._output) - self._output_pos
+        take = min(available, max_length)
+        out = self._output[self._output_pos:self._output_pos + take]
+        self._output_pos += take
+        self.needs_input = not self.eof and available - take == 0 and not self._block_ready()
+        return out
+    
+    def _block_ready(self) -> bool:
+        """True if buffered input holds enough data to make progress."""
+        if not self._header_done:
+            if self.legacy or len(self._input) < 5:
+                return len(self._input) >= 4
+            flags = self._input[4]
+            return len(self._input) >= 7 + (8 if flags & 0x08 else 0) + (4 if flags & 0x01 else 0)
+        if len(self._input) < 4:
+            return False
+        block_size = struct.unpack_from('<I', self._input, 0)[0]
+        if self.legacy:
+            if block_size == LZ4_LEGACY_MAGIC or block_size == 0 or block_size > 2 * LZ4_LEGACY_BLOCK_SIZE:
+                return True
+            return len(self._input) >= 4 + block_size
+        if block_size == 0:
+            return len(self._input) >= 4 + (4 if self._content_checksum else 0)
+        block_size &= 0x7FFFFFFF
+        return len(self._input) >= 4 + block_size + (4 if self._block_checksum else 0)
+    
+    def _decode_next(self) -> bool:
+        """Decode one block from buffered input; False if more input is needed."""
+        if not self._header_done:
+            return self._read_header()
+        
+        if len(self._input) < 4:
+            return False
+        block_size = struct.unpack_from('<I', self._input, 0)[0]
+        
+        if self.legacy:
+            # A repeated magic starts a concatenated stream; a zero size or
+            # padding marks the end
+            if block_size == LZ4_LEGACY_MAGIC:
+                del self._input[:4]
+                return True
+            if block_size == 0 or block_size > 2 * LZ4_LEGACY_BLOCK_SIZE:
+                self._finish(0)
+                return True
+            if len(self._input) < 4 + block_size:
+                return False
+            block = self._input[4:4 + block_size]
+            del self._input[:4 + block_size]
+            self._emit(lz4_block_decompress(block, LZ4_LEGACY_BLOCK_SIZE))
+            return True
+        
+        if block_size == 0:
+            trailer = 4 + (4 if self._content_checksum else 0)
+            if len(self._input) < trailer:
+                return False
+            self._finish(trailer)
+            return True
+        
+        uncompressed = block_size & 0x80000000
+        block_size &= 0x7FFFFFFF
+        total = 4 + block_size + (4 if self._block_checksum else 0)
+        if len(self._input) < total:
+            return False
+        block = bytes(self._input[4:4 + block_size])
+        del self._input[:total]
+        
+        if uncompressed:
+            decoded = block
+        elif self._independent:
+            decoded = lz4_block_decompress(block, self._block_max)
+        else:
+            decoded = lz4_block_decompress(block, self._block_max, prefix=self._history)
+        if not self._independent:
+            self._history = (self._history + decoded)[-65536:]
+        self._emit(decoded)
+        return True
+    
+    def _read_header(self) -> bool:
+        """Consume the stream header."""
+        if self.legacy:
+            if len(self._input) < 4:
+                return False
+            del self._input[:4]
+            self._header_done = True
+            return True
+        
+        if len(self._input) < 7:
+            return False
+        flags, block_descriptor = self._input[4], self._input[5]
+        if flags >> 6 != 1:
+            raise ValueError("Unsupported LZ4 frame version")
+        header_size = 7 + (8 if flags & 0x08 else 0) + (4 if flags & 0x01 else 0)
+        if len(self._input) < header_size:
+            return False
+        
+        self._independent = bool(flags & 0x20)
+        self._block_checksum = bool(flags & 0x10)
+        self._content_checksum = bool(flags & 0x04)
+        self._block_max = 1 << (8 + 2 * ((block_descriptor >> 4) & 0x07))
+        del self._input[:header_size]
+        self._header_done = True
+        return True
+    
+    def at_block_boundary(self) -> bool:
+        """True when no partial block is buffered and all output was consumed."""
+        return (not bytes(self._input).strip(b'\x00')
+                and len(self._output) == self._output_pos)
+    
+    def _emit(self, decoded: bytes):
+        self._output = decoded
+        self._output_pos = 0
+    
+    def _finish(self, trailer: int):
+        self.eof = True
+        self.unused_data = bytes(self._input[trailer:])
+        self._input = bytearray()
+
+
+def _create_decoder(compression: str):
+    """Create an incremental decoder for a compression format."""
+    if compression == 'gzip':
+        return _ZlibDecoder(16 + zlib.MAX_WBITS)
+    if compression == 'xz':
+        return lzma.LZMADecompressor(format=lzma.FORMAT_XZ)
+    if compression == 'lzma':
+        return lzma.LZMADecompressor(format=lzma.FORMAT_ALONE)
+    if compression == 'bzip2':
+        return bz2.BZ2Decompressor()
+    if compression == 'lz4_legacy':
+        return _LZ4Decoder(legacy=True)
+    if compression == 'lz4':
+        return _LZ4Decoder(legacy=False)
+    if compression == 'zstd':
+        return _ZstdDecoder()
+    raise ValueError(f"Unsupported compression format: {compression}")
+
+
+class _BufferSource:
+    """Minimal read() interface over a bytes-like object, without copying."""
+    
+    def __init__(self, buffer):
+        self._view = memoryview(buffer).cast('B')
+        self._position = 0
+    
+    def read(self, size: int = -1):
+        if size < 0:
+            size = len(self._view) - self._position
+        chunk = self._view[self._position:self._position + size]
+        self._position += len(chunk)
+        return chunk
+
+
+class DecompressingReader(io.RawIOBase):
+    """
+    Raw, forward-only reader that decompresses a source stream on demand.
+    
+    Concatenated gzip members and concatenated LZ4 legacy streams are
+    decoded as one continuous stream, matching how the kernel unpacks
+    initramfs.
+    """
+    
+    def __init__(self, source, compression: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        super().__init__()
+        self._source = source
+        self.compression = compression
+        self._chunk_size = chunk_size
+        self._decoder = _create_decoder(compression)
+        self._source_eof = False
+        self._pending = b''
+        self.bytes_in = 0
+        self.bytes_out = 0
+    
+    def readable(self) -> bool:
+        return True
+    
+    def readinto(self, buffer) -> int:
+        size = len(buffer)
+        if size == 0:
+            return 0
+        
+        while True:
+            if self._decoder.eof:
+                if not self._restart_member():
+                    return 0
+            
+            data = b''
+            if self._decoder.needs_input:
+                data = self._pending or self._read_source()
+                self._pending = b''
+                if not data:
+                    if self._source_eof and self._decoder_can_end():
+                        return 0
+                    if self._source_eof:
+                        raise EOFError(f"Compressed {self.compression} stream ended before the end-of-stream marker")
+                    continue
+            
+            out = self._decoder.decompress(data, size)
+            if out:
+                n = len(out)
+                buffer[:n] = out
+                self.bytes_out += n
+                return n
+    
+    def _read_source(self):
+        chunk = self._source.read(self._chunk_size)
+        if not chunk:
+            self._source_eof = True
+            return b''
+        self.bytes_in += len(chunk)
+        return chunk
+    
+    def _decoder_can_end(self) -> bool:
+        """LZ4 legacy streams have no end marker and simply stop at a block boundary."""
+        if isinstance(self._decoder, _LZ4Decoder) and self._decoder.legacy:
+            return self._decoder.at_block_boundary()
+        return False
+    
+    def _restart_member(self) -> bool:
+        """Continue with the next concatenated member, if there is one."""
+        leftover = self._decoder.unused_data
+        if self.compression not in ('gzip', 'lz4_legacy'):
+            return False
+        
+        if not leftover:
+            leftover = self._read_source()
+        # Trailing zero padding (page alignment) ends the stream
+        leftover = bytes(leftover).lstrip(b'\x00')
+        while not leftover and not self._source_eof:
+            leftover = bytes(self._read_source()).lstrip(b'\x00')
+        if not leftover:
+            return False
+        
+        if len(leftover) < 4 and not self._source_eof:
+            leftover += bytes(self._read_source())
+        if detect_compression(leftover) != self.compression:
+            return False
+        
+        self._decoder = _create_decoder(self.compression)
+        self._pending = leftover
+        return True
+
+
+def open_decompressed(source, compression: Optional[str] = None,
+                      chunk_size: int = DEFAULT_CHUNK_SIZE) -> io.BufferedReader:
+    """
+    Open a compressed blob as a buffered, forward-only file object.
+    
+    Args:
+        source: Binary file object, or any bytes-like object (an mmap or a
+            memoryview section of a boot image is read without copying)
+        compression: Format name; sniffed from the first bytes when None
+        chunk_size: Input chunk and read buffer size
+    
+    Returns:
+        Buffered reader yielding the decompressed bytes
+    """
+    if not hasattr(source, 'read'):
+        source = _BufferSource(source)
+    
+    if compression is None:
+        if hasattr(source, 'peek'):
+            header = source.peek(8)[:8]
+        else:
+            header = bytes(source.read(8))
+            source = _PrefixedSource(header, source)
+        compression = detect_compression(header)
+        if compression is None:
+            raise ValueError(f"Unknown compression format (magic {bytes(header).hex()})")
+    
+    if compression == 'none':
+        if isinstance(source, io.BufferedIOBase):
+            return source
+        return io.BufferedReader(_PassthroughReader(source), buffer_size=chunk_size)
+    
+    return io.BufferedReader(DecompressingReader(source, compression, chunk_size), buffer_size=chunk_size)
+
+
+class _PrefixedSource:
+    """Replays bytes consumed while sniffing before reading on."""
+    
+    def __init__(self, prefix: bytes, source):
+        self._prefix = prefix
+        self._source = source
+    
+    def read(self, size: int = -1):
+        if self._prefix:
+            if size < 0:
+                data = self._prefix + bytes(self._source.read())
+                self._prefix = b''
+                return data
+            data, self._prefix = self._prefix[:size], self._prefix[size:]
+            return data
+        return self._source.read(size)
+
+
+class _PassthroughReader(io.RawIOBase):
+    """Raw reader adapter for uncompressed sources."""
+    
+    def __init__(self, source):
+        super().__init__()
+        self._source = source
+    
+    def readable(self) -> bool:
+        return True
+    
+    def readinto(self, buffer) -> int:
+        data = self._source.read(len(buffer))
+        n = len(data)
+        buffer[:n] = data
+        return n
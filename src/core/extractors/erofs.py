@@ -0,0 +1,835 @@
+#!/usr/bin/env python3
+"""
+EROFS - Read-only EROFS filesystem reader
+
+Pure-Python reader for EROFS partition images (system, vendor, odm on
+current devices). Like the ext4 reader it resolves paths superblock ->
+inode -> directory blocks with positional reads, so only the metadata
+and data on the way are touched. Compressed files are mapped through
+their lcluster indexes and only the physical clusters (pclusters)
+covering a read are decompressed; decoded pclusters are kept in a small
+LRU so neighbouring reads do not decode them again.
+"""
+
+import fnmatch
+import posixpath
+import stat
+import struct
+import zlib
+from collections import OrderedDict
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+from .decompress import lz4_block_decompress
+from .image_source import open_image_source
+
+
+EROFS_SUPERBLOCK_OFFSET = 1024
+EROFS_MAGIC = 0xE0F5E1E2
+EROFS_MAGIC_BYTES = struct.pack('<I', EROFS_MAGIC)
+
+_SUPERBLOCK = struct.Struct('<3I2BH2Q4I16s16sI3H2BIQ')
+_COMPACT_INODE = struct.Struct('<4H4I2HI')
+_EXTENDED_INODE = struct.Struct('<4HQ4IQ2I16x')
+_DIRENT = struct.Struct('<QHBx')
+_MAP_HEADER = struct.Struct('<3H2B')
+_FULL_INDEX = struct.Struct('<2HI')
+
+# Feature flags
+INCOMPAT_ZERO_PADDING = 0x0001
+INCOMPAT_DEVICE_TABLE = 0x0008
+
+INCOMPAT_NAMES = {
+    0x0001: 'zero_padding',
+    0x0002: 'big_pcluster',
+    0x0004: 'chunked_file',
+    0x0008: 'device_table',
+    0x0010: 'ztailpacking',
+    0x0020: 'fragments',
+    0x0040: 'xattr_prefixes',
+}
+
+# Inode data layouts
+LAYOUT_FLAT_PLAIN = 0
+LAYOUT_COMPRESSED_FULL = 1
+LAYOUT_FLAT_INLINE = 2
+LAYOUT_COMPRESSED_COMPACT = 3
+LAYOUT_CHUNK_BASED = 4
+
+LAYOUT_NAMES = {
+    LAYOUT_FLAT_PLAIN: 'flat_plain',
+    LAYOUT_COMPRESSED_FULL: 'compressed_full',
+    LAYOUT_FLAT_INLINE: 'flat_inline',
+    LAYOUT_COMPRESSED_COMPACT: 'compressed_compact',
+    LAYOUT_CHUNK_BASED: 'chunk_based',
+}
+
+CHUNK_FORMAT_BLKBITS_MASK = 0x001F
+CHUNK_FORMAT_INDEXES = 0x0020
+NULL_ADDR = 0xFFFFFFFF
+
+# Compressed inode map header advise bits
+ADVISE_COMPACTED_2B = 0x0001
+ADVISE_BIG_PCLUSTER_1 = 0x0002
+ADVISE_BIG_PCLUSTER_2 = 0x0004
+ADVISE_INLINE_PCLUSTER = 0x0008
+ADVISE_INTERLACED_PCLUSTER = 0x0010
+ADVISE_FRAGMENT_PCLUSTER = 0x0020
+FRAGMENT_INODE_BIT = 7
+
+# Logical cluster types
+LCLUSTER_PLAIN = 0
+LCLUSTER_HEAD1 = 1
+LCLUSTER_NONHEAD = 2
+LCLUSTER_HEAD2 = 3
+LI_D0_CBLKCNT = 1 << 11
+
+# Algorithm formats of a decoded extent
+COMPRESSION_LZ4 = 0
+COMPRESSION_LZMA = 1
+COMPRESSION_DEFLATE = 2
+COMPRESSION_ZSTD = 3
+COMPRESSION_SHIFTED = 4
+COMPRESSION_INTERLACED = 5
+
+COMPRESSION_NAMES = {
+    COMPRESSION_LZ4: 'lz4',
+    COMPRESSION_LZMA: 'lzma',
+    COMPRESSION_DEFLATE: 'deflate',
+    COMPRESSION_ZSTD: 'zstd',
+}
+
+MAX_SYMLINK_DEPTH = 40
+DEFAULT_PCLUSTER_CACHE = 32
+
+
+def is_erofs(image_path: str) -> bool:
+    """Check for the EROFS superblock magic (raw images only)."""
+    try:
+        with open(image_path, 'rb') as f:
+            f.seek(EROFS_SUPERBLOCK_OFFSET)
+            return f.read(4) == EROFS_MAGIC_BYTES
+    except OSError:
+        return False
+
+
+class ErofsInode:
+    """The fields of an on-disk inode needed for reading."""
+    
+    __slots__ = ('nid', 'offset', 'layout', 'extended', 'xattr_size', 'mode', 'uid', 'gid',
+                 'size', 'mtime', 'links', 'raw_u', 'zmap')
+    
+    def __init__(self, nid: int, offset: int, raw: bytes, build_time: int):
+        self.nid = nid
+        self.offset = offset
+        i_format = struct.unpack_from('<H', raw, 0)[0]
+        self.extended = bool(i_format & 1)
+        self.layout = (i_format >> 1) & 0x7
+        if self.extended:
+            (_, xattr_count, self.mode, _, self.size, self.raw_u, _, self.uid, self.gid,
+             self.mtime, _, self.links) = _EXTENDED_INODE.unpack_from(raw, 0)
+        else:
+            (_, xattr_count, self.mode, self.links, self.size, _, self.raw_u, _,
+             self.uid, self.gid, _) = _COMPACT_INODE.unpack_from(raw, 0)
+            self.mtime = build_time
+        self.xattr_size = 12 + 4 * (xattr_count - 1) if xattr_count else 0
+        self.zmap = None
+    
+    @property
+    def inode_size(self) -> int:
+        return _EXTENDED_INODE.size if self.extended else _COMPACT_INODE.size
+    
+    @property
+    def inline_offset(self) -> int:
+        """Image offset right after the inode and its inline xattrs."""
+        return self.offset + self.inode_size + self.xattr_size
+    
+    @property
+    def is_compressed(self) -> bool:
+        return self.layout in (LAYOUT_COMPRESSED_FULL, LAYOUT_COMPRESSED_COMPACT)
+    
+    @property
+    def is_dir(self) -> bool:
+        return stat.S_ISDIR(self.mode)
+    
+    @property
+    def is_file(self) -> bool:
+        return stat.S_ISREG(self.mode)
+    
+    @property
+    def is_symlink(self) -> bool:
+        return stat.S_ISLNK(self.mode)
+    
+    def __repr__(self):
+        return (f"ErofsInode({self.nid}, mode={oct(self.mode)}, size={self.size}, "
+                f"layout={LAYOUT_NAMES.get(self.layout, self.layout)})")
+
+
+class ErofsDirEntry:
+    """A directory entry: name, inode id (nid) and file type."""
+    
+    __slots__ = ('name', 'nid', 'file_type')
+    
+    # Directory entry file_type values
+    TYPES = {1: 'file', 2: 'dir', 3: 'chardev', 4: 'blockdev', 5: 'fifo', 6: 'socket', 7: 'symlink'}
+    
+    def __init__(self, name: str, nid: int, file_type: int):
+        self.name = name
+        self.nid = nid
+        self.file_type = file_type
+    
+    @property
+    def type_name(self) -> str:
+        return self.TYPES.get(self.file_type, 'unknown')
+    
+    def __repr__(self):
+        return f"ErofsDirEntry({self.name!r}, nid={self.nid}, type={self.type_name})"
+
+
+class _ZMap:
+    """Per-inode compression map header, decoded on first access."""
+    
+    __slots__ = ('advise', 'algorithms', 'lcluster_bits', 'total', 'index_base', 'whole_fragment',
+                 'tail_data_size', 'tail_head_lcn', 'tail_data_offset', 'fragment_offset')
+    
+    def __init__(self):
+        self.whole_fragment = False
+        self.tail_head_lcn = -1
+        self.tail_data_size = 0
+        self.tail_data_offset = 0
+        self.fragment_offset = None
+
+
+class _LCluster:
+    """One decoded logical cluster index."""
+    
+    __slots__ = ('lcn', 'type', 'cluster_offset', 'pblk', 'delta0', 'compressed_blocks', 'next_pack')
+    
+    def __init__(self, lcn: int):
+        self.lcn = lcn
+        self.compressed_blocks = 0
+        self.delta0 = 0
+        self.pblk = 0
+        self.next_pack = 0
+
+
+class ErofsImage:
+    """
+    Read-only EROFS filesystem on a positional-read source.
+    
+    Args:
+        source: Object with read_at(offset, size) and size, such as the
+            result of open_image_source()
+        source_name: Name used in error messages
+        cache_size: Number of decoded pclusters to keep
+    """
+    
+    def __init__(self, source, source_name: str = '<image>', cache_size: int = DEFAULT_PCLUSTER_CACHE):
+        self.source_name = source_name
+        self._source = source
+        self._owns_source = False
+        self._path_cache: Dict[str, int] = {}
+        self._pclusters: 'OrderedDict[Tuple[int, int, int], bytes]' = OrderedDict()
+        self._cache_size = cache_size
+        self.bytes_read = 0
+        self.pclusters_decoded = 0
+        self._parse_superblock()
+        self._path_cache['/'] = self.root_nid
+    
+    @classmethod
+    def open(cls, image_path: str, cache_size: int = DEFAULT_PCLUSTER_CACHE) -> 'ErofsImage':
+        """Open a raw or sparse EROFS image file."""
+        source = open_image_source(image_path)
+        try:
+            image = cls(source, source_name=image_path, cache_size=cache_size)
+        except Exception:
+            source.close()
+            raise
+        image._owns_source = True
+        return image
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def close(self):
+        if self._owns_source and self._source is not None:
+            self._source.close()
+        self._source = None
+        self._pclusters.clear()
+    
+    def get_info(self) -> Dict[str, Any]:
+        """Get superblock fields as a plain dict."""
+        return {
+            'volume_name': self.volume_name,
+            'uuid': self.uuid,
+            'block_size': self.block_size,
+            'blocks_count': self.blocks_count,
+            'inodes_count': self.inodes_count,
+            'build_time': self.build_time,
+            'size': self.blocks_count * self.block_size,
+            'features': [name for flag, name in INCOMPAT_NAMES.items() if self.feature_incompat & flag],
+        }
+    
+    def lookup(self, path: str, follow_symlinks: bool = True) -> ErofsInode:
+        """
+        Resolve a path to its inode.
+        
+        Absolute symlink targets are resolved from the root of this
+        filesystem.
+        
+        Raises:
+            FileNotFoundError: If a path component does not exist
+        """
+        return self._inode(self._resolve(path, follow_symlinks, 0))
+    
+    def exists(self, path: str) -> bool:
+        try:
+            self.lookup(path)
+            return True
+        except (FileNotFoundError, NotADirectoryError):
+            return False
+    
+    def iter_dir(self, path: str) -> Iterator[ErofsDirEntry]:
+        """Iterate over the entries of a directory (without . and ..)."""
+        inode = self.lookup(path)
+        if not inode.is_dir:
+            raise NotADirectoryError(f"{self.source_name}: {path} is not a directory")
+        for block in range(self._dir_blocks(inode)):
+            for entry in self._dir_block(inode, block):
+                if entry.name not in ('.', '..'):
+                    yield entry
+    
+    def listdir(self, path: str = '/') -> List[str]:
+        return [entry.name for entry in self.iter_dir(path)]
+    
+    def glob(self, pattern: str) -> List[str]:
+        """
+        Expand a glob such as 'etc/fstab.*' or 'lib*/hw/*.so'.
+        
+        Only directories on the pattern's path are listed.
+        """
+        matches = ['/']
+        for part in pattern.strip('/').split('/'):
+            expanded = []
+            for directory in matches:
+                try:
+                    if not any(c in part for c in '*?['):
+                        candidate = posixpath.join(directory, part)
+                        if self.exists(candidate):
+                            expanded.append(candidate)
+                        continue
+                    for entry in self.iter_dir(directory):
+                        if fnmatch.fnmatchcase(entry.name, part):
+                            expanded.append(posixpath.join(directory, entry.name))
+                except NotADirectoryError:
+                    continue
+            matches = expanded
+        return sorted(matches)
+    
+    def read_file(self, path: str, offset: int = 0, size: int = -1) -> bytes:
+        """
+        Read a file, or the [offset, offset + size) range of it.
+        
+        Only the blocks, or for compressed files the pclusters, covering
+        the range are read.
+        """
+        inode = self.lookup(path)
+        if inode.is_dir:
+            raise IsADirectoryError(f"{self.source_name}: {path} is a directory")
+        return self.read_inode(inode, offset, size)
+    
+    def readlink(self, path: str) -> str:
+        inode = self.lookup(path, follow_symlinks=False)
+        if not inode.is_symlink:
+            raise ValueError(f"{self.source_name}: {path} is not a symlink")
+        return self.read_inode(inode).decode('utf-8', errors='surrogateescape')
+    
+    def read_inode(self, inode: ErofsInode, offset: int = 0, size: int = -1) -> bytes:
+        """Read data of an inode."""
+        if offset >= inode.size:
+            return b''
+        if size < 0 or offset + size > inode.size:
+            size = inode.size - offset
+        if size == 0:
+            return b''
+        
+        if inode.layout in (LAYOUT_FLAT_PLAIN, LAYOUT_FLAT_INLINE):
+            return self._read_flat(inode, offset, size)
+        if inode.layout == LAYOUT_CHUNK_BASED:
+            return self._read_chunked(inode, offset, size)
+        if inode.is_compressed:
+            return self._read_compressed(inode, offset, size)
+        raise ValueError(f"{self.source_name}: inode {inode.nid} has unknown data layout {inode.layout}")
+    
+    def _parse_superblock(self):
+        raw = self._read(EROFS_SUPERBLOCK_OFFSET, _SUPERBLOCK.size)
+        if len(raw) < _SUPERBLOCK.size or raw[:4] != EROFS_MAGIC_BYTES:
+            raise ValueError(f"{self.source_name}: not an EROFS filesystem (bad superblock magic)")
+        
+        (_, _, self.feature_compat, blkszbits, _, self.root_nid, self.inodes_count,
+         self.build_time, _, self.blocks_count, meta_blkaddr, _, uuid, volume_name,
+         self.feature_incompat, _, self.extra_devices, _, _, _, _,
+         self.packed_nid) = _SUPERBLOCK.unpack(raw)
+        
+        if not 9 <= blkszbits <= 16:
+            raise ValueError(f"{self.source_name}: invalid EROFS block size bits {blkszbits}")
+        self.block_bits = blkszbits
+        self.block_size = 1 << blkszbits
+        self.uuid = uuid.hex()
+        self.volume_name = volume_name.split(b'\x00', 1)[0].decode('utf-8', errors='replace')
+        self._meta_offset = meta_blkaddr * self.block_size
+    
+    def _read(self, offset: int, size: int) -> bytes:
+        data = self._source.read_at(offset, size)
+        self.bytes_read += len(data)
+        return data
+    
+    def _inode(self, nid: int) -> ErofsInode:
+        offset = self._meta_offset + nid * 32
+        raw = self._read(offset, _EXTENDED_INODE.size)
+        if len(raw) < _COMPACT_INODE.size or (raw[0] & 1 and len(raw) < _EXTENDED_INODE.size):
+            raise ValueError(f"{self.source_name}: inode {nid} lies outside the image")
+        return ErofsInode(nid, offset, raw, self.build_time)
+    
+    # Uncompressed layouts
+    
+    def _read_flat(self, inode: ErofsInode, offset: int, size: int) -> bytes:
+        """Read FLAT_PLAIN data, or FLAT_INLINE data whose last block sits after the inode."""
+        bs = self.block_size
+        base = inode.raw_u * bs
+        if inode.layout == LAYOUT_FLAT_PLAIN:
+            return self._read(base + offset, size)
+        
+        tail_start = ((inode.size + bs - 1) // bs - 1) * bs
+        parts = []
+        if offset < tail_start:
+            head = min(size, tail_start - offset)
+            parts.append(self._read(base + offset, head))
+            offset += head
+            size -= head
+        if size:
+            parts.append(self._read(inode.inline_offset + offset - tail_start, size))
+        return parts[0] if len(parts) == 1 else b''.join(parts)
+    
+    def _read_chunked(self, inode: ErofsInode, offset: int, size: int) -> bytes:
+        """Read a CHUNK_BASED inode through its chunk block map or chunk indexes."""
+        chunk_format = inode.raw_u & 0xFFFF
+        chunk_bits = self.block_bits + (chunk_format & CHUNK_FORMAT_BLKBITS_MASK)
+        chunk_size = 1 << chunk_bits
+        unit = 8 if chunk_format & CHUNK_FORMAT_INDEXES else 4
+        table = (inode.inline_offset + unit - 1) // unit * unit
+        
+        first = offset >> chunk_bits
+        last = (offset + size - 1) >> chunk_bits
+        raw = self._read(table + first * unit, (last - first + 1) * unit)
+        
+        parts = []
+        for i in range(last - first + 1):
+            if unit == 8:
+                _, device, blkaddr = struct.unpack_from('<2HI', raw, i * 8)
+                if device and blkaddr != NULL_ADDR:
+                    raise ValueError(f"{self.source_name}: data on extra device {device} is not supported")
+            else:
+                blkaddr = struct.unpack_from('<I', raw, i * 4)[0]
+            start = (first + i) << chunk_bits
+            within = max(offset, start) - start
+            take = min(offset + size, start + chunk_size) - start - within
+            if blkaddr == NULL_ADDR:
+                parts.append(bytes(take))
+            else:
+                parts.append(self._read(blkaddr * self.block_size + within, take))
+        return b''.join(parts)
+    
+    # Compressed layouts
+    
+    def _zmap(self, inode: ErofsInode) -> _ZMap:
+        """Decode the map header of a compressed inode, and locate its tail extent."""
+        if inode.zmap is not None:
+            return inode.zmap
+        
+        zmap = _ZMap()
+        header_offset = (inode.inline_offset + 7) // 8 * 8
+        header = self._read(header_offset, _MAP_HEADER.size)
+        fragment_lo, idata_size, zmap.advise, algorithms, cluster_bits = _MAP_HEADER.unpack_from(header, 0)
+        zmap.algorithms = (algorithms & 0xF, algorithms >> 4)
+        zmap.lcluster_bits = self.block_bits + (cluster_bits & 0x7)
+        zmap.total = (inode.size + (1 << zmap.lcluster_bits) - 1) >> zmap.lcluster_bits
+        zmap.index_base = header_offset + 8
+        if inode.layout == LAYOUT_COMPRESSED_FULL:
+            # Full indexes follow a legacy 8-byte gap after the header
+            zmap.index_base += 8
+        inode.zmap = zmap
+        
+        if zmap.advise & ADVISE_FRAGMENT_PCLUSTER and cluster_bits >> FRAGMENT_INODE_BIT:
+            # The whole file lives in the packed inode
+            zmap.fragment_offset = struct.unpack_from('<Q', header, 0)[0] ^ (1 << 63)
+            zmap.whole_fragment = True
+            return zmap
+        
+        if zmap.advise & (ADVISE_INLINE_PCLUSTER | ADVISE_FRAGMENT_PCLUSTER) and inode.size:
+            tail, head = self._find_head(inode, zmap, inode.size - 1)
+            if zmap.advise & ADVISE_INLINE_PCLUSTER:
+                # The inline pcluster follows the last index pack
+                zmap.tail_data_size = idata_size
+                zmap.tail_data_offset = tail.next_pack
+            zmap.tail_head_lcn = head.lcn
+            if zmap.advise & ADVISE_FRAGMENT_PCLUSTER:
+                zmap.fragment_offset = fragment_lo | (idata_size << 16)
+                if inode.layout == LAYOUT_COMPRESSED_FULL:
+                    zmap.fragment_offset |= head.pblk << 32
+        return zmap
+    
+    def _load_lcluster(self, inode: ErofsInode, zmap: _ZMap, lcn: int) -> _LCluster:
+        if lcn < 0 or lcn >= zmap.total:
+            raise ValueError(f"{self.source_name}: lcluster {lcn} out of range for inode {inode.nid}")
+        if inode.layout == LAYOUT_COMPRESSED_FULL:
+            return self._load_full_lcluster(inode, zmap, lcn)
+        return self._load_compact_lcluster(inode, zmap, lcn)
+    
+    def _load_full_lcluster(self, inode: ErofsInode, zmap: _ZMap, lcn: int) -> _LCluster:
+        position = zmap.index_base + lcn * _FULL_INDEX.size
+        raw = self._read(position, _FULL_INDEX.size)
+        advise, cluster_offset, value = _FULL_INDEX.unpack(raw)
+        
+        m = _LCluster(lcn)
+        m.next_pack = position + _FULL_INDEX.size
+        m.type = advise & 0x3
+        if m.type == LCLUSTER_NONHEAD:
+            m.cluster_offset = 1 << zmap.lcluster_bits
+            m.delta0 = value & 0xFFFF
+            if m.delta0 & LI_D0_CBLKCNT:
+                m.compressed_blocks = m.delta0 & ~LI_D0_CBLKCNT
+                m.delta0 = 1
+        else:
+            m.cluster_offset = cluster_offset
+            m.pblk = value
+        return m
+    
+    def _load_compact_lcluster(self, inode: ErofsInode, zmap: _ZMap, lcn: int) -> _LCluster:
+        """
+        Decode one lcluster from the compacted index packs.
+        
+        Indexes are packed as a few 4-byte entries up to 32-byte
+        alignment, then 2-byte entries in packs of 16 (if enabled),
+        then 4-byte entries again. Each pack ends with a base block
+        address; block addresses of heads are derived from it.
+        """
+        ebase = zmap.index_base
+        initial_4b = ((32 - ebase % 32) // 4) & 7
+        compacted_2b = 0
+        if zmap.advise & ADVISE_COMPACTED_2B and initial_4b < zmap.total:
+            compacted_2b = (zmap.total - initial_4b) // 16 * 16
+        
+        position = ebase
+        shift = 2
+        index = lcn
+        if index >= initial_4b:
+            position += initial_4b * 4
+            index -= initial_4b
+            if index < compacted_2b:
+                shift = 1
+            else:
+                position += compacted_2b * 2
+                index -= compacted_2b
+        position += index << shift
+        
+        lcluster_bits = zmap.lcluster_bits
+        if shift == 2 and lcluster_bits <= 14:
+            count = 2
+        elif shift == 1 and lcluster_bits <= 12:
+            count = 16
+        else:
+            raise ValueError(f"{self.source_name}: unsupported compacted index for inode {inode.nid}")
+        
+        pack_size = count << shift
+        pack_start = position - position % pack_size
+        pack = self._read(pack_start, pack_size) + b'\x00\x00\x00'
+        big_pcluster = bool(zmap.advise & ADVISE_BIG_PCLUSTER_1)
+        lobits = max(lcluster_bits, 12)
+        encode_bits = (pack_size - 4) * 8 // count
+        i = (position - pack_start) >> shift
+        
+        def decode(n):
+            bit = encode_bits * n
+            v = int.from_bytes(pack[bit // 8:bit // 8 + 4], 'little') >> (bit & 7)
+            return v & ((1 << lobits) - 1), (v >> lobits) & 0x3
+        
+        m = _LCluster(lcn)
+        m.next_pack = pack_start + pack_size
+        lo, m.type = decode(i)
+        if m.type == LCLUSTER_NONHEAD:
+            m.cluster_offset = 1 << lcluster_bits
+            if lo & LI_D0_CBLKCNT:
+                if not big_pcluster:
+                    raise ValueError(f"{self.source_name}: corrupt compacted index for inode {inode.nid}")
+                m.compressed_blocks = lo & ~LI_D0_CBLKCNT
+                m.delta0 = 1
+            elif i + 1 != count:
+                m.delta0 = lo
+            else:
+                # The last entry of a pack stores the lookahead distance,
+                # so the lookback distance comes from its predecessor
+                lo, entry_type = decode(i - 1)
+                if entry_type != LCLUSTER_NONHEAD:
+                    lo = 0
+                elif lo & LI_D0_CBLKCNT:
+                    lo = 1
+                m.delta0 = lo + 1
+            return m
+        
+        m.cluster_offset = lo
+        if not big_pcluster:
+            blocks = 1
+            while i > 0:
+                i -= 1
+                lo, entry_type = decode(i)
+                if entry_type == LCLUSTER_NONHEAD:
+                    i -= lo
+                if i >= 0:
+                    blocks += 1
+        else:
+            blocks = 0
+            while i > 0:
+                i -= 1
+                lo, entry_type = decode(i)
+                if entry_type == LCLUSTER_NONHEAD:
+                    if lo & LI_D0_CBLKCNT:
+                        i -= 1
+                        blocks += lo & ~LI_D0_CBLKCNT
+                        continue
+                    if lo <= 1:
+                        raise ValueError(f"{self.source_name}: corrupt compacted index for inode {inode.nid}")
+                    i -= lo - 2
+                    continue
+                blocks += 1
+        m.pblk = struct.unpack_from('<I', pack, pack_size - 4)[0] + blocks
+        return m
+    
+    def _lookback(self, inode: ErofsInode, zmap: _ZMap, m: _LCluster, distance: int) -> _LCluster:
+        """Walk back from an lcluster to the head lcluster of its extent."""
+        while m.lcn >= distance:
+            m = self._load_lcluster(inode, zmap, m.lcn - distance)
+            if m.type != LCLUSTER_NONHEAD:
+                return m
+            if not m.delta0:
+                break
+            distance = m.delta0
+        raise ValueError(f"{self.source_name}: corrupt lcluster lookback in inode {inode.nid}")
+    
+    def _map_extent(self, inode: ErofsInode, zmap: _ZMap, offset: int) -> Tuple[int, int, int, int, int, str]:
+        """
+        Map a file offset to the extent holding it.
+        
+        Returns:
+            (logical start, decoded length, physical offset, physical
+            length, algorithm format, where) with where one of 'blocks',
+            'inline' or 'fragment'
+        """
+        if zmap.whole_fragment:
+            return 0, inode.size, zmap.fragment_offset, inode.size, COMPRESSION_SHIFTED, 'fragment'
+        
+        bits = zmap.lcluster_bits
+        _, head = self._find_head(inode, zmap, offset)
+        start = (head.lcn << bits) | head.cluster_offset
+        end = self._extent_end(inode, zmap, head.lcn)
+        
+        if head.type == LCLUSTER_PLAIN:
+            algorithm = (COMPRESSION_INTERLACED if zmap.advise & ADVISE_INTERLACED_PCLUSTER
+                         else COMPRESSION_SHIFTED)
+        else:
+            algorithm = zmap.algorithms[1 if head.type == LCLUSTER_HEAD2 else 0]
+        
+        if head.lcn == zmap.tail_head_lcn:
+            if zmap.advise & ADVISE_INLINE_PCLUSTER:
+                return start, end - start, zmap.tail_data_offset, zmap.tail_data_size, algorithm, 'inline'
+            if zmap.advise & ADVISE_FRAGMENT_PCLUSTER:
+                return start, end - start, zmap.fragment_offset, end - start, algorithm, 'fragment'
+        
+        return (start, end - start, head.pblk * self.block_size,
+                self._compressed_length(inode, zmap, head), algorithm, 'blocks')
+    
+    def _find_head(self, inode: ErofsInode, zmap: _ZMap, offset: int) -> Tuple[_LCluster, _LCluster]:
+        """Load the lcluster holding offset and the head lcluster of its extent."""
+        bits = zmap.lcluster_bits
+        m = self._load_lcluster(inode, zmap, offset >> bits)
+        if m.type == LCLUSTER_NONHEAD:
+            return m, self._lookback(inode, zmap, m, m.delta0)
+        if (offset & ((1 << bits) - 1)) >= m.cluster_offset:
+            return m, m
+        # The start of this lcluster still belongs to the previous extent
+        if not m.lcn:
+            raise ValueError(f"{self.source_name}: corrupt first lcluster in inode {inode.nid}")
+        return m, self._lookback(inode, zmap, m, 1)
+    
+    def _extent_end(self, inode: ErofsInode, zmap: _ZMap, head_lcn: int) -> int:
+        """Logical end of the extent starting in head_lcn: the start of the next head."""
+        bits = zmap.lcluster_bits
+        lcn = head_lcn + 1
+        while lcn < zmap.total:
+            m = self._load_lcluster(inode, zmap, lcn)
+            if m.type != LCLUSTER_NONHEAD:
+                return min((lcn << bits) | m.cluster_offset, inode.size)
+            lcn += 1
+        return inode.size
+    
+    def _compressed_length(self, inode: ErofsInode, zmap: _ZMap, head: _LCluster) -> int:
+        """Size of the pcluster of a head lcluster: one lcluster unless a big pcluster says otherwise."""
+        big = {
+            LCLUSTER_HEAD1: zmap.advise & ADVISE_BIG_PCLUSTER_1,
+            LCLUSTER_HEAD2: zmap.advise & ADVISE_BIG_PCLUSTER_2,
+            LCLUSTER_PLAIN: zmap.advise & (ADVISE_BIG_PCLUSTER_1 | ADVISE_BIG_PCLUSTER_2),
+        }[head.type]
+        if not big or head.lcn + 1 >= zmap.total:
+            return 1 << zmap.lcluster_bits
+        
+        m = self._load_lcluster(inode, zmap, head.lcn + 1)
+        if m.type != LCLUSTER_NONHEAD:
+            return 1 << zmap.lcluster_bits
+        if m.delta0 != 1 or not m.compressed_blocks:
+            raise ValueError(f"{self.source_name}: missing pcluster block count in inode {inode.nid}")
+        return m.compressed_blocks * self.block_size
+    
+    def _read_compressed(self, inode: ErofsInode, offset: int, size: int) -> bytes:
+        zmap = self._zmap(inode)
+        end = offset + size
+        parts = []
+        while offset < end:
+            start, length, physical, physical_length, algorithm, where = \
+                self._map_extent(inode, zmap, offset)
+            if length <= 0 or start + length <= offset:
+                raise ValueError(f"{self.source_name}: corrupt extent map at offset {offset} in inode {inode.nid}")
+            
+            take = min(end, start + length) - offset
+            if where == 'fragment':
+                packed = self._inode(self.packed_nid)
+                parts.append(self.read_inode(packed, physical + offset - start, take))
+            else:
+                data = self._pcluster(start, length, physical, physical_length, algorithm)
+                parts.append(data[offset - start:offset - start + take])
+            offset += take
+        return parts[0] if len(parts) == 1 else b''.join(parts)
+    
+    def _pcluster(self, start: int, length: int, physical: int, physical_length: int, algorithm: int) -> bytes:
+        """Decoded data of one extent, through the pcluster LRU."""
+        key = (physical, length, start % self.block_size)
+        data = self._pclusters.get(key)
+        if data is not None:
+            self._pclusters.move_to_end(key)
+            return data
+        
+        raw = self._read(physical, physical_length)
+        data = self._decode(raw, length, start, algorithm)
+        self.pclusters_decoded += 1
+        self._pclusters[key] = data
+        if len(self._pclusters) > self._cache_size:
+            self._pclusters.popitem(last=False)
+        return data
+    
+    def _decode(self, raw: bytes, length: int, start: int, algorithm: int) -> bytes:
+        if algorithm == COMPRESSION_SHIFTED:
+            return raw[:length]
+        if algorithm == COMPRESSION_INTERLACED:
+            # The block is rotated so the data lines up with the logical block boundary
+            skip = start % self.block_size
+            right = min(self.block_size - skip, length)
+            return raw[skip:skip + right] + raw[:length - right]
+        
+        if self.feature_incompat & INCOMPAT_ZERO_PADDING:
+            # Compressed data is stored at the end of the pcluster after zero padding
+            margin = 0
+            limit = min(len(raw), self.block_size)
+            while margin < limit and not raw[margin]:
+                margin += 1
+            if margin >= len(raw):
+                raise ValueError(f"{self.source_name}: empty pcluster at logical offset {start}")
+            raw = raw[margin:]
+        
+        if algorithm == COMPRESSION_LZ4:
+            data = lz4_block_decompress(raw, length)
+        elif algorithm == COMPRESSION_DEFLATE:
+            data = zlib.decompressobj(-zlib.MAX_WBITS).decompress(raw, length)
+        else:
+            name = COMPRESSION_NAMES.get(algorithm, str(algorithm))
+            raise ValueError(f"{self.source_name}: {name} compressed EROFS data is not supported")
+        
+        if len(data) != length:
+            raise ValueError(f"{self.source_name}: pcluster at logical offset {start} decoded "
+                             f"to {len(data)} bytes, expected {length}")
+        return data
+    
+    # Directories
+    
+    def _dir_blocks(self, inode: ErofsInode) -> int:
+        return (inode.size + self.block_size - 1) // self.block_size
+    
+    def _dir_block(self, inode: ErofsInode, block: int) -> List[ErofsDirEntry]:
+        """Parse one directory block: dirents first, then their names back to back."""
+        data = self.read_inode(inode, block * self.block_size, self.block_size)
+        if len(data) < _DIRENT.size:
+            return []
+        count = _DIRENT.unpack_from(data, 0)[1] // _DIRENT.size
+        dirents = [_DIRENT.unpack_from(data, i * _DIRENT.size) for i in range(count)]
+        
+        entries = []
+        for i, (nid, name_offset, file_type) in enumerate(dirents):
+            if i + 1 < count:
+                name = data[name_offset:dirents[i + 1][1]]
+            else:
+                name = data[name_offset:].split(b'\x00', 1)[0]
+            entries.append(ErofsDirEntry(name.decode('utf-8', errors='surrogateescape'), nid, file_type))
+        return entries
+    
+    def _find_entry(self, directory: ErofsInode, name: str) -> Optional[int]:
+        """Binary search the sorted directory blocks, reading only the blocks probed."""
+        target = name.encode('utf-8', errors='surrogateescape')
+        low, high = 0, self._dir_blocks(directory) - 1
+        while low <= high:
+            middle = (low + high) // 2
+            entries = self._dir_block(directory, middle)
+            if not entries:
+                return None
+            names = [entry.name.encode('utf-8', errors='surrogateescape') for entry in entries]
+            if target < names[0]:
+                high = middle - 1
+            elif target > names[-1]:
+                low = middle + 1
+            else:
+                left, right = 0, len(names) - 1
+                while left <= right:
+                    mid = (left + right) // 2
+                    if names[mid] == target:
+                        return entries[mid].nid
+                    if names[mid] < target:
+                        left = mid + 1
+                    else:
+                        right = mid - 1
+                return None
+        return None
+    
+    def _resolve(self, path: str, follow_symlinks: bool, depth: int) -> int:
+        """Resolve path to a nid, caching resolved directories."""
+        path = posixpath.normpath('/' + path.lstrip('/'))
+        if path in self._path_cache and (follow_symlinks or path == '/'):
+            return self._path_cache[path]
+        
+        parent_path, name = posixpath.split(path)
+        parent = self._inode(self._resolve(parent_path, True, depth))
+        if not parent.is_dir:
+            raise NotADirectoryError(f"{self.source_name}: {parent_path} is not a directory")
+        
+        nid = self._find_entry(parent, name)
+        if nid is None:
+            raise FileNotFoundError(f"{self.source_name}: {path} not found")
+        
+        inode = self._inode(nid)
+        if inode.is_symlink and follow_symlinks:
+            if depth >= MAX_SYMLINK_DEPTH:
+                raise OSError(f"{self.source_name}: too many levels of symbolic links at {path}")
+            target = self.read_inode(inode).decode('utf-8', errors='surrogateescape')
+            nid = self._resolve(posixpath.join(parent_path, target), True, depth + 1)
+        
+        if follow_symlinks:
+            self._path_cache[path] = nid
+        return nid
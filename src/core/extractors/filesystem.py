@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Filesystem - Open partition images regardless of filesystem type
+
+Detects ext4 or EROFS from the superblock of a raw or sparse partition
+image, or of a logical partition inside a super image, and returns the
+matching reader. Both readers share the same lookup/glob/read_file
+interface.
+"""
+
+import struct
+from typing import Dict, List, Optional, Union
+
+from .image_source import open_image_source
+from .ext4 import Ext4Image, EXT4_MAGIC, EXT4_SUPERBLOCK_OFFSET
+from .erofs import ErofsImage, EROFS_MAGIC_BYTES, EROFS_SUPERBLOCK_OFFSET
+from .super_image import SuperImage
+
+
+def detect_filesystem(source) -> str:
+    """Get 'ext4', 'erofs' or 'unknown' for a positional-read source."""
+    if source.read_at(EROFS_SUPERBLOCK_OFFSET, 4) == EROFS_MAGIC_BYTES:
+        return 'erofs'
+    magic = source.read_at(EXT4_SUPERBLOCK_OFFSET + 0x38, 2)
+    if len(magic) == 2 and struct.unpack('<H', magic)[0] == EXT4_MAGIC:
+        return 'ext4'
+    return 'unknown'
+
+
+def load_filesystem(source, source_name: str = '<image>') -> Union[Ext4Image, ErofsImage]:
+    """
+    Open the filesystem on a positional-read source.
+    
+    The returned reader takes ownership of the source.
+    
+    Raises:
+        ValueError: If the source holds neither filesystem
+    """
+    kind = detect_filesystem(source)
+    if kind == 'erofs':
+        image = ErofsImage(source, source_name=source_name)
+    elif kind == 'ext4':
+        image = Ext4Image(source, source_name=source_name)
+    else:
+        raise ValueError(f"{source_name}: no ext4 or EROFS filesystem found")
+    image._owns_source = True
+    return image
+
+
+def open_filesystem(image_path: str, partition: Optional[str] = None) -> Union[Ext4Image, ErofsImage]:
+    """
+    Open a raw or sparse ext4/EROFS partition image.
+    
+    Args:
+        image_path: Partition image, or super image if partition is given
+        partition: Logical partition inside a super image, e.g. 'vendor'
+    
+    Raises:
+        ValueError: If the image holds neither filesystem
+    """
+    if partition is None:
+        source = open_image_source(image_path)
+    else:
+        super_image = SuperImage.open(image_path)
+        try:
+            source = super_image.open_partition(partition, close_image=True)
+        except Exception:
+            super_image.close()
+            raise
+    try:
+        return load_filesystem(source, source.source_name)
+    except Exception:
+        source.close()
+        raise
+
+
+def read_partition_files(image_path: str, patterns: List[str],
+                         partition: Optional[str] = None) -> Dict[str, bytes]:
+    """
+    Read files matching glob patterns from an ext4 or EROFS partition image.
+    
+    Args:
+        image_path: Raw or sparse partition image, or super image
+        patterns: Globs relative to the partition root, e.g. 'build.prop'
+        partition: Logical partition to read inside a super image
+    
+    Returns:
+        Dict mapping matching paths to file contents
+    """
+    files = {}
+    with open_filesystem(image_path, partition) as image:
+        for pattern in patterns:
+            for path in image.glob(pattern):
+                try:
+                    inode = image.lookup(path)
+                except (FileNotFoundError, NotADirectoryError):
+                    # Dangling symlink
+                    continue
+                if inode.is_file:
+                    files[path.lstrip('/')] = image.read_inode(inode)
+    return files
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Image Source - Positional read access to partition images
+
+Filesystem readers only need "read n bytes at offset". This module
+provides that over a memory-mapped raw image, and picks the sparse
+reader automatically for sparse images, so the filesystem code never
+has to care how the image is stored. Windows over another source expose
+logical partitions of a super image the same way.
+"""
+
+import mmap
+from bisect import bisect_right
+from typing import List, Optional, Tuple, Union
+
+from .sparse import SparseImage, is_sparse
+
+
+class FileImage:
+    """Raw image file with positional reads through a read-only mmap."""
+    
+    def __init__(self, image_path: str):
+        self.source_name = image_path
+        self._file = open(image_path, 'rb')
+        self._mmap = None
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            pass
+        self.size = len(self._mmap) if self._mmap is not None else 0
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def read_at(self, offset: int, size: int) -> bytes:
+        """Read up to size bytes at offset; only those bytes are paged in."""
+        if self._mmap is None or offset >= self.size or size <= 0:
+            return b''
+        return self._mmap[offset:offset + size]
+    
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class ImageWindow:
+    """
+    Zero-copy view of a byte range list of another positional-read source.
+    
+    Used for logical partitions inside a super image: the view's
+    contents are the given extents laid end to end, and reads are
+    translated into reads of the underlying source.
+    
+    Args:
+        source: Underlying object with read_at(offset, size)
+        extents: (source offset, length) pairs in logical order; a
+            source offset of None reads as zeros
+        source_name: Name used in error messages
+        owner: Object closed together with this view, if any
+    """
+    
+    def __init__(self, source, extents: List[Tuple[Optional[int], int]],
+                 source_name: str = '<window>', owner=None):
+        self.source_name = source_name
+        self._source = source
+        self._owner = owner
+        self._starts = []
+        self._extents = []
+        position = 0
+        for offset, length in extents:
+            if length <= 0:
+                continue
+            self._starts.append(position)
+            self._extents.append((offset, length))
+            position += length
+        self.size = position
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def read_at(self, offset: int, size: int) -> bytes:
+        """Read up to size bytes at offset of the view."""
+        if offset >= self.size or size <= 0:
+            return b''
+        size = min(size, self.size - offset)
+        
+        parts = []
+        index = bisect_right(self._starts, offset) - 1
+        while size > 0:
+            source_offset, length = self._extents[index]
+            within = offset - self._starts[index]
+            take = min(size, length - within)
+            if source_offset is None:
+                parts.append(bytes(take))
+            else:
+                data = self._source.read_at(source_offset + within, take)
+                if len(data) != take:
+                    raise ValueError(f"{self.source_name}: extent at {source_offset} lies outside the image")
+                parts.append(data)
+            offset += take
+            size -= take
+            index += 1
+        
+        return parts[0] if len(parts) == 1 else b''.join(parts)
+    
+    def close(self):
+        # The underlying source belongs to whoever created the window
+        if self._owner is not None:
+            self._owner.close()
+            self._owner = None
+        self._source = None
+
+
+def open_image_source(image_path: str) -> Union[FileImage, SparseImage]:
+    """Open a raw or sparse partition image for positional reads."""
+    if is_sparse(image_path):
+        return SparseImage.open(image_path)
+    return FileImage(image_path)
@@ -1,32 +1,409 @@
 #!/usr/bin/env python3
 """
 Image Unpacker - Boot image unpacking utilities
+
+Parses Android boot image headers (v0 - v4) in-process. The image is
+memory-mapped and every section is exposed as a zero-copy memoryview,
+so inspecting the layout of a large image costs only a few page faults.
 """
 
-import os
-import tempfile
-from pathlib import Path
-from typing import Dict, Any
+import io
+import mmap
+import struct
+from typing import Dict, Any, Optional, Tuple
+
+from .cpio import CpioReader, Matcher, RAMDISK_PATTERNS
+from .decompress import open_decompressed
+
+
+BOOT_MAGIC = b'ANDROID!'
+BOOT_MAGIC_SIZE = 8
+BOOT_IMAGE_V3_PAGE_SIZE = 4096
+
+# Header layouts, see system/tools/mkbootimg/include/bootimg/bootimg.h
+_HEADER_V0 = struct.Struct('<8s10I16s512s32s1024s')
+_HEADER_V1_EXTRA = struct.Struct('<IQI')
+_HEADER_V2_EXTRA = struct.Struct('<IQ')
+_HEADER_V3 = struct.Struct('<8s4I4II1536s')
+_HEADER_V4_EXTRA = struct.Struct('<I')
+
+# header_size each versioned header records about itself
+_HEADER_SIZES = {
+    1: _HEADER_V0.size + _HEADER_V1_EXTRA.size,
+    2: _HEADER_V0.size + _HEADER_V1_EXTRA.size + _HEADER_V2_EXTRA.size,
+    3: _HEADER_V3.size,
+    4: _HEADER_V3.size + _HEADER_V4_EXTRA.size,
+}
+
+# 'dt' is the QCDT table of legacy v0 images, 'dtb' the v2+ section
+SECTION_NAMES = ('kernel', 'ramdisk', 'second', 'dt', 'recovery_dtbo', 'dtb', 'signature')
+
+
+def _align(value: int, alignment: int) -> int:
+    """Round value up to the next multiple of alignment."""
+    return (value + alignment - 1) // alignment * alignment
+
+
+def _cstring(raw: bytes) -> str:
+    """Decode a NUL-padded header string."""
+    return raw.split(b'\x00', 1)[0].decode('utf-8', errors='replace')
+
+
+def decode_os_version(os_version: int) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Decode the packed os_version header field.
+    
+    Returns:
+        Tuple of (Android version "A.B.C", security patch level "YYYY-MM"),
+        each None when not set in the header
+    """
+    version = os_version >> 11
+    patch = os_version & 0x7FF
+    
+    android_version = None
+    if version:
+        android_version = f"{(version >> 14) & 0x7F}.{(version >> 7) & 0x7F}.{version & 0x7F}"
+    
+    patch_level = None
+    if patch:
+        patch_level = f"{(patch >> 4) + 2000:04d}-{patch & 0xF:02d}"
+    
+    return android_version, patch_level
+
+
+class BootImage:
+    """
+    Parsed Android boot image backed by a read-only buffer.
+    
+    The buffer may be any object supporting the buffer protocol (an mmap,
+    bytes, or a memoryview over a larger container). Section accessors
+    return memoryview slices of that buffer, never copies.
+    """
+    
+    def __init__(self, buffer, source_name: str = '<buffer>'):
+        self.source_name = source_name
+        self._mmap = None
+        self._file = None
+        self._buffer = buffer
+        self._view = memoryview(buffer)
+        self._sections: Dict[str, Tuple[int, int]] = {}
+        self._exported = []
+        self.header: Dict[str, Any] = {}
+        
+        try:
+            self._parse()
+        except Exception:
+            self._view.release()
+            raise
+    
+    @classmethod
+    def open(cls, image_path: str) -> 'BootImage':
+        """Memory-map an image file and parse its header."""
+        f = open(image_path, 'rb')
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            f.close()
+            raise
+        
+        try:
+            image = cls(mm, source_name=image_path)
+        except Exception:
+            mm.close()
+            f.close()
+            raise
+        
+        image._mmap = mm
+        image._file = f
+        return image
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    @property
+    def header_version(self) -> int:
+        return self.header['header_version']
+    
+    @property
+    def page_size(self) -> int:
+        return self.header['page_size']
+    
+    @property
+    def size(self) -> int:
+        return len(self._view)
+    
+    @property
+    def buffer(self):
+        """The backing buffer (the mmap for opened files), e.g. for mmap.find()."""
+        return self._buffer
+    
+    @property
+    def kernel(self) -> Optional[memoryview]:
+        return self.section('kernel')
+    
+    @property
+    def ramdisk(self) -> Optional[memoryview]:
+        return self.section('ramdisk')
+    
+    @property
+    def second(self) -> Optional[memoryview]:
+        return self.section('second')
+    
+    @property
+    def recovery_dtbo(self) -> Optional[memoryview]:
+        return self.section('recovery_dtbo')
+    
+    @property
+    def dt(self) -> Optional[memoryview]:
+        return self.section('dt')
+    
+    @property
+    def dtb(self) -> Optional[memoryview]:
+        return self.section('dtb')
+    
+    def section(self, name: str) -> Optional[memoryview]:
+        """
+        Get a zero-copy view of an image section.
+        
+        Args:
+            name: One of SECTION_NAMES
+        
+        Returns:
+            memoryview of the section, or None if the image has none
+        """
+        if name not in self._sections:
+            return None
+        
+        offset, size = self._sections[name]
+        view = self._view[offset:offset + size]
+        self._exported.append(view)
+        return view
+    
+    def open_ramdisk(self) -> Optional[io.BufferedReader]:
+        """Open the ramdisk as a streaming, decompressed cpio archive."""
+        ramdisk = self.ramdisk
+        if ramdisk is None:
+            return None
+        return open_decompressed(ramdisk)
+    
+    def read_ramdisk_files(self, match: Matcher = RAMDISK_PATTERNS) -> Dict[str, bytes]:
+        """
+        Stream the ramdisk and read only the files matching match.
+        
+        Args:
+            match: Glob, list of globs or predicate (see CpioReader)
+        
+        Returns:
+            Dict mapping ramdisk paths to file contents
+        """
+        stream = self.open_ramdisk()
+        if stream is None:
+            return {}
+        with stream:
+            return CpioReader(stream).read_files(match)
+    
+    def section_range(self, name: str) -> Optional[Tuple[int, int]]:
+        """Get (offset, size) of a section within the image."""
+        return self._sections.get(name)
+    
+    def get_info(self) -> Dict[str, Any]:
+        """Get header fields and section layout as a plain dict."""
+        info = dict(self.header)
+        info['offsets'] = {name: offset for name, (offset, _) in self._sections.items()}
+        info['sizes'] = {name: size for name, (_, size) in self._sections.items()}
+        return info
+    
+    def close(self):
+        """Release section views and unmap the image."""
+        for view in self._exported:
+            view.release()
+        self._exported = []
+        self._view.release()
+        self._buffer = None
+        
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # A caller still holds a derived view; the mapping is
+                # released once that view is garbage collected.
+                pass
+            self._mmap = None
+        
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+    
+    def _parse(self):
+        """Parse the boot image header and compute section offsets."""
+        if len(self._view) < BOOT_MAGIC_SIZE or self._view[:BOOT_MAGIC_SIZE] != BOOT_MAGIC:
+            raise ValueError(f"{self.source_name}: not an Android boot image (missing ANDROID! magic)")
+        
+        if len(self._view) < _HEADER_V0.size:
+            raise ValueError(f"{self.source_name}: truncated boot image header")
+        # Offset 40 is header_version in AOSP layouts but dt_size in
+        # legacy (QCDT) v0 images; like unpackbootimg, anything that is
+        # not a known version with a matching header_size is a dt_size
+        header_version = struct.unpack_from('<I', self._view, 40)[0]
+        
+        if not self._is_header_version(header_version):
+            self._parse_v0(0, dt_size=header_version)
+        elif header_version >= 3:
+            self._parse_v3(header_version)
+        else:
+            self._parse_v0(header_version)
+        
+        for name, (offset, size) in self._sections.items():
+            if offset + size > len(self._view):
+                raise ValueError(
+                    f"{self.source_name}: {name} section ({size} bytes at {offset}) "
+                    f"extends past end of image ({len(self._view)} bytes)"
+                )
+    
+    def _is_header_version(self, value: int) -> bool:
+        """Whether value (the word at offset 40) is the header version."""
+        if value == 0:
+            return True
+        if value not in _HEADER_SIZES:
+            return False
+        
+        if value >= 3:
+            header_size_offset = 20
+        else:
+            header_size_offset = _HEADER_V0.size + _HEADER_V1_EXTRA.size - 4
+        if len(self._view) < header_size_offset + 4:
+            return False
+        return struct.unpack_from('<I', self._view, header_size_offset)[0] == _HEADER_SIZES[value]
+    
+    def _parse_v0(self, header_version: int, dt_size: int = 0):
+        """Parse header versions 0, 1 and 2; dt_size is the QCDT table of legacy v0 images."""
+        (_, kernel_size, kernel_addr, ramdisk_size, ramdisk_addr,
+         second_size, second_addr, tags_addr, page_size, _, os_version,
+         name, cmdline, image_id, extra_cmdline) = _HEADER_V0.unpack_from(self._view, 0)
+        
+        if page_size == 0 or page_size & (page_size - 1):
+            raise ValueError(f"{self.source_name}: invalid page size {page_size}")
+        
+        recovery_dtbo_size = recovery_dtbo_offset = header_size = 0
+        dtb_size = dtb_addr = 0
+        offset = _HEADER_V0.size
+        if header_version >= 1:
+            recovery_dtbo_size, recovery_dtbo_offset, header_size = \
+                _HEADER_V1_EXTRA.unpack_from(self._view, offset)
+            offset += _HEADER_V1_EXTRA.size
+        if header_version >= 2:
+            dtb_size, dtb_addr = _HEADER_V2_EXTRA.unpack_from(self._view, offset)
+        
+        android_version, patch_level = decode_os_version(os_version)
+        # mkbootimg derives every load address from base + fixed offset
+        base_address = (kernel_addr - 0x00008000) & 0xFFFFFFFF
+        
+        self.header = {
+            'header_version': header_version,
+            'page_size': page_size,
+            'kernel_addr': kernel_addr,
+            'ramdisk_addr': ramdisk_addr,
+            'second_addr': second_addr,
+            'tags_addr': tags_addr,
+            'dtb_addr': dtb_addr,
+            'base_address': base_address,
+            'kernel_offset': (kernel_addr - base_address) & 0xFFFFFFFF,
+            'ramdisk_offset': (ramdisk_addr - base_address) & 0xFFFFFFFF,
+            'second_offset': (second_addr - base_address) & 0xFFFFFFFF,
+            'tags_offset': (tags_addr - base_address) & 0xFFFFFFFF,
+            'dtb_offset': dtb_addr - base_address if dtb_addr else 0,
+            'header_size': header_size or _HEADER_V0.size,
+            'os_version': android_version,
+            'os_patch_level': patch_level,
+            'board': _cstring(name),
+            'cmdline': (_cstring(cmdline) + _cstring(extra_cmdline)).strip(),
+            'id': bytes(image_id).hex(),
+        }
+        
+        position = page_size
+        for section, size in (('kernel', kernel_size),
+                              ('ramdisk', ramdisk_size),
+                              ('second', second_size)):
+            if size:
+                self._sections[section] = (position, size)
+            position += _align(size, page_size)
+        
+        if dt_size:
+            self._sections['dt'] = (position, dt_size)
+            position += _align(dt_size, page_size)
+        
+        if recovery_dtbo_size:
+            # recovery_dtbo_offset is absolute; fall back to the packed
+            # position for images built with a bogus offset
+            if recovery_dtbo_offset == 0 or recovery_dtbo_offset + recovery_dtbo_size > len(self._view):
+                recovery_dtbo_offset = position
+            self._sections['recovery_dtbo'] = (recovery_dtbo_offset, recovery_dtbo_size)
+            position += _align(recovery_dtbo_size, page_size)
+        
+        if dtb_size:
+            self._sections['dtb'] = (position, dtb_size)
+    
+    def _parse_v3(self, header_version: int):
+        """Parse header versions 3 and 4."""
+        (_, kernel_size, ramdisk_size, os_version, header_size,
+         _r0, _r1, _r2, _r3, _, cmdline) = _HEADER_V3.unpack_from(self._view, 0)
+        
+        signature_size = 0
+        if header_version >= 4:
+            signature_size = _HEADER_V4_EXTRA.unpack_from(self._view, _HEADER_V3.size)[0]
+        
+        android_version, patch_level = decode_os_version(os_version)
+        page_size = BOOT_IMAGE_V3_PAGE_SIZE
+        
+        self.header = {
+            'header_version': header_version,
+            'page_size': page_size,
+            'header_size': header_size,
+            'os_version': android_version,
+            'os_patch_level': patch_level,
+            'cmdline': _cstring(cmdline).strip(),
+        }
+        
+        position = page_size
+        for section, size in (('kernel', kernel_size),
+                              ('ramdisk', ramdisk_size),
+                              ('signature', signature_size)):
+            if size:
+                self._sections[section] = (position, size)
+            position += _align(size, page_size)
 
 
 class ImageUnpacker:
     """Utilities for unpacking boot images."""
     
     def __init__(self):
-        self.temp_dir = None
+        self.boot_image: Optional[BootImage] = None
     
     def unpack(self, image_path: str) -> Dict[str, Any]:
-        """Unpack boot image."""
-        self.temp_dir = tempfile.mkdtemp(prefix="img_unpack_")
+        """
+        Parse a boot image header and map its sections.
+        
+        Section values are zero-copy memoryviews that stay valid until
+        cleanup() is called.
         
+        Args:
+            image_path: Path to boot/recovery image
+        
+        Returns:
+            Dict with header fields, section views and layout
+        """
         try:
-            return {
-                'success': True,
-                'temp_dir': self.temp_dir,
-                'kernel': None,
-                'ramdisk': None,
-                'dtb': None
-            }
+            self.cleanup()
+            self.boot_image = BootImage.open(image_path)
+            
+            result = self.boot_image.get_info()
+            result['success'] = True
+            for name in SECTION_NAMES:
+                result[name] = self.boot_image.section(name)
+            return result
         except Exception as e:
             return {
                 'success': False,
@@ -34,10 +411,7 @@ class ImageUnpacker:
             }
     
     def cleanup(self):
-        """Clean up temporary files."""
-        if self.temp_dir and os.path.exists(self.temp_dir):
-            import shutil
-            try:
-                shutil.rmtree(self.temp_dir)
-            except Exception:
-                pass
+        """Release the mapped image."""
+        if self.boot_image is not None:
+            self.boot_image.close()
+            self.boot_image = None
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Payload - Partial A/B OTA payload.bin extraction
+
+Reads the DeltaArchiveManifest of a payload.bin, either standalone or
+stored inside a full OTA zip, and rebuilds only the requested partition
+images. Operation data is read straight from the zip member by offset,
+so pulling boot.img out of a multi-gigabyte OTA touches only boot's
+blobs and needs no scratch space besides the output images. The
+operations of a partition are applied across a thread pool; XZ/BZ2
+decompression and hashing release the GIL.
+"""
+
+import bz2
+import hashlib
+import lzma
+import os
+import struct
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, Callable, Iterable, List, Optional
+
+
+PAYLOAD_MAGIC = b'CrAU'
+PAYLOAD_MEMBER = 'payload.bin'
+
+_ZIP_LOCAL_HEADER = struct.Struct('<4s5H3I2H')
+_ZIP_LOCAL_MAGIC = b'PK\x03\x04'
+
+# InstallOperation.Type, see update_engine/update_metadata.proto
+OP_REPLACE = 0
+OP_REPLACE_BZ = 1
+OP_ZERO = 6
+OP_DISCARD = 7
+OP_REPLACE_XZ = 8
+
+OPERATION_NAMES = {
+    0: 'REPLACE',
+    1: 'REPLACE_BZ',
+    2: 'MOVE',
+    3: 'BSDIFF',
+    4: 'SOURCE_COPY',
+    5: 'SOURCE_BSDIFF',
+    6: 'ZERO',
+    7: 'DISCARD',
+    8: 'REPLACE_XZ',
+    9: 'PUFFDIFF',
+    10: 'BROTLI_BSDIFF',
+    11: 'ZUCCHINI',
+    12: 'LZ4DIFF_BSDIFF',
+    13: 'LZ4DIFF_PUFFDIFF',
+}
+
+# Partitions the device tree generator needs from an OTA
+GENERATOR_PARTITIONS = ('boot', 'vendor_boot', 'recovery', 'dtbo')
+
+
+def _read_varint(data, position: int):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, position
+        shift += 7
+
+
+def _decode_message(data) -> Dict[int, List[Any]]:
+    """
+    Decode one protobuf message into field number -> list of values.
+    
+    Varints and fixed-width fields become ints, length-delimited fields
+    stay raw (strings, bytes and nested messages alike).
+    """
+    fields: Dict[int, List[Any]] = {}
+    position = 0
+    end = len(data)
+    while position < end:
+        key, position = _read_varint(data, position)
+        number, wire_type = key >> 3, key & 0x7
+        if wire_type == 0:
+            value, position = _read_varint(data, position)
+        elif wire_type == 1:
+            value = int.from_bytes(data[position:position + 8], 'little')
+            position += 8
+        elif wire_type == 2:
+            length, position = _read_varint(data, position)
+            value = data[position:position + length]
+            position += length
+        elif wire_type == 5:
+            value = int.from_bytes(data[position:position + 4], 'little')
+            position += 4
+        else:
+            raise ValueError(f"Unsupported protobuf wire type {wire_type} in payload manifest")
+        fields.setdefault(number, []).append(value)
+    if position != end:
+        raise ValueError("Truncated payload manifest")
+    return fields
+
+
+def _first(fields: Dict[int, List[Any]], number: int, default=None):
+    values = fields.get(number)
+    return values[0] if values else default
+
+
+def _parse_operation(raw) -> Dict[str, Any]:
+    fields = _decode_message(raw)
+    extents = []
+    for extent in fields.get(6, []):
+        extent_fields = _decode_message(extent)
+        extents.append((_first(extent_fields, 1, 0), _first(extent_fields, 2, 0)))
+    data_hash = _first(fields, 8)
+    return {
+        'type': _first(fields, 1, OP_REPLACE),
+        'data_offset': _first(fields, 2, 0),
+        'data_length': _first(fields, 3, 0),
+        'dst_extents': extents,
+        'data_sha256': bytes(data_hash) if data_hash is not None else None,
+    }
+
+
+def _member_offset(zip_path: str, member: str) -> int:
+    """Absolute file offset of a stored zip member's data."""
+    with zipfile.ZipFile(zip_path) as archive:
+        info = archive.getinfo(member)
+    if info.compress_type != zipfile.ZIP_STORED:
+        raise ValueError(f"{zip_path}: {member} is compressed inside the zip and cannot be read in place")
+    with open(zip_path, 'rb') as f:
+        f.seek(info.header_offset)
+        header = f.read(_ZIP_LOCAL_HEADER.size)
+    if len(header) != _ZIP_LOCAL_HEADER.size or header[:4] != _ZIP_LOCAL_MAGIC:
+        raise ValueError(f"{zip_path}: corrupt local header for {member}")
+    name_length, extra_length = _ZIP_LOCAL_HEADER.unpack(header)[-2:]
+    return info.header_offset + _ZIP_LOCAL_HEADER.size + name_length + extra_length
+
+
+def is_ota_package(path: str) -> bool:
+    """Check for a payload.bin, or a zip that stores one."""
+    try:
+        with open(path, 'rb') as f:
+            if f.read(4) == PAYLOAD_MAGIC:
+                return True
+        if not zipfile.is_zipfile(path):
+            return False
+        with zipfile.ZipFile(path) as archive:
+            return PAYLOAD_MEMBER in archive.namelist()
+    except OSError:
+        return False
+
+
+class PayloadReader:
+    """
+    Manifest and blob access for an A/B OTA payload.
+    
+    Args:
+        path: payload.bin, or an OTA zip containing it
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._base = 0
+        with open(path, 'rb') as f:
+            is_payload = f.read(4) == PAYLOAD_MAGIC
+        if not is_payload:
+            if not zipfile.is_zipfile(path):
+                raise ValueError(f"{path}: not a payload.bin or OTA zip")
+            self._base = _member_offset(path, PAYLOAD_MEMBER)
+        
+        header = self._read(0, 24)
+        if len(header) < 20 or header[:4] != PAYLOAD_MAGIC:
+            raise ValueError(f"{path}: bad payload magic")
+        self.version, manifest_size = struct.unpack_from('>2Q', header, 4)
+        if self.version == 1:
+            header_size, signature_size = 20, 0
+        elif self.version == 2:
+            header_size = 24
+            signature_size = struct.unpack_from('>I', header, 20)[0]
+        else:
+            raise ValueError(f"{path}: unsupported payload version {self.version}")
+        
+        manifest = self._read(header_size, manifest_size)
+        if len(manifest) != manifest_size:
+            raise ValueError(f"{path}: truncated payload manifest")
+        self._data_offset = header_size + manifest_size + signature_size
+        
+        fields = _decode_message(memoryview(manifest))
+        self.block_size = _first(fields, 3, 4096)
+        self.minor_version = _first(fields, 12, 0)
+        self.security_patch_level = bytes(_first(fields, 18, b'')).decode('utf-8', errors='replace')
+        
+        # Operations stay undecoded until their partition is extracted
+        self._partitions: Dict[str, Any] = {}
+        for raw in fields.get(13, []):
+            partition = _decode_message(raw)
+            name = bytes(_first(partition, 1, b'')).decode('utf-8', errors='replace')
+            self._partitions[name] = partition
+    
+    @property
+    def partitions(self) -> List[str]:
+        return list(self._partitions)
+    
+    @property
+    def is_incremental(self) -> bool:
+        """Incremental payloads carry the old partition info of their sources."""
+        return any(6 in partition for partition in self._partitions.values())
+    
+    def partition_size(self, name: str) -> int:
+        info = _first(self._partitions[name], 7)
+        return _first(_decode_message(info), 1, 0) if info is not None else 0
+    
+    def operations(self, name: str) -> List[Dict[str, Any]]:
+        return [_parse_operation(raw) for raw in self._partitions[name].get(8, [])]
+    
+    def get_info(self) -> Dict[str, Any]:
+        """Get payload header fields and partition sizes as a plain dict."""
+        return {
+            'version': self.version,
+            'minor_version': self.minor_version,
+            'block_size': self.block_size,
+            'security_patch_level': self.security_patch_level,
+            'incremental': self.is_incremental,
+            'partitions': {name: self.partition_size(name) for name in self._partitions},
+        }
+    
+    def extract(
+        self,
+        names: Iterable[str],
+        output_dir: str,
+        max_workers: Optional[int] = None,
+        verify: bool = True,
+        progress_callback: Optional[Callable] = None
+    ) -> Dict[str, str]:
+        """
+        Rebuild partition images from the payload.
+        
+        Args:
+            names: Partitions to extract; missing ones are skipped
+            output_dir: Directory receiving <name>.img files
+            max_workers: Threads applying the operations of a partition
+            verify: Check the SHA-256 of every operation's data
+            progress_callback: Called as (fraction, message)
+        
+        Returns:
+            Dict mapping extracted partition names to image paths
+        """
+        wanted = [name for name in names if name in self._partitions]
+        os.makedirs(output_dir, exist_ok=True)
+        workers = max_workers or min(8, os.cpu_count() or 1)
+        
+        extracted = {}
+        for number, name in enumerate(wanted):
+            if progress_callback:
+                progress_callback(number / len(wanted), f"Extracting {name} from payload...")
+            operations = self.operations(name)
+            for operation in operations:
+                if operation['type'] not in (OP_REPLACE, OP_REPLACE_BZ, OP_REPLACE_XZ, OP_ZERO, OP_DISCARD):
+                    kind = OPERATION_NAMES.get(operation['type'], str(operation['type']))
+                    raise ValueError(f"{self.path}: {name} uses {kind}; incremental OTAs are not supported")
+            
+            output_path = str(Path(output_dir) / f"{name}.img")
+            partial_path = output_path + '.partial'
+            with open(partial_path, 'wb') as f:
+                f.truncate(self.partition_size(name))
+            try:
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    # list() re-raises the first failure
+                    list(pool.map(lambda operation: self._apply(name, operation, partial_path, verify),
+                                  operations))
+                os.replace(partial_path, output_path)
+            except BaseException:
+                try:
+                    os.remove(partial_path)
+                except OSError:
+                    pass
+                raise
+            extracted[name] = output_path
+        
+        if progress_callback and wanted:
+            progress_callback(1.0, "Payload extraction complete")
+        return extracted
+    
+    def _read(self, offset: int, size: int) -> bytes:
+        with open(self.path, 'rb') as f:
+            f.seek(self._base + offset)
+            return f.read(size)
+    
+    def _apply(self, name: str, operation: Dict[str, Any], output_path: str, verify: bool):
+        """Apply one operation; every call uses its own file handles."""
+        op_type = operation['type']
+        if op_type in (OP_ZERO, OP_DISCARD):
+            # The output starts out zero-filled
+            return
+        
+        data = self._read(self._data_offset + operation['data_offset'], operation['data_length'])
+        if len(data) != operation['data_length']:
+            raise ValueError(f"{self.path}: truncated data for {name}")
+        if verify and operation['data_sha256'] and hashlib.sha256(data).digest() != operation['data_sha256']:
+            raise ValueError(f"{self.path}: data hash mismatch in {name}")
+        
+        if op_type == OP_REPLACE_XZ:
+            data = lzma.decompress(data)
+        elif op_type == OP_REPLACE_BZ:
+            data = bz2.decompress(data)
+        
+        position = 0
+        with open(output_path, 'r+b') as f:
+            for start_block, num_blocks in operation['dst_extents']:
+                length = num_blocks * self.block_size
+                f.seek(start_block * self.block_size)
+                f.write(data[position:position + length])
+                position += length
+
+
+def extract_payload_partitions(
+    path: str,
+    output_dir: str,
+    names: Iterable[str] = GENERATOR_PARTITIONS,
+    progress_callback: Optional[Callable] = None
+) -> Dict[str, str]:
+    """
+    Extract boot/vendor_boot/recovery/dtbo (by default) from an OTA.
+    
+    Args:
+        path: payload.bin, or an OTA zip containing it
+        output_dir: Directory receiving <name>.img files
+        names: Partitions to extract
+        progress_callback: Called as (fraction, message)
+    
+    Returns:
+        Dict mapping extracted partition names to image paths
+    """
+    return PayloadReader(path).extract(names, output_dir, progress_callback=progress_callback)
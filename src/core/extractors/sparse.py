@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Sparse Image - Lazy Android sparse image (simg) reader
+
+Builds a chunk index from one pass over the chunk headers of a sparse
+image and resolves reads through it, so a multi-gigabyte sparse
+system/vendor image can be read as if it were raw without expanding it.
+The index is a few compact arrays, one entry per chunk.
+"""
+
+import io
+import os
+import struct
+import threading
+from array import array
+from bisect import bisect_right
+from typing import Dict, Any, Optional
+
+
+SPARSE_MAGIC = 0xED26FF3A
+SPARSE_MAGIC_BYTES = struct.pack('<I', SPARSE_MAGIC)
+
+_SPARSE_HEADER = struct.Struct('<I4H4I')
+_CHUNK_HEADER = struct.Struct('<2H2I')
+
+CHUNK_TYPE_RAW = 0xCAC1
+CHUNK_TYPE_FILL = 0xCAC2
+CHUNK_TYPE_DONT_CARE = 0xCAC3
+CHUNK_TYPE_CRC32 = 0xCAC4
+
+CHUNK_TYPE_NAMES = {
+    CHUNK_TYPE_RAW: 'raw',
+    CHUNK_TYPE_FILL: 'fill',
+    CHUNK_TYPE_DONT_CARE: 'dont_care',
+    CHUNK_TYPE_CRC32: 'crc32',
+}
+
+_ZERO_BLOCK = bytes(64 * 1024)
+
+
+def is_sparse(image_path: str) -> bool:
+    """Check for the sparse image magic."""
+    try:
+        with open(image_path, 'rb') as f:
+            return f.read(4) == SPARSE_MAGIC_BYTES
+    except OSError:
+        return False
+
+
+class SparseImage:
+    """
+    Random-access view of a sparse image through its chunk index.
+    
+    For every output chunk the index keeps its start offset in the
+    expanded image, its type, and either the file offset of its data
+    (RAW) or its 32-bit fill pattern (FILL).
+    """
+    
+    def __init__(self, f, source_name: str = '<file>'):
+        self.source_name = source_name
+        self._file = f
+        self._lock = threading.Lock()
+        self._starts = array('Q')
+        self._types = array('H')
+        self._values = array('Q')
+        
+        header = f.read(_SPARSE_HEADER.size)
+        if len(header) < _SPARSE_HEADER.size:
+            raise ValueError(f"{source_name}: truncated sparse header")
+        (magic, major, minor, file_header_size, chunk_header_size,
+         block_size, total_blocks, total_chunks, checksum) = _SPARSE_HEADER.unpack(header)
+        
+        if magic != SPARSE_MAGIC:
+            raise ValueError(f"{source_name}: not a sparse image (bad magic {magic:#x})")
+        if major != 1:
+            raise ValueError(f"{source_name}: unsupported sparse format version {major}.{minor}")
+        if block_size == 0 or block_size % 4:
+            raise ValueError(f"{source_name}: invalid sparse block size {block_size}")
+        
+        self.version = f"{major}.{minor}"
+        self.block_size = block_size
+        self.total_blocks = total_blocks
+        self.total_chunks = total_chunks
+        self.image_checksum = checksum
+        self.size = total_blocks * block_size
+        self.chunk_counts = {name: 0 for name in CHUNK_TYPE_NAMES.values()}
+        
+        self._build_index(file_header_size, chunk_header_size)
+    
+    @classmethod
+    def open(cls, image_path: str) -> 'SparseImage':
+        """Open a sparse image file and index its chunks."""
+        f = open(image_path, 'rb')
+        try:
+            return cls(f, source_name=image_path)
+        except Exception:
+            f.close()
+            raise
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    @property
+    def index_size(self) -> int:
+        """Bytes used by the chunk index."""
+        return sum(len(a) * a.itemsize for a in (self._starts, self._types, self._values))
+    
+    def read_at(self, offset: int, size: int) -> bytes:
+        """
+        Read size bytes of the expanded image starting at offset.
+        
+        Reads past the end of the image are truncated.
+        """
+        if offset >= self.size or size <= 0:
+            return b''
+        size = min(size, self.size - offset)
+        
+        parts = []
+        index = bisect_right(self._starts, offset) - 1
+        while size > 0:
+            start = self._starts[index]
+            end = self._starts[index + 1] if index + 1 < len(self._starts) else self.size
+            within = offset - start
+            take = min(size, end - offset)
+            
+            chunk_type = self._types[index]
+            if chunk_type == CHUNK_TYPE_RAW:
+                parts.append(self._read_file(self._values[index] + within, take))
+            elif chunk_type == CHUNK_TYPE_FILL:
+                pattern = struct.pack('<I', self._values[index])
+                phase = within % 4
+                repeated = pattern * ((phase + take + 3) // 4)
+                parts.append(repeated[phase:phase + take])
+            else:
+                parts.append(_ZERO_BLOCK[:take] if take <= len(_ZERO_BLOCK) else bytes(take))
+            
+            offset += take
+            size -= take
+            index += 1
+        
+        return parts[0] if len(parts) == 1 else b''.join(parts)
+    
+    def open_reader(self, buffer_size: int = io.DEFAULT_BUFFER_SIZE,
+                    close_image: bool = False) -> io.BufferedReader:
+        """
+        Open the expanded image as a seekable, buffered file object.
+        
+        Args:
+            buffer_size: Read buffer size
+            close_image: Close this image when the reader is closed
+        """
+        return io.BufferedReader(SparseReader(self, close_image), buffer_size=buffer_size)
+    
+    def get_info(self) -> Dict[str, Any]:
+        """Get header fields and chunk statistics as a plain dict."""
+        return {
+            'version': self.version,
+            'block_size': self.block_size,
+            'total_blocks': self.total_blocks,
+            'total_chunks': self.total_chunks,
+            'expanded_size': self.size,
+            'chunks': dict(self.chunk_counts),
+            'index_size': self.index_size,
+        }
+    
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+    
+    def _read_file(self, offset: int, size: int) -> bytes:
+        with self._lock:
+            self._file.seek(offset)
+            data = self._file.read(size)
+        if len(data) != size:
+            raise ValueError(f"{self.source_name}: truncated RAW chunk data at offset {offset}")
+        return data
+    
+    def _build_index(self, file_header_size: int, chunk_header_size: int):
+        """Walk the chunk headers once, seeking over chunk payloads."""
+        f = self._file
+        position = file_header_size
+        block = 0
+        
+        for number in range(self.total_chunks):
+            f.seek(position)
+            # Header plus the fill value a FILL chunk stores right after it
+            raw = f.read(chunk_header_size + 4)
+            if len(raw) < _CHUNK_HEADER.size:
+                raise ValueError(f"{self.source_name}: truncated chunk header {number}")
+            chunk_type, _, chunk_blocks, total_size = _CHUNK_HEADER.unpack_from(raw)
+            data_offset = position + chunk_header_size
+            data_size = total_size - chunk_header_size
+            
+            name = CHUNK_TYPE_NAMES.get(chunk_type)
+            if name is None:
+                raise ValueError(f"{self.source_name}: unknown chunk type {chunk_type:#x} in chunk {number}")
+            self.chunk_counts[name] += 1
+            
+            if chunk_type == CHUNK_TYPE_RAW:
+                if data_size != chunk_blocks * self.block_size:
+                    raise ValueError(f"{self.source_name}: RAW chunk {number} size mismatch")
+                value = data_offset
+            elif chunk_type == CHUNK_TYPE_FILL:
+                if data_size < 4 or len(raw) < chunk_header_size + 4:
+                    raise ValueError(f"{self.source_name}: FILL chunk {number} has no fill value")
+                value = struct.unpack_from('<I', raw, chunk_header_size)[0]
+            else:
+                value = 0
+            
+            if chunk_type != CHUNK_TYPE_CRC32 and chunk_blocks:
+                # Merge runs of the same zero-cost chunk type
+                if (chunk_type == CHUNK_TYPE_DONT_CARE and self._types
+                        and self._types[-1] == CHUNK_TYPE_DONT_CARE):
+                    pass
+                else:
+                    self._starts.append(block * self.block_size)
+                    self._types.append(chunk_type)
+                    self._values.append(value)
+                block += chunk_blocks
+            
+            position = data_offset + data_size
+        
+        if block != self.total_blocks:
+            raise ValueError(
+                f"{self.source_name}: chunks cover {block} blocks, header says {self.total_blocks}"
+            )
+
+
+class SparseReader(io.RawIOBase):
+    """Seekable raw file object over the expanded contents of a SparseImage."""
+    
+    def __init__(self, image: SparseImage, close_image: bool = False):
+        super().__init__()
+        self._image = image
+        self._close_image = close_image
+        self._position = 0
+    
+    def close(self):
+        if not self.closed and self._close_image:
+            self._image.close()
+        super().close()
+    
+    def readable(self) -> bool:
+        return True
+    
+    def seekable(self) -> bool:
+        return True
+    
+    def tell(self) -> int:
+        return self._position
+    
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_SET:
+            position = offset
+        elif whence == os.SEEK_CUR:
+            position = self._position + offset
+        elif whence == os.SEEK_END:
+            position = self._image.size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if position < 0:
+            raise ValueError("Negative seek position")
+        self._position = position
+        return position
+    
+    def readinto(self, buffer) -> int:
+        data = self._image.read_at(self._position, len(buffer))
+        n = len(data)
+        buffer[:n] = data
+        self._position += n
+        return n
+
+
+def open_image(image_path: str, buffer_size: int = io.DEFAULT_BUFFER_SIZE) -> io.BufferedReader:
+    """
+    Open a partition image for reading, expanding it lazily if sparse.
+    
+    Raw images are returned as plain files, so callers can treat both
+    kinds alike.
+    """
+    if is_sparse(image_path):
+        return SparseImage.open(image_path).open_reader(buffer_size, close_image=True)
+    return open(image_path, 'rb', buffering=buffer_size)
+
+
+def get_sparse_info(image_path: str) -> Optional[Dict[str, Any]]:
+    """Get sparse header info for an image, or None if it is not sparse."""
+    if not is_sparse(image_path):
+        return None
+    with SparseImage.open(image_path) as image:
+        return image.get_info()
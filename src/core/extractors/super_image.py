@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+Super Image - Dynamic partition (liblp) metadata reader
+
+Parses the geometry and metadata of a super partition image and maps
+its logical partitions (system_a, vendor_a, product, odm, ...) to their
+extents. Each logical partition can be opened as a windowed view over
+the super image, raw or sparse, so a filesystem inside it can be read
+without extracting the partition. The metadata also gives the
+BOARD_SUPER_PARTITION_* and dynamic partition group sizes that a
+BoardConfig.mk needs.
+"""
+
+import hashlib
+import struct
+from typing import Dict, Any, List, Optional
+
+from .image_source import ImageWindow, open_image_source
+
+
+LP_PARTITION_RESERVED_BYTES = 4096
+LP_METADATA_GEOMETRY_SIZE = 4096
+LP_METADATA_GEOMETRY_MAGIC = 0x616C4467
+LP_METADATA_HEADER_MAGIC = 0x414C5030
+LP_METADATA_MAJOR_VERSION = 10
+LP_SECTOR_SIZE = 512
+
+_GEOMETRY = struct.Struct('<2I32s3I')
+_HEADER = struct.Struct('<I2HI32sI32s12I')
+_HEADER_FLAGS = struct.Struct('<I')
+_PARTITION = struct.Struct('<36s4I')
+_EXTENT = struct.Struct('<QIQI')
+_GROUP = struct.Struct('<36sIQ')
+_BLOCK_DEVICE = struct.Struct('<Q2IQ36sI')
+
+TARGET_TYPE_LINEAR = 0
+TARGET_TYPE_ZERO = 1
+
+# Partition attributes
+PARTITION_ATTR_READONLY = 1 << 0
+PARTITION_ATTR_SLOT_SUFFIXED = 1 << 1
+PARTITION_ATTR_UPDATED = 1 << 2
+PARTITION_ATTR_DISABLED = 1 << 3
+
+GROUP_SLOT_SUFFIXED = 1 << 0
+HEADER_FLAG_VIRTUAL_AB_DEVICE = 1 << 0
+
+SLOT_SUFFIXES = ('_a', '_b')
+
+
+def _cstring(raw: bytes) -> str:
+    return raw.split(b'\x00', 1)[0].decode('utf-8', errors='replace')
+
+
+def _strip_slot(name: str) -> str:
+    for suffix in SLOT_SUFFIXES:
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+def _with_zeroed(raw: bytes, start: int, size: int) -> bytes:
+    return raw[:start] + bytes(size) + raw[start + size:]
+
+
+def is_super_image(image_path: str) -> bool:
+    """Check for liblp geometry in a raw or sparse image."""
+    try:
+        with open_image_source(image_path) as source:
+            raw = source.read_at(LP_PARTITION_RESERVED_BYTES, 4)
+    except (OSError, ValueError):
+        return False
+    return len(raw) == 4 and struct.unpack('<I', raw)[0] == LP_METADATA_GEOMETRY_MAGIC
+
+
+class SuperImage:
+    """
+    Logical partition table of a super image.
+    
+    Args:
+        source: Object with read_at(offset, size) and size, such as the
+            result of open_image_source()
+        source_name: Name used in error messages
+        slot: Metadata slot to read
+    """
+    
+    def __init__(self, source, source_name: str = '<image>', slot: int = 0):
+        self.source_name = source_name
+        self._source = source
+        self._owns_source = False
+        self.partitions: Dict[str, Dict[str, Any]] = {}
+        self.groups: List[Dict[str, Any]] = []
+        self.block_devices: List[Dict[str, Any]] = []
+        
+        self._parse_geometry()
+        if not 0 <= slot < self.metadata_slot_count:
+            raise ValueError(f"{source_name}: metadata slot {slot} out of range")
+        self.slot = slot
+        self._parse_metadata(slot)
+    
+    @classmethod
+    def open(cls, image_path: str, slot: int = 0) -> 'SuperImage':
+        """Open a raw or sparse super image."""
+        source = open_image_source(image_path)
+        try:
+            image = cls(source, source_name=image_path, slot=slot)
+        except Exception:
+            source.close()
+            raise
+        image._owns_source = True
+        return image
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def close(self):
+        if self._owns_source and self._source is not None:
+            self._source.close()
+        self._source = None
+    
+    def resolve_name(self, name: str) -> str:
+        """
+        Find a logical partition by name, trying the slot suffixes
+        when the plain name does not exist ('vendor' -> 'vendor_a').
+        
+        Raises:
+            KeyError: If no such partition exists
+        """
+        if name in self.partitions:
+            return name
+        for suffix in SLOT_SUFFIXES:
+            if name + suffix in self.partitions:
+                return name + suffix
+        raise KeyError(f"{self.source_name}: no logical partition named {name}")
+    
+    def open_partition(self, name: str, close_image: bool = False) -> ImageWindow:
+        """
+        Open a logical partition as a windowed view over the super image.
+        
+        The view stays valid only while this SuperImage is open.
+        
+        Args:
+            name: Partition name, with or without slot suffix
+            close_image: Close this image when the view is closed
+        """
+        partition = self.partitions[self.resolve_name(name)]
+        if partition['external']:
+            raise ValueError(f"{self.source_name}: {partition['name']} has extents on another block device")
+        extents = [(extent['offset'], extent['size']) for extent in partition['extents']]
+        return ImageWindow(self._source, extents, source_name=f"{self.source_name}:{partition['name']}",
+                           owner=self if close_image else None)
+    
+    def get_info(self) -> Dict[str, Any]:
+        """Get geometry, groups and partitions as a plain dict."""
+        return {
+            'metadata_version': self.metadata_version,
+            'metadata_max_size': self.metadata_max_size,
+            'metadata_slot_count': self.metadata_slot_count,
+            'logical_block_size': self.logical_block_size,
+            'virtual_ab': bool(self.header_flags & HEADER_FLAG_VIRTUAL_AB_DEVICE),
+            'super_size': self.super_size,
+            'block_devices': list(self.block_devices),
+            'groups': list(self.groups),
+            'partitions': {
+                name: {key: value for key, value in partition.items() if key != 'extents'}
+                for name, partition in self.partitions.items()
+            },
+        }
+    
+    @property
+    def super_size(self) -> int:
+        """Size of the super block device."""
+        return self.block_devices[0]['size'] if self.block_devices else 0
+    
+    def _read(self, offset: int, size: int) -> bytes:
+        data = self._source.read_at(offset, size)
+        if len(data) != size:
+            raise ValueError(f"{self.source_name}: truncated liblp metadata at offset {offset}")
+        return data
+    
+    def _parse_geometry(self):
+        """Read the primary geometry, falling back to the backup copy."""
+        errors = []
+        for offset in (LP_PARTITION_RESERVED_BYTES, LP_PARTITION_RESERVED_BYTES + LP_METADATA_GEOMETRY_SIZE):
+            raw = self._source.read_at(offset, _GEOMETRY.size)
+            if len(raw) < _GEOMETRY.size:
+                errors.append('truncated geometry')
+                continue
+            (magic, struct_size, checksum, self.metadata_max_size,
+             self.metadata_slot_count, self.logical_block_size) = _GEOMETRY.unpack(raw)
+            if magic != LP_METADATA_GEOMETRY_MAGIC:
+                errors.append(f"bad geometry magic {magic:#x}")
+                continue
+            if hashlib.sha256(_with_zeroed(raw, 8, 32)).digest() != checksum:
+                errors.append('geometry checksum mismatch')
+                continue
+            if not self.metadata_slot_count or not self.metadata_max_size:
+                errors.append('empty geometry')
+                continue
+            return
+        raise ValueError(f"{self.source_name}: no valid liblp geometry ({'; '.join(errors)})")
+    
+    def _parse_metadata(self, slot: int):
+        """Read a metadata slot, falling back to its backup copy."""
+        base = LP_PARTITION_RESERVED_BYTES + 2 * LP_METADATA_GEOMETRY_SIZE
+        primary = base + slot * self.metadata_max_size
+        backup = base + (self.metadata_slot_count + slot) * self.metadata_max_size
+        errors = []
+        for offset in (primary, backup):
+            try:
+                self._parse_metadata_at(offset)
+                return
+            except ValueError as e:
+                errors.append(str(e))
+        raise ValueError(f"{self.source_name}: no valid liblp metadata in slot {slot} ({'; '.join(errors)})")
+    
+    def _parse_metadata_at(self, offset: int):
+        raw = self._read(offset, _HEADER.size)
+        (magic, major, minor, header_size, header_checksum, tables_size,
+         tables_checksum, *descriptors) = _HEADER.unpack(raw)
+        if magic != LP_METADATA_HEADER_MAGIC:
+            raise ValueError(f"bad header magic {magic:#x}")
+        if major != LP_METADATA_MAJOR_VERSION:
+            raise ValueError(f"unsupported metadata version {major}.{minor}")
+        if header_size < _HEADER.size or header_size + tables_size > self.metadata_max_size:
+            raise ValueError('invalid header or tables size')
+        
+        header = self._read(offset, header_size)
+        if hashlib.sha256(_with_zeroed(header, 12, 32)).digest() != header_checksum:
+            raise ValueError('header checksum mismatch')
+        tables = self._read(offset + header_size, tables_size)
+        if hashlib.sha256(tables).digest() != tables_checksum:
+            raise ValueError('tables checksum mismatch')
+        
+        self.metadata_version = f"{major}.{minor}"
+        self.header_flags = 0
+        if header_size >= _HEADER.size + _HEADER_FLAGS.size:
+            self.header_flags = _HEADER_FLAGS.unpack_from(header, _HEADER.size)[0]
+        
+        def table(index, layout):
+            table_offset, count, entry_size = descriptors[index * 3:index * 3 + 3]
+            if entry_size < layout.size or table_offset + count * entry_size > tables_size:
+                raise ValueError('table overruns the metadata')
+            return [layout.unpack_from(tables, table_offset + i * entry_size) for i in range(count)]
+        
+        partitions = table(0, _PARTITION)
+        extents = table(1, _EXTENT)
+        groups = table(2, _GROUP)
+        block_devices = table(3, _BLOCK_DEVICE)
+        
+        self.block_devices = [{
+            'name': _cstring(name),
+            'first_logical_sector': first_sector,
+            'alignment': alignment,
+            'alignment_offset': alignment_offset,
+            'size': size,
+            'flags': flags,
+        } for first_sector, alignment, alignment_offset, size, name, flags in block_devices]
+        
+        self.groups = [{
+            'name': _cstring(name),
+            'flags': flags,
+            'maximum_size': maximum_size,
+        } for name, flags, maximum_size in groups]
+        
+        self.partitions = {}
+        for raw_name, attributes, first_extent, extent_count, group_index in partitions:
+            name = _cstring(raw_name)
+            if first_extent + extent_count > len(extents) or group_index >= len(groups):
+                raise ValueError(f"partition {name} references missing extents or group")
+            
+            mapped = []
+            external = False
+            for sectors, target_type, target_data, target_source in extents[first_extent:first_extent + extent_count]:
+                if target_type == TARGET_TYPE_LINEAR:
+                    external = external or target_source != 0
+                    offset_bytes = target_data * LP_SECTOR_SIZE
+                else:
+                    offset_bytes = None
+                mapped.append({'offset': offset_bytes, 'size': sectors * LP_SECTOR_SIZE, 'source': target_source})
+            
+            self.partitions[name] = {
+                'name': name,
+                'group': self.groups[group_index]['name'],
+                'size': sum(extent['size'] for extent in mapped),
+                'readonly': bool(attributes & PARTITION_ATTR_READONLY),
+                'slot_suffixed': bool(attributes & PARTITION_ATTR_SLOT_SUFFIXED),
+                'external': external,
+                'extents': mapped,
+            }
+
+
+def board_super_variables(info: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Map super image metadata to BoardConfig.mk dynamic partition variables.
+    
+    Slot suffixes are dropped from group and partition names; for A/B
+    images the _a copy of each group describes the group's size.
+    
+    Args:
+        info: SuperImage.get_info() result
+    
+    Returns:
+        Dict of variable name -> value, in BoardConfig.mk order
+    """
+    variables = {'BOARD_SUPER_PARTITION_SIZE': str(info['super_size'])}
+    
+    groups: Dict[str, Dict[str, Any]] = {}
+    for group in info['groups']:
+        name = _strip_slot(group['name'])
+        if name == 'default' or name in groups:
+            continue
+        groups[name] = {'size': group['maximum_size'], 'source': group['name'], 'partitions': []}
+    
+    for partition in info['partitions'].values():
+        group = groups.get(_strip_slot(partition['group']))
+        if group is None or partition['group'] != group['source']:
+            continue
+        name = _strip_slot(partition['name'])
+        if name not in group['partitions']:
+            group['partitions'].append(name)
+    
+    variables['BOARD_SUPER_PARTITION_GROUPS'] = ' '.join(groups)
+    for name, group in groups.items():
+        size = group['size']
+        if not size:
+            # Unlimited groups: the sum of what is in them
+            size = sum(p['size'] for p in info['partitions'].values() if p['group'] == group['source'])
+        prefix = f"BOARD_{name.upper()}"
+        variables[f"{prefix}_SIZE"] = str(size)
+        variables[f"{prefix}_PARTITION_LIST"] = ' '.join(sorted(group['partitions']))
+    return variables
+
+
+def read_super_info(image_path: str) -> Optional[Dict[str, Any]]:
+    """Get super image metadata and board variables, or None if it is not a super image."""
+    if not is_super_image(image_path):
+        return None
+    with SuperImage.open(image_path) as image:
+        info = image.get_info()
+    info['board_variables'] = board_super_variables(info)
+    return info
@@ -3,30 +3,29 @@
 TWRP Extractor - Wrapper for twrpdtgen
 """
 
-import subprocess
-import sys
 from typing import Dict, Any, Optional, Callable
 
+from .twrpdtgen_engine import TwrpdtgenEngine
+from ..toolchain import ToolchainRegistry, get_toolchain, twrpdtgen_requirements
+
 
 class TWRPExtractor:
     """Wrapper for twrpdtgen tool."""
     
-    def __init__(self):
+    def __init__(self, engine: Optional[TwrpdtgenEngine] = None,
+                 toolchain: Optional[ToolchainRegistry] = None):
+        self.engine = engine or TwrpdtgenEngine()
+        self.toolchain = toolchain or get_toolchain()
         self.twrpdtgen_available = self._check_availability()
     
     def _check_availability(self) -> bool:
         """Check if twrpdtgen is installed."""
         try:
-            result = subprocess.run(
-                [sys.executable, "-m", "twrpdtgen", "--version"],
-                capture_output=True,
-                timeout=5
-            )
-            return result.returncode == 0
+            return self.engine.available
         except Exception:
             return False
     
-    def extract(self, image_path: str, output_dir: str, 
+    def extract(self, image_path: str, output_dir: str,
                 progress_callback: Optional[Callable] = None) -> Dict[str, Any]:
         """Extract device tree using twrpdtgen."""
         if not self.twrpdtgen_available:
@@ -35,27 +34,25 @@ class TWRPExtractor:
                 'error': 'twrpdtgen not installed'
             }
         
+        missing = self.toolchain.missing(twrpdtgen_requirements())
+        if missing:
+            return {
+                'success': False,
+                'error': f"twrpdtgen needs {', '.join(missing)}"
+            }
+        
         try:
-            cmd = [sys.executable, "-m", "twrpdtgen", image_path, "-o", output_dir]
-            
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True
-            )
-            
-            stdout, stderr = process.communicate()
+            result = self.engine.generate(image_path, output_dir)
             
-            if process.returncode == 0:
+            if result['success']:
                 return {
                     'success': True,
-                    'output': stdout
+                    'output': result['output']
                 }
             else:
                 return {
                     'success': False,
-                    'error': stderr or 'Unknown error'
+                    'error': result['error'] or 'Unknown error'
                 }
         
         except Exception as e:
@@ -0,0 +1,473 @@
+#!/usr/bin/env python3
+"""
+Twrpdtgen Engine - Run twrpdtgen without an interpreter per job
+
+Spawning `python -m twrpdtgen` costs an interpreter start plus the
+twrpdtgen/GitPython/Jinja2 imports on every image. The engine imports
+twrpdtgen once and calls its DeviceTree class directly:
+
+- 'inprocess': in this process, with twrpdtgen's stdout and logging
+  redirected into the caller's log callback. twrpdtgen relies on the
+  process-wide logging setup, so jobs run one at a time.
+- 'pool': in pre-warmed worker processes that receive jobs over the
+  executor's pipes and stream log lines back through a queue. Jobs run
+  in parallel.
+- 'subprocess': the original `python -m twrpdtgen` invocation, for a
+  twrpdtgen installed in another interpreter.
+
+In-process and pool jobs can also skip twrpdtgen's own unpack (an AIK
+git clone plus its shell scripts): given a directory laid out like
+AIK's output, twrpdtgen's AIKManager is swapped for PreExtractedAIK,
+which just reads it.
+"""
+
+import contextlib
+import importlib.util
+import io
+import itertools
+import logging
+import multiprocessing
+import subprocess
+import sys
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, Any, Callable, Optional
+
+from ..process_runner import ProcessRunner
+
+
+ENGINE_MODES = ('auto', 'inprocess', 'pool', 'subprocess')
+
+# Lines kept for error reports
+OUTPUT_TAIL_LINES = 200
+
+_LOG_FORMAT = '[%(levelname)s] %(message)s'
+
+# twrpdtgen's logging and stdout are process-wide
+_inprocess_lock = threading.Lock()
+
+# Log queue of a pool worker, set by _warm_worker
+_worker_queue = None
+
+
+def twrpdtgen_importable() -> bool:
+    """Check whether twrpdtgen can be imported by this interpreter."""
+    try:
+        return importlib.util.find_spec('twrpdtgen') is not None
+    except (ImportError, ValueError):
+        return False
+
+
+class _LineWriter(io.TextIOBase):
+    """Text stream that hands every complete line to a callback."""
+    
+    def __init__(self, emit: Callable[[str], None]):
+        super().__init__()
+        self._emit = emit
+        self._partial = ''
+    
+    def writable(self) -> bool:
+        return True
+    
+    def write(self, text: str) -> int:
+        lines = (self._partial + text).split('\n')
+        self._partial = lines.pop()
+        for line in lines:
+            self._emit(line)
+        return len(text)
+    
+    def flush(self):
+        if self._partial:
+            self._emit(self._partial)
+            self._partial = ''
+
+
+class _CallbackHandler(logging.Handler):
+    def __init__(self, emit: Callable[[str], None]):
+        super().__init__(logging.INFO)
+        self._emit = emit
+        self.setFormatter(logging.Formatter(_LOG_FORMAT))
+    
+    def emit(self, record: logging.LogRecord):
+        self._emit(self.format(record))
+
+
+@contextlib.contextmanager
+def _captured_output(emit: Callable[[str], None]):
+    """Route stdout, stderr and root logging INFO+ to emit for the duration."""
+    real_stdout, real_stderr = sys.stdout, sys.stderr
+    forwarding = threading.local()
+    
+    def forward(line: str):
+        # A callback that prints or logs must not feed back into itself
+        if getattr(forwarding, 'active', False):
+            return
+        forwarding.active = True
+        try:
+            with contextlib.redirect_stdout(real_stdout), contextlib.redirect_stderr(real_stderr):
+                emit(line)
+        finally:
+            forwarding.active = False
+    
+    writer = _LineWriter(forward)
+    handler = _CallbackHandler(forward)
+    root = logging.getLogger()
+    level = root.level
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
+    try:
+        with contextlib.redirect_stdout(writer), contextlib.redirect_stderr(writer):
+            yield
+    finally:
+        writer.flush()
+        root.removeHandler(handler)
+        root.setLevel(level)
+
+
+class PreExtractedAIK:
+    """
+    Drop-in for twrpdtgen's AIKManager over an already unpacked image.
+    
+    Exposes the attributes DeviceTree reads from AIKManager, taken from
+    a directory with AIK's split_img/ and ramdisk/ layout (see
+    ImageExtraction.aik_dir()).
+    """
+    
+    BUILDPROP_LOCATIONS = ['default.prop', 'vendor/build.prop', 'system/build.prop',
+                           'system/etc/build.prop', 'prop.default']
+    
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.images_path = self.path / "split_img"
+        self.ramdisk_path = self.path / "ramdisk"
+    
+    def extract(self, recovery_image=None):
+        """Nothing to unpack; read the fields like AIKManager does after unpacking."""
+        self.get_image_infos()
+    
+    def get_image_infos(self):
+        self.kernel = self._image("kernel")
+        self.dt_image = self._image("dt")
+        self.dtb_image = self._image("dtb")
+        self.dtbo_image = self._image("dtbo") or self._image("recovery_dtbo")
+        self.base_address = self._field("base")
+        self.board_name = self._field("board")
+        self.cmdline = self._field("cmdline")
+        self.header_version = self._field("header_version") or "0"
+        self.recovery_size = self._field("origsize")
+        self.pagesize = self._field("pagesize")
+        self.ramdisk_compression = self._field("ramdiskcomp")
+        self.ramdisk_offset = self._field("ramdisk_offset")
+        self.tags_offset = self._field("tags_offset")
+        
+        self.buildprop = None
+        for location in self.BUILDPROP_LOCATIONS:
+            if (self.ramdisk_path / location).is_file():
+                self.buildprop = self.ramdisk_path / location
+                break
+    
+    def cleanup(self):
+        """The extraction belongs to the caller."""
+    
+    def _image(self, name: str) -> Optional[Path]:
+        path = self.images_path / f"recovery.img-{name}"
+        return path if path.is_file() else None
+    
+    def _field(self, name: str) -> Optional[str]:
+        path = self._image(name)
+        if path is None:
+            return None
+        lines = path.read_text(encoding='utf-8').splitlines()
+        return lines[0] if lines else ''
+
+
+@contextlib.contextmanager
+def _pre_extracted(aik_dir: Optional[str]):
+    """Make twrpdtgen's DeviceTree use aik_dir instead of running AIK."""
+    if aik_dir is None:
+        yield
+        return
+    from twrpdtgen import device_tree
+    original = device_tree.AIKManager
+    device_tree.AIKManager = lambda is_debug=False: PreExtractedAIK(aik_dir)
+    try:
+        yield
+    finally:
+        device_tree.AIKManager = original
+
+
+def _generate(image_path: str, output_dir: str, no_git: bool,
+              emit: Callable[[str], None], aik_dir: Optional[str] = None) -> Dict[str, Any]:
+    """Run twrpdtgen's DeviceTree in this process, on aik_dir when given."""
+    tail = deque(maxlen=OUTPUT_TAIL_LINES)
+    
+    def record(line: str):
+        line = line.strip()
+        if line:
+            tail.append(line)
+            emit(line)
+    
+    try:
+        from twrpdtgen.device_tree import DeviceTree
+        with _inprocess_lock, _captured_output(record), _pre_extracted(aik_dir):
+            tree = DeviceTree(Path(output_dir), recovery_image=Path(image_path), no_git=no_git)
+    except Exception as e:
+        return {
+            'success': False,
+            'error': f"{type(e).__name__}: {e}",
+            'output': '\n'.join(tail)
+        }
+    
+    return {
+        'success': True,
+        'output_path': str(tree.path),
+        'output': '\n'.join(tail)
+    }
+
+
+def _warm_worker(queue):
+    """Pool initializer: import twrpdtgen once per worker."""
+    global _worker_queue
+    _worker_queue = queue
+    try:
+        import twrpdtgen.device_tree  # noqa: F401
+    except ImportError:
+        pass
+
+
+def _pool_job(job_id: int, image_path: str, output_dir: str, no_git: bool,
+              aik_dir: Optional[str]) -> Dict[str, Any]:
+    try:
+        return _generate(image_path, output_dir, no_git,
+                         lambda line: _worker_queue.put((job_id, line)), aik_dir)
+    finally:
+        # Marks the end of the job's log lines
+        _worker_queue.put((job_id, None))
+
+
+class TwrpdtgenEngine:
+    """
+    Executes twrpdtgen jobs with the import cost paid once.
+    
+    Args:
+        mode: One of ENGINE_MODES; 'auto' runs in-process when twrpdtgen
+            is importable and falls back to a subprocess otherwise
+        workers: Worker processes in 'pool' mode
+        executable: Python interpreter for 'subprocess' mode
+    """
+    
+    def __init__(self, mode: str = 'auto', workers: Optional[int] = None,
+                 executable: Optional[str] = None):
+        if mode not in ENGINE_MODES:
+            raise ValueError(f"Unknown twrpdtgen engine mode '{mode}'. Use one of: {', '.join(ENGINE_MODES)}")
+        self.requested_mode = mode
+        self.workers = workers
+        self.executable = executable or sys.executable
+        self._importable = twrpdtgen_importable()
+        self._external_available = None
+        self._pool = None
+        self._queue = None
+        self._listener = None
+        self._callbacks: Dict[int, Optional[Callable]] = {}
+        self._logs_done: Dict[int, threading.Event] = {}
+        self._job_ids = itertools.count()
+        self._pool_lock = threading.Lock()
+        self._runners = set()
+        self._runners_lock = threading.Lock()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    @property
+    def mode(self) -> str:
+        """Mode jobs actually run in."""
+        if self.requested_mode == 'auto':
+            return 'inprocess' if self._importable else 'subprocess'
+        if self.requested_mode in ('inprocess', 'pool') and not self._importable:
+            return 'subprocess'
+        return self.requested_mode
+    
+    @property
+    def available(self) -> bool:
+        """
+        Whether twrpdtgen is installed.
+        
+        Answered from the import system, unless jobs go to another
+        interpreter; that one is asked once.
+        """
+        if self.mode != 'subprocess' or self.executable == sys.executable:
+            return self._importable
+        if self._external_available is None:
+            try:
+                result = subprocess.run([self.executable, "-c", "import twrpdtgen"],
+                                        capture_output=True, timeout=10)
+                self._external_available = result.returncode == 0
+            except Exception:
+                self._external_available = False
+        return self._external_available
+    
+    def warm(self):
+        """Do the one-time setup now: import twrpdtgen, or start the pool."""
+        mode = self.mode
+        if mode == 'inprocess':
+            import twrpdtgen.device_tree  # noqa: F401
+        elif mode == 'pool':
+            self._ensure_pool()
+    
+    def generate(
+        self,
+        image_path: str,
+        output_dir: str,
+        no_git: bool = False,
+        log_callback: Optional[Callable] = None,
+        timeout: Optional[float] = None,
+        aik_dir: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Generate a device tree for a recovery/boot image.
+        
+        Args:
+            image_path: Recovery image (boot image on A/B devices)
+            output_dir: Directory twrpdtgen writes <manufacturer>/<codename> to
+            no_git: Skip the git repository twrpdtgen creates in the tree
+            log_callback: Called with each output line as it is produced
+            timeout: Seconds after which a subprocess job is killed; pool
+                jobs are abandoned, in-process jobs cannot be interrupted
+            aik_dir: The image already unpacked in AIK's layout; used
+                instead of twrpdtgen's own unpack except in 'subprocess'
+                mode, where twrpdtgen runs in another interpreter
+        
+        Returns:
+            Dict with success, output_path (the generated device directory),
+            output (the last lines of output) or error
+        """
+        emit = log_callback or (lambda line: None)
+        mode = self.mode
+        if mode == 'inprocess':
+            return _generate(image_path, output_dir, no_git, emit, aik_dir)
+        if mode == 'pool':
+            return self._generate_in_pool(image_path, output_dir, no_git, log_callback, timeout, aik_dir)
+        return self._generate_in_subprocess(image_path, output_dir, no_git, emit, timeout)
+    
+    def cancel(self):
+        """Kill every running subprocess job."""
+        with self._runners_lock:
+            runners = list(self._runners)
+        for runner in runners:
+            runner.kill()
+    
+    def close(self):
+        """Shut down worker processes, if any were started."""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
+                self._queue.put(None)
+                self._listener.join()
+                self._listener = None
+                self._queue = None
+    
+    def _ensure_pool(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                return
+            context = multiprocessing.get_context('spawn')
+            self._queue = context.Queue()
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                             initializer=_warm_worker, initargs=(self._queue,))
+            self._listener = threading.Thread(target=self._forward_logs, name='twrpdtgen-logs', daemon=True)
+            self._listener.start()
+    
+    def _forward_logs(self):
+        """Dispatch worker log lines to the callback of their job."""
+        while True:
+            message = self._queue.get()
+            if message is None:
+                return
+            job_id, line = message
+            if line is None:
+                done = self._logs_done.get(job_id)
+                if done is not None:
+                    done.set()
+                continue
+            callback = self._callbacks.get(job_id)
+            if callback:
+                try:
+                    callback(line)
+                except Exception:
+                    pass
+    
+    def _generate_in_pool(self, image_path: str, output_dir: str, no_git: bool,
+                          log_callback: Optional[Callable], timeout: Optional[float],
+                          aik_dir: Optional[str]) -> Dict[str, Any]:
+        self._ensure_pool()
+        job_id = next(self._job_ids)
+        self._callbacks[job_id] = log_callback
+        done = self._logs_done[job_id] = threading.Event()
+        try:
+            result = self._pool.submit(_pool_job, job_id, image_path, output_dir, no_git,
+                                       aik_dir).result(timeout)
+            # Deliver every log line before the result
+            done.wait(timeout=10)
+            return result
+        except FuturesTimeoutError:
+            return {
+                'success': False,
+                'error': f"twrpdtgen timed out after {timeout:g}s"
+            }
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                # Start fresh workers for the next job
+                self.close()
+            return {
+                'success': False,
+                'error': f"twrpdtgen worker failed: {e}"
+            }
+        finally:
+            self._callbacks.pop(job_id, None)
+            self._logs_done.pop(job_id, None)
+    
+    def _generate_in_subprocess(self, image_path: str, output_dir: str, no_git: bool,
+                                emit: Callable[[str], None], timeout: Optional[float]) -> Dict[str, Any]:
+        cmd = [self.executable, "-m", "twrpdtgen", image_path, "-o", output_dir]
+        if no_git:
+            cmd.append("--no-git")
+        emit(f"Running: {' '.join(cmd)}")
+        
+        def forward(event: Dict[str, Any]):
+            if event['type'] == 'line' and event['text'].strip():
+                emit(event['text'].strip())
+        
+        runner = ProcessRunner(cmd, timeout=timeout, event_callback=forward)
+        with self._runners_lock:
+            self._runners.add(runner)
+        try:
+            result = runner.run()
+        finally:
+            with self._runners_lock:
+                self._runners.discard(runner)
+        
+        if result['timed_out']:
+            return {
+                'success': False,
+                'error': f"twrpdtgen timed out after {timeout:g}s",
+                'output': result['stdout']
+            }
+        if result['returncode'] != 0:
+            return {
+                'success': False,
+                'error': result['stderr'] or result.get('error') or "Unknown error during generation",
+                'output': result['stdout']
+            }
+        
+        return {
+            'success': True,
+            'output_path': output_dir,
+            'output': result['stdout']
+        }
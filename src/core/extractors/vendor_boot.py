@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Vendor Boot - vendor_boot.img (VNDRBOOT v3/v4) reader
+
+Indexes the vendor ramdisk table and bootconfig section of a vendor_boot
+image. Ramdisk fragments are exposed as lazy slices of the mapped image
+and are only decompressed when a caller asks for their contents.
+"""
+
+import io
+import mmap
+import struct
+from typing import Dict, Any, List, Optional, Tuple
+
+from .cpio import CpioReader, Matcher, RAMDISK_PATTERNS
+from .decompress import open_decompressed
+
+
+VENDOR_BOOT_MAGIC = b'VNDRBOOT'
+
+# Header layouts, see system/tools/mkbootimg/include/bootimg/bootimg.h
+_VENDOR_HEADER_V3 = struct.Struct('<8s5I2048sI16sIIQ')
+_VENDOR_HEADER_V4_EXTRA = struct.Struct('<4I')
+_RAMDISK_TABLE_ENTRY = struct.Struct('<3I32s16I')
+
+VENDOR_RAMDISK_TYPES = {
+    0: 'none',
+    1: 'platform',
+    2: 'recovery',
+    3: 'dlkm',
+}
+
+
+def _align(value: int, alignment: int) -> int:
+    """Round value up to the next multiple of alignment."""
+    return (value + alignment - 1) // alignment * alignment
+
+
+def _cstring(raw: bytes) -> str:
+    """Decode a NUL-padded header string."""
+    return raw.split(b'\x00', 1)[0].decode('utf-8', errors='replace')
+
+
+class VendorRamdisk:
+    """A vendor ramdisk fragment, decompressed only when opened."""
+    
+    def __init__(self, name: str, ramdisk_type: int, board_id: Tuple[int, ...],
+                 data: memoryview):
+        self.name = name
+        self.type = ramdisk_type
+        self.board_id = board_id
+        self.data = data
+    
+    @property
+    def type_name(self) -> str:
+        return VENDOR_RAMDISK_TYPES.get(self.type, f'unknown({self.type})')
+    
+    @property
+    def size(self) -> int:
+        return len(self.data)
+    
+    def open(self) -> io.BufferedReader:
+        """Open the fragment as a streaming, decompressed cpio archive."""
+        return open_decompressed(self.data)
+    
+    def decompress(self) -> bytes:
+        """Get the whole decompressed cpio archive of this fragment."""
+        with self.open() as stream:
+            return stream.read()
+    
+    def get_info(self) -> Dict[str, Any]:
+        """Get fragment metadata as a plain dict."""
+        return {
+            'name': self.name,
+            'type': self.type_name,
+            'size': self.size,
+            'board_id': list(self.board_id),
+        }
+
+
+class VendorBootImage:
+    """
+    Parsed vendor_boot image backed by a read-only buffer.
+    
+    Header v3 images carry a single vendor ramdisk; v4 images add a
+    ramdisk table describing several concatenated fragments, and a
+    bootconfig section.
+    """
+    
+    def __init__(self, buffer, source_name: str = '<buffer>'):
+        self.source_name = source_name
+        self._mmap = None
+        self._file = None
+        self._view = memoryview(buffer)
+        self._sections: Dict[str, Tuple[int, int]] = {}
+        self._exported = []
+        self.header: Dict[str, Any] = {}
+        self.ramdisks: List[VendorRamdisk] = []
+        
+        try:
+            self._parse()
+        except Exception:
+            self._view.release()
+            raise
+    
+    @classmethod
+    def open(cls, image_path: str) -> 'VendorBootImage':
+        """Memory-map a vendor_boot image file and parse its header."""
+        f = open(image_path, 'rb')
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            f.close()
+            raise
+        
+        try:
+            image = cls(mm, source_name=image_path)
+        except Exception:
+            mm.close()
+            f.close()
+            raise
+        
+        image._mmap = mm
+        image._file = f
+        return image
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    @property
+    def header_version(self) -> int:
+        return self.header['header_version']
+    
+    @property
+    def dtb(self) -> Optional[memoryview]:
+        return self.section('dtb')
+    
+    @property
+    def bootconfig(self) -> Dict[str, str]:
+        """Parse the bootconfig section into key/value pairs."""
+        config = {}
+        view = self.section('bootconfig')
+        if view is None:
+            return config
+        
+        for line in bytes(view).decode('utf-8', errors='replace').splitlines():
+            line = line.split('#', 1)[0].strip()
+            if '=' not in line:
+                continue
+            key, value = line.split('=', 1)
+            config[key.strip()] = value.strip().strip('"')
+        return config
+    
+    def section(self, name: str) -> Optional[memoryview]:
+        """Get a zero-copy view of an image section."""
+        if name not in self._sections:
+            return None
+        
+        offset, size = self._sections[name]
+        view = self._view[offset:offset + size]
+        self._exported.append(view)
+        return view
+    
+    def find_ramdisks(self, name: Optional[str] = None,
+                      ramdisk_type: Optional[str] = None) -> List[VendorRamdisk]:
+        """
+        Select ramdisk fragments by name and/or type.
+        
+        Args:
+            name: Fragment name as stored in the ramdisk table
+            ramdisk_type: One of 'platform', 'recovery', 'dlkm'
+        """
+        return [
+            ramdisk for ramdisk in self.ramdisks
+            if (name is None or ramdisk.name == name)
+            and (ramdisk_type is None or ramdisk.type_name == ramdisk_type)
+        ]
+    
+    def read_ramdisk_files(self, match: Matcher = RAMDISK_PATTERNS,
+                           ramdisk_type: Optional[str] = None) -> Dict[str, bytes]:
+        """
+        Read matching files from the vendor ramdisk fragments.
+        
+        Fragments are streamed one at a time in table order, so later
+        fragments override earlier ones just like when the kernel unpacks
+        them on top of each other.
+        """
+        files = {}
+        for ramdisk in self.find_ramdisks(ramdisk_type=ramdisk_type):
+            with ramdisk.open() as stream:
+                files.update(CpioReader(stream).read_files(match))
+        return files
+    
+    def get_info(self) -> Dict[str, Any]:
+        """Get header fields, section layout and ramdisk table as a plain dict."""
+        info = dict(self.header)
+        info['offsets'] = {name: offset for name, (offset, _) in self._sections.items()}
+        info['sizes'] = {name: size for name, (_, size) in self._sections.items()}
+        info['ramdisks'] = [ramdisk.get_info() for ramdisk in self.ramdisks]
+        info['bootconfig'] = self.bootconfig
+        return info
+    
+    def close(self):
+        """Release fragment views and unmap the image."""
+        for ramdisk in self.ramdisks:
+            ramdisk.data.release()
+        for view in self._exported:
+            view.release()
+        self.ramdisks = []
+        self._exported = []
+        self._view.release()
+        
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass
+            self._mmap = None
+        
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+    
+    def _parse(self):
+        """Parse the vendor boot header, ramdisk table and section offsets."""
+        if len(self._view) < _VENDOR_HEADER_V3.size or self._view[:8] != VENDOR_BOOT_MAGIC:
+            raise ValueError(f"{self.source_name}: not a vendor_boot image (missing VNDRBOOT magic)")
+        
+        (_, header_version, page_size, kernel_addr, ramdisk_addr,
+         vendor_ramdisk_size, cmdline, tags_addr, name, header_size,
+         dtb_size, dtb_addr) = _VENDOR_HEADER_V3.unpack_from(self._view, 0)
+        
+        if header_version < 3:
+            raise ValueError(f"{self.source_name}: unsupported vendor_boot header version {header_version}")
+        if page_size == 0 or page_size & (page_size - 1):
+            raise ValueError(f"{self.source_name}: invalid page size {page_size}")
+        
+        table_size = table_entry_num = table_entry_size = bootconfig_size = 0
+        if header_version >= 4:
+            table_size, table_entry_num, table_entry_size, bootconfig_size = \
+                _VENDOR_HEADER_V4_EXTRA.unpack_from(self._view, _VENDOR_HEADER_V3.size)
+        
+        base_address = (kernel_addr - 0x00008000) & 0xFFFFFFFF
+        self.header = {
+            'header_version': header_version,
+            'page_size': page_size,
+            'kernel_addr': kernel_addr,
+            'ramdisk_addr': ramdisk_addr,
+            'tags_addr': tags_addr,
+            'dtb_addr': dtb_addr,
+            'base_address': base_address,
+            'kernel_offset': (kernel_addr - base_address) & 0xFFFFFFFF,
+            'ramdisk_offset': (ramdisk_addr - base_address) & 0xFFFFFFFF,
+            'tags_offset': (tags_addr - base_address) & 0xFFFFFFFF,
+            'dtb_offset': dtb_addr - base_address if dtb_addr else 0,
+            'header_size': header_size,
+            'board': _cstring(name),
+            'cmdline': _cstring(cmdline).strip(),
+        }
+        
+        position = _align(header_size, page_size)
+        for section, size in (('vendor_ramdisk', vendor_ramdisk_size),
+                              ('dtb', dtb_size),
+                              ('vendor_ramdisk_table', table_size),
+                              ('bootconfig', bootconfig_size)):
+            if size:
+                if position + size > len(self._view):
+                    raise ValueError(
+                        f"{self.source_name}: {section} section ({size} bytes at {position}) "
+                        f"extends past end of image ({len(self._view)} bytes)"
+                    )
+                self._sections[section] = (position, size)
+            position += _align(size, page_size)
+        
+        if 'vendor_ramdisk' not in self._sections:
+            return
+        
+        ramdisk_start, _ = self._sections['vendor_ramdisk']
+        if table_entry_num and 'vendor_ramdisk_table' in self._sections:
+            table_start, _ = self._sections['vendor_ramdisk_table']
+            entry_size = table_entry_size or _RAMDISK_TABLE_ENTRY.size
+            for index in range(table_entry_num):
+                fields = _RAMDISK_TABLE_ENTRY.unpack_from(self._view, table_start + index * entry_size)
+                size, offset, ramdisk_type, ramdisk_name = fields[:4]
+                if offset + size > vendor_ramdisk_size:
+                    raise ValueError(f"{self.source_name}: ramdisk table entry {index} out of bounds")
+                start = ramdisk_start + offset
+                self.ramdisks.append(VendorRamdisk(
+                    _cstring(ramdisk_name), ramdisk_type, tuple(fields[4:]),
+                    self._view[start:start + size]
+                ))
+        else:
+            self.ramdisks.append(VendorRamdisk(
+                '', 1, (0,) * 16,
+                self._view[ramdisk_start:ramdisk_start + vendor_ramdisk_size]
+            ))
@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+"""
+FDT - Flattened device tree (DTB/DTBO) parser
+
+Pure-Python replacement for decompiling DTBs with dtc. Blobs are parsed
+straight out of a memoryview (typically the dtb/recovery_dtbo section of
+a mapped boot image), property values stay zero-copy slices, and DTS
+text is generated lazily per node subtree.
+
+Handles concatenated multi-DTB blobs (dtb partitions, appended DTBs,
+QCDT tables) and the Android dt_table container used by dtbo images.
+"""
+
+import struct
+import zlib
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+
+FDT_MAGIC = 0xD00DFEED
+FDT_MAGIC_BYTES = b'\xd0\x0d\xfe\xed'
+DT_TABLE_MAGIC = 0xD7B7AB1E
+
+FDT_BEGIN_NODE = 1
+FDT_END_NODE = 2
+FDT_PROP = 3
+FDT_NOP = 4
+FDT_END = 9
+
+_FDT_HEADER = struct.Struct('>10I')
+_DT_TABLE_HEADER = struct.Struct('>8I')
+_DT_TABLE_ENTRY = struct.Struct('>8I')
+
+_SCAN_WINDOW = 1 << 20
+
+
+def _is_printable_strings(value: bytes) -> bool:
+    """Heuristic used by dtc to decide whether a value is a string list."""
+    if not value or value[-1] != 0:
+        return False
+    strings = value[:-1].split(b'\x00')
+    for string in strings:
+        if not string:
+            return False
+        if any(c < 0x20 or c > 0x7E for c in string):
+            return False
+    return True
+
+
+def format_property_value(value) -> Optional[str]:
+    """
+    Format a property value the way dtc would print it.
+    
+    Returns:
+        DTS value text, or None for empty (boolean) properties
+    """
+    value = bytes(value)
+    if not value:
+        return None
+    if _is_printable_strings(value):
+        strings = value[:-1].decode('ascii').split('\x00')
+        return ', '.join('"' + s.replace('\\', '\\\\').replace('"', '\\"') + '"' for s in strings)
+    if len(value) % 4 == 0:
+        cells = struct.unpack(f'>{len(value) // 4}I', value)
+        return '<' + ' '.join(f'0x{cell:x}' for cell in cells) + '>'
+    return '[' + ' '.join(f'{b:02x}' for b in value) + ']'
+
+
+class FdtNode:
+    """A device tree node with zero-copy property values."""
+    
+    __slots__ = ('name', 'parent', 'properties', 'children')
+    
+    def __init__(self, name: str, parent: Optional['FdtNode'] = None):
+        self.name = name
+        self.parent = parent
+        self.properties: Dict[str, Any] = {}
+        self.children: List['FdtNode'] = []
+    
+    @property
+    def path(self) -> str:
+        if self.parent is None:
+            return '/'
+        parent_path = self.parent.path
+        return (parent_path if parent_path != '/' else '') + '/' + self.name
+    
+    @property
+    def phandle(self) -> Optional[int]:
+        value = self.properties.get('phandle', self.properties.get('linux,phandle'))
+        if value is None or len(value) != 4:
+            return None
+        return struct.unpack('>I', value)[0]
+    
+    def get_property(self, name: str) -> Optional[bytes]:
+        value = self.properties.get(name)
+        return None if value is None else bytes(value)
+    
+    def get_string(self, name: str) -> Optional[str]:
+        strings = self.get_strings(name)
+        return strings[0] if strings else None
+    
+    def get_strings(self, name: str) -> List[str]:
+        value = self.properties.get(name)
+        if value is None:
+            return []
+        return [s for s in bytes(value).decode('utf-8', errors='replace').split('\x00') if s]
+    
+    def get_cells(self, name: str) -> List[int]:
+        value = self.properties.get(name)
+        if value is None:
+            return []
+        return list(struct.unpack(f'>{len(value) // 4}I', bytes(value[:len(value) // 4 * 4])))
+    
+    def get_child(self, name: str) -> Optional['FdtNode']:
+        for child in self.children:
+            if child.name == name:
+                return child
+        # Allow lookups without the unit address, like dtc does
+        for child in self.children:
+            if child.name.split('@', 1)[0] == name:
+                return child
+        return None
+    
+    def find(self, path: str) -> Optional['FdtNode']:
+        """Find a descendant by a '/'-separated path relative to this node."""
+        node = self
+        for part in path.strip('/').split('/'):
+            if not part:
+                continue
+            node = node.get_child(part)
+            if node is None:
+                return None
+        return node
+    
+    def walk(self) -> Iterator['FdtNode']:
+        """Iterate over this node and all descendants, depth first."""
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children))
+    
+    def iter_dts(self, depth: int = 0) -> Iterator[str]:
+        """Lazily generate DTS lines for this node's subtree."""
+        indent = '\t' * depth
+        name = '/' if self.parent is None else self.name
+        yield f"{indent}{name} {{"
+        for prop_name, value in self.properties.items():
+            formatted = format_property_value(value)
+            if formatted is None:
+                yield f"{indent}\t{prop_name};"
+            else:
+                yield f"{indent}\t{prop_name} = {formatted};"
+        for child in self.children:
+            yield ''
+            yield from child.iter_dts(depth + 1)
+        yield f"{indent}}};"
+    
+    def to_dts(self) -> str:
+        return '\n'.join(self.iter_dts()) + '\n'
+    
+    def __repr__(self):
+        return f"FdtNode({self.path!r})"
+
+
+class FlattenedDeviceTree:
+    """A single flattened device tree blob."""
+    
+    def __init__(self, buffer, offset: int = 0):
+        view = memoryview(buffer).cast('B')
+        if len(view) - offset < _FDT_HEADER.size:
+            raise ValueError("Truncated FDT header")
+        
+        (magic, totalsize, off_dt_struct, off_dt_strings, off_mem_rsvmap,
+         version, last_comp_version, boot_cpuid_phys, size_dt_strings,
+         size_dt_struct) = _FDT_HEADER.unpack_from(view, offset)
+        
+        if magic != FDT_MAGIC:
+            raise ValueError(f"Bad FDT magic 0x{magic:08x}")
+        if totalsize > len(view) - offset:
+            raise ValueError(f"FDT totalsize {totalsize} exceeds buffer ({len(view) - offset} bytes)")
+        if off_dt_struct >= totalsize or off_dt_strings > totalsize or version < 16 or version > 32:
+            raise ValueError("Implausible FDT header")
+        if version < 17:
+            # v16 headers lack size_dt_struct; bound it by totalsize
+            size_dt_struct = totalsize - off_dt_struct
+        
+        self.offset = offset
+        self.totalsize = totalsize
+        self.version = version
+        self.last_comp_version = last_comp_version
+        self.boot_cpuid_phys = boot_cpuid_phys
+        self.blob = view[offset:offset + totalsize]
+        self._struct = self.blob[off_dt_struct:off_dt_struct + size_dt_struct]
+        self._strings = self.blob[off_dt_strings:off_dt_strings + size_dt_strings]
+        self._off_mem_rsvmap = off_mem_rsvmap
+        self._string_cache: Dict[int, str] = {}
+        self._words: Optional[List[int]] = None
+        self._root: Optional[FdtNode] = None
+    
+    @property
+    def root(self) -> FdtNode:
+        """Root node; the structure block is parsed on first access."""
+        if self._root is None:
+            self._root = self._parse_tree()
+        return self._root
+    
+    @property
+    def reserved_memory(self) -> List[Tuple[int, int]]:
+        """Memory reservation map as (address, size) pairs."""
+        entries = []
+        start = self._off_mem_rsvmap
+        limit = min(len(self.blob), start + 16 * 1024)
+        for address, size in struct.iter_unpack('>QQ', self.blob[start:start + (limit - start) // 16 * 16]):
+            if address == 0 and size == 0:
+                break
+            entries.append((address, size))
+        return entries
+    
+    def find(self, path: str) -> Optional[FdtNode]:
+        return self.root.find(path)
+    
+    def root_properties(self) -> Dict[str, memoryview]:
+        """
+        Read only the root node's properties.
+        
+        Stops at the first child node, so identifying a board does not
+        require walking the whole structure block.
+        """
+        words = self._get_words()
+        properties = {}
+        index = 0
+        depth = 0
+        count = len(words)
+        
+        while index < count:
+            token = words[index]
+            index += 1
+            if token == FDT_BEGIN_NODE:
+                if depth == 1:
+                    break
+                depth += 1
+                index = self._skip_name(index)
+            elif token == FDT_PROP:
+                length, nameoff = words[index], words[index + 1]
+                start = (index + 2) * 4
+                properties[self._string(nameoff)] = self._struct[start:start + length]
+                index += 2 + (length + 3) // 4
+            elif token in (FDT_END_NODE, FDT_END):
+                break
+        
+        return properties
+    
+    def get_info(self) -> Dict[str, Any]:
+        """Get the identifying root properties of this blob."""
+        root = FdtNode('')
+        root.properties = self.root_properties()
+        return {
+            'model': root.get_string('model'),
+            'compatible': root.get_strings('compatible'),
+            'msm_id': root.get_cells('qcom,msm-id'),
+            'board_id': root.get_cells('qcom,board-id'),
+            'pmic_id': root.get_cells('qcom,pmic-id'),
+            'size': self.totalsize,
+        }
+    
+    def iter_dts(self, path: str = '/') -> Iterator[str]:
+        """Lazily generate DTS text for the subtree at path (whole tree by default)."""
+        node = self.root.find(path)
+        if node is None:
+            raise KeyError(path)
+        
+        if node.parent is None:
+            yield '/dts-v1/;'
+            yield ''
+            for address, size in self.reserved_memory:
+                yield f"/memreserve/ 0x{address:016x} 0x{size:016x};"
+        yield from node.iter_dts()
+    
+    def to_dts(self, path: str = '/') -> str:
+        return '\n'.join(self.iter_dts(path)) + '\n'
+    
+    def _get_words(self) -> List[int]:
+        if self._words is None:
+            usable = len(self._struct) // 4 * 4
+            self._words = [word for (word,) in struct.iter_unpack('>I', self._struct[:usable])]
+        return self._words
+    
+    def _string(self, offset: int) -> str:
+        name = self._string_cache.get(offset)
+        if name is None:
+            end = offset
+            strings = self._strings
+            while end < len(strings) and strings[end] != 0:
+                end += 1
+            name = bytes(strings[offset:end]).decode('utf-8', errors='replace')
+            self._string_cache[offset] = name
+        return name
+    
+    def _read_name(self, index: int) -> Tuple[str, int]:
+        """Read a NUL-terminated node name starting at word index."""
+        start = index * 4
+        end = start
+        data = self._struct
+        while end < len(data) and data[end] != 0:
+            end += 1
+        name = bytes(data[start:end]).decode('utf-8', errors='replace')
+        return name, (end + 4) // 4
+    
+    def _skip_name(self, index: int) -> int:
+        return self._read_name(index)[1]
+    
+    def _parse_tree(self) -> FdtNode:
+        words = self._get_words()
+        data = self._struct
+        index = 0
+        count = len(words)
+        root = None
+        node = None
+        
+        while index < count:
+            token = words[index]
+            index += 1
+            
+            if token == FDT_BEGIN_NODE:
+                name, index = self._read_name(index)
+                child = FdtNode(name, node)
+                if node is None:
+                    root = child
+                else:
+                    node.children.append(child)
+                node = child
+            elif token == FDT_PROP:
+                if node is None:
+                    raise ValueError("FDT property outside of a node")
+                length, nameoff = words[index], words[index + 1]
+                start = (index + 2) * 4
+                node.properties[self._string(nameoff)] = data[start:start + length]
+                index += 2 + (length + 3) // 4
+            elif token == FDT_END_NODE:
+                if node is None:
+                    raise ValueError("Unbalanced FDT_END_NODE")
+                if node.parent is None:
+                    break
+                node = node.parent
+            elif token == FDT_END:
+                break
+            elif token != FDT_NOP:
+                raise ValueError(f"Unknown FDT token 0x{token:x} at offset {(index - 1) * 4}")
+        
+        if root is None:
+            raise ValueError("FDT has no root node")
+        return root
+
+
+class DtTableEntry:
+    """An entry of an Android dt_table (dtbo image)."""
+    
+    def __init__(self, index: int, dt_size: int, dt_offset: int, dt_id: int,
+                 rev: int, custom: Tuple[int, ...], fdt: FlattenedDeviceTree):
+        self.index = index
+        self.size = dt_size
+        self.offset = dt_offset
+        self.id = dt_id
+        self.rev = rev
+        self.custom = custom
+        self.fdt = fdt
+    
+    def get_info(self) -> Dict[str, Any]:
+        info = self.fdt.get_info()
+        info.update({
+            'index': self.index,
+            'id': self.id,
+            'rev': self.rev,
+            'custom': list(self.custom),
+        })
+        return info
+
+
+def parse_dt_table(buffer) -> List[DtTableEntry]:
+    """
+    Parse an Android dt_table container (dtbo.img / recovery_dtbo).
+    
+    Raises:
+        ValueError: If the buffer is not a dt_table
+    """
+    view = memoryview(buffer).cast('B')
+    if len(view) < _DT_TABLE_HEADER.size:
+        raise ValueError("Truncated dt_table header")
+    
+    (magic, total_size, header_size, entry_size, entry_count,
+     entries_offset, page_size, version) = _DT_TABLE_HEADER.unpack_from(view, 0)
+    if magic != DT_TABLE_MAGIC:
+        raise ValueError(f"Bad dt_table magic 0x{magic:08x}")
+    
+    entries = []
+    for index in range(entry_count):
+        (dt_size, dt_offset, dt_id, rev, *custom) = _DT_TABLE_ENTRY.unpack_from(
+            view, entries_offset + index * entry_size)
+        
+        blob = view[dt_offset:dt_offset + dt_size]
+        # Version 1 tables store a compression type in the low bits of
+        # the first custom word
+        compression = custom[0] & 0x0F if version >= 1 else 0
+        if compression:
+            blob = memoryview(zlib.decompress(blob, 15 + 32))
+        
+        entries.append(DtTableEntry(index, dt_size, dt_offset, dt_id, rev,
+                                    tuple(custom), FlattenedDeviceTree(blob)))
+    return entries
+
+
+def _find_magic(view: memoryview, start: int) -> int:
+    """Find the next FDT magic at or after start, scanning in bounded windows."""
+    position = start
+    while position < len(view):
+        window = bytes(view[position:position + _SCAN_WINDOW + 3])
+        found = window.find(FDT_MAGIC_BYTES)
+        if found >= 0:
+            return position + found
+        position += _SCAN_WINDOW
+    return -1
+
+
+def split_dtbs(buffer) -> List[FlattenedDeviceTree]:
+    """
+    Split a blob into its device trees.
+    
+    Accepts a single DTB, concatenated DTBs (a dtb partition, or DTBs
+    appended to a kernel image / wrapped in a QCDT table) or an Android
+    dt_table. Candidates with an implausible header are skipped.
+    """
+    view = memoryview(buffer).cast('B')
+    if len(view) >= 4 and struct.unpack_from('>I', view, 0)[0] == DT_TABLE_MAGIC:
+        return [entry.fdt for entry in parse_dt_table(view)]
+    
+    dtbs = []
+    position = 0
+    while True:
+        position = _find_magic(view, position)
+        if position < 0:
+            break
+        try:
+            fdt = FlattenedDeviceTree(view, position)
+        except ValueError:
+            position += 4
+            continue
+        dtbs.append(fdt)
+        position += max(fdt.totalsize, 4)
+    return dtbs
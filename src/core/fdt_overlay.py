@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+FDT Overlay - Device tree overlay (DTBO) application
+
+Applies Android DTBO overlays onto base DTBs the same way the bootloader
+does (libfdt fdt_overlay_apply), so the real board model, compatible and
+early-mount fstab of each variant can be read from a boot image.
+
+A phandle index and a path index over the base tree make every
+__fixups__/__local_fixups__/target resolution O(1); applying an overlay
+is a single pass over the overlay tree.
+"""
+
+import struct
+from typing import Dict, Any, List, Optional
+
+from .fdt import FdtNode, FlattenedDeviceTree, split_dtbs
+
+
+class DeviceTreeIndex:
+    """phandle -> node and path -> node lookup tables for a live tree."""
+    
+    def __init__(self, root: FdtNode):
+        self.root = root
+        self.by_phandle: Dict[int, FdtNode] = {}
+        self.by_path: Dict[str, FdtNode] = {}
+        self._paths: Dict[int, str] = {}
+        self.max_phandle = 0
+        self.add_subtree(root, '/')
+    
+    def add_subtree(self, node: FdtNode, path: str):
+        """Index node (located at path) and all of its descendants."""
+        stack = [(node, path)]
+        while stack:
+            current, current_path = stack.pop()
+            self.add_node(current, current_path)
+            prefix = current_path if current_path != '/' else ''
+            for child in current.children:
+                stack.append((child, f"{prefix}/{child.name}"))
+    
+    def add_node(self, node: FdtNode, path: str):
+        """Index a single node, e.g. one created while merging an overlay."""
+        self.by_path[path] = node
+        self._paths[id(node)] = path
+        
+        phandle = node.phandle
+        if phandle is not None and phandle not in (0, 0xFFFFFFFF):
+            self.by_phandle[phandle] = node
+            if phandle > self.max_phandle:
+                self.max_phandle = phandle
+    
+    def path_of(self, node: FdtNode) -> str:
+        path = self._paths.get(id(node))
+        return path if path is not None else node.path
+    
+    def lookup_path(self, path: str) -> Optional[FdtNode]:
+        node = self.by_path.get(path)
+        if node is None:
+            # Paths in target-path may omit unit addresses
+            node = self.root.find(path)
+        return node
+    
+    def symbol(self, label: str) -> Optional[FdtNode]:
+        """Resolve a label through the base tree's __symbols__ node."""
+        symbols = self.by_path.get('/__symbols__')
+        if symbols is None:
+            return None
+        path = symbols.get_string(label)
+        if path is None:
+            return None
+        return self.lookup_path(path)
+
+
+def _patch_cell(node: FdtNode, prop_name: str, offset: int, value: int):
+    """Overwrite a big-endian u32 inside a property value (copy-on-write)."""
+    current = node.properties.get(prop_name)
+    if current is None:
+        raise ValueError(f"Overlay fixup references missing property {node.path}:{prop_name}")
+    if not isinstance(current, bytearray):
+        current = bytearray(current)
+        node.properties[prop_name] = current
+    if offset + 4 > len(current):
+        raise ValueError(f"Overlay fixup offset {offset} outside {node.path}:{prop_name}")
+    struct.pack_into('>I', current, offset, value)
+
+
+def _adjust_local_phandles(overlay_root: FdtNode, delta: int):
+    """Shift every phandle defined in the overlay above the base's range."""
+    for node in overlay_root.walk():
+        for prop_name in ('phandle', 'linux,phandle'):
+            value = node.properties.get(prop_name)
+            if value is not None and len(value) == 4:
+                _patch_cell(node, prop_name, 0, struct.unpack('>I', value)[0] + delta)
+
+
+def _update_local_references(overlay_root: FdtNode, delta: int):
+    """Walk __local_fixups__ alongside the overlay and shift local phandle references."""
+    fixups = overlay_root.get_child('__local_fixups__')
+    if fixups is None:
+        return
+    
+    stack = [(fixups, overlay_root)]
+    while stack:
+        fixup_node, target = stack.pop()
+        for prop_name in fixup_node.properties:
+            for offset in fixup_node.get_cells(prop_name):
+                value = target.properties.get(prop_name)
+                if value is None:
+                    raise ValueError(f"__local_fixups__ references missing property {target.path}:{prop_name}")
+                cell = struct.unpack_from('>I', value, offset)[0]
+                _patch_cell(target, prop_name, offset, cell + delta)
+        
+        children = {child.name: child for child in target.children}
+        for fixup_child in fixup_node.children:
+            target_child = children.get(fixup_child.name)
+            if target_child is None:
+                raise ValueError(f"__local_fixups__ references missing node {target.path}/{fixup_child.name}")
+            stack.append((fixup_child, target_child))
+
+
+def _fixup_phandles(overlay_root: FdtNode, index: DeviceTreeIndex):
+    """Resolve __fixups__ (references to base labels) to base phandles."""
+    fixups = overlay_root.get_child('__fixups__')
+    if fixups is None:
+        return
+    
+    for label in fixups.properties:
+        node = index.symbol(label)
+        if node is None or node.phandle is None:
+            raise ValueError(f"Overlay references unknown label '{label}'")
+        phandle = node.phandle
+        
+        for reference in fixups.get_strings(label):
+            path, prop_name, offset = reference.rsplit(':', 2)
+            target = overlay_root.find(path)
+            if target is None:
+                raise ValueError(f"__fixups__ references missing node {path}")
+            _patch_cell(target, prop_name, int(offset), phandle)
+
+
+def _merge_node(target: FdtNode, source: FdtNode, target_path: str, index: DeviceTreeIndex):
+    """Merge source's properties and children into target."""
+    target.properties.update(source.properties)
+    
+    existing = {child.name: child for child in target.children}
+    prefix = target_path if target_path != '/' else ''
+    for child in source.children:
+        child_path = f"{prefix}/{child.name}"
+        match = existing.get(child.name)
+        if match is None:
+            match = FdtNode(child.name, target)
+            target.children.append(match)
+            existing[child.name] = match
+        _merge_node(match, child, child_path, index)
+    
+    # Re-index after the merge so phandles set by the overlay are found
+    index.add_node(target, target_path)
+
+
+def _fragment_target(fragment: FdtNode, index: DeviceTreeIndex) -> Optional[FdtNode]:
+    target = fragment.properties.get('target')
+    if target is not None and len(target) == 4:
+        return index.by_phandle.get(struct.unpack('>I', target)[0])
+    
+    target_path = fragment.get_string('target-path')
+    if target_path is not None:
+        return index.lookup_path(target_path)
+    return None
+
+
+def apply_overlay(index: DeviceTreeIndex, overlay: FlattenedDeviceTree):
+    """
+    Apply one overlay onto the tree behind index, in place.
+    
+    The overlay tree is re-parsed from its blob, so the same DTBO entry
+    can be applied to several base trees.
+    """
+    overlay_root = FlattenedDeviceTree(overlay.blob).root
+    delta = index.max_phandle
+    
+    _adjust_local_phandles(overlay_root, delta)
+    _update_local_references(overlay_root, delta)
+    _fixup_phandles(overlay_root, index)
+    
+    fragment_paths = {}
+    for fragment in overlay_root.children:
+        payload = fragment.get_child('__overlay__')
+        if payload is None:
+            continue
+        target = _fragment_target(fragment, index)
+        if target is None:
+            raise ValueError(f"Overlay fragment {fragment.name} has no resolvable target")
+        
+        target_path = index.path_of(target)
+        _merge_node(target, payload, target_path, index)
+        fragment_paths[f"/{fragment.name}/__overlay__"] = target_path
+    
+    symbols = overlay_root.get_child('__symbols__')
+    if symbols is not None and symbols.properties:
+        base_symbols = index.by_path.get('/__symbols__')
+        if base_symbols is None:
+            base_symbols = FdtNode('__symbols__', index.root)
+            index.root.children.append(base_symbols)
+            index.by_path['/__symbols__'] = base_symbols
+        
+        for label in symbols.properties:
+            path = symbols.get_string(label) or ''
+            for fragment_path, target_path in fragment_paths.items():
+                if path.startswith(fragment_path):
+                    rest = path[len(fragment_path):]
+                    path = (target_path.rstrip('/') + rest) or '/'
+                    break
+            base_symbols.properties[label] = path.encode('utf-8') + b'\x00'
+
+
+def _ids_match(base_ids: List[int], overlay_ids: List[int]) -> bool:
+    """Compare the first qcom id cell (SoC / board type), wildcarding missing ids."""
+    if not base_ids or not overlay_ids:
+        return True
+    return base_ids[0] == overlay_ids[0]
+
+
+def select_overlays(base: FlattenedDeviceTree, overlays: List[FlattenedDeviceTree]) -> List[int]:
+    """
+    Pick the overlays meant for a base DTB.
+    
+    Overlays are matched on qcom,msm-id; those whose qcom,board-id also
+    matches come first, mirroring the bootloader's best-match order.
+    
+    Returns:
+        Indexes into overlays
+    """
+    base_info = base.get_info()
+    exact, partial = [], []
+    for number, overlay in enumerate(overlays):
+        overlay_info = overlay.get_info()
+        if not _ids_match(base_info['msm_id'], overlay_info['msm_id']):
+            continue
+        if _ids_match(base_info['board_id'], overlay_info['board_id']):
+            exact.append(number)
+        else:
+            partial.append(number)
+    return exact + partial
+
+
+def get_board_info(root: FdtNode) -> Dict[str, Any]:
+    """Extract board identity and the early-mount fstab from a (merged) tree."""
+    fstab = []
+    fstab_node = root.find('firmware/android/fstab')
+    if fstab_node is not None:
+        for entry in fstab_node.children:
+            fstab.append({
+                'name': entry.name,
+                'dev': entry.get_string('dev'),
+                'type': entry.get_string('type'),
+                'mnt_point': entry.get_string('mnt_point') or f"/{entry.name}",
+                'mnt_flags': entry.get_string('mnt_flags'),
+                'fsmgr_flags': entry.get_string('fsmgr_flags'),
+            })
+    
+    compatible = root.get_strings('compatible')
+    platform = None
+    for value in compatible:
+        _, _, soc = value.partition(',')
+        if soc and '-' not in soc:
+            platform = soc
+            break
+    
+    android = root.find('firmware/android')
+    return {
+        'model': root.get_string('model'),
+        'compatible': compatible,
+        'platform': platform,
+        'msm_id': root.get_cells('qcom,msm-id'),
+        'board_id': root.get_cells('qcom,board-id'),
+        'hardware': android.get_string('hardware') if android is not None else None,
+        'fstab': fstab,
+    }
+
+
+def resolve_board_variants(dtb, dtbo=None) -> List[Dict[str, Any]]:
+    """
+    Apply matching DTBO overlays to each base DTB and describe the results.
+    
+    Args:
+        dtb: Buffer with one or more base DTBs (boot/vendor_boot dtb section)
+        dtbo: Optional dt_table/overlay buffer (recovery_dtbo or dtbo.img)
+    
+    Returns:
+        One dict per (base, overlay) variant, or per base when there are
+        no overlays, with the board info of the merged tree
+    """
+    bases = split_dtbs(dtb) if dtb is not None else []
+    overlays = split_dtbs(dtbo) if dtbo is not None else []
+    variants = []
+    
+    for base_number, base in enumerate(bases):
+        matching = select_overlays(base, overlays)
+        if not matching:
+            info = get_board_info(base.root)
+            info.update({'base_index': base_number, 'overlay_index': None})
+            variants.append(info)
+            continue
+        
+        for overlay_number in matching:
+            # Each variant gets a fresh copy of the base tree
+            index = DeviceTreeIndex(FlattenedDeviceTree(base.blob).root)
+            apply_overlay(index, overlays[overlay_number])
+            info = get_board_info(index.root)
+            info.update({'base_index': base_number, 'overlay_index': overlay_number})
+            variants.append(info)
+    
+    return variants
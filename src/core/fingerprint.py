@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Fingerprint - Two-tier image identity
+
+Hashing a 100 MB+ image in full every time it is dropped on the window
+or queued in a batch is slow on spinning disks and network shares.
+Images get a quick key first: a hash of the size and a few sampled
+blocks (head, tail and evenly spaced strides), a handful of reads
+whatever the image size. The full BLAKE2b is computed in a background
+thread and confirms the identity later.
+
+Both are memoized in a small SQLite table keyed by device and inode and
+validated by size and mtime, so a second visit to an unchanged file costs one stat and
+one indexed query, and duplicates are found by key lookup.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+
+DEFAULT_DB_PATH = Path.home() / ".cache" / "gui-dtgen" / "fingerprints.sqlite3"
+
+SAMPLE_SIZE = 64 * 1024
+STRIDE_SAMPLES = 16
+FULL_HASH_BUFFER_SIZE = 4 * 1024 * 1024
+
+# The full hash is the content digest the processor keys memoized stages by
+FULL_DIGEST_SIZE = 20
+QUICK_DIGEST_SIZE = 16
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+    device INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    quick TEXT NOT NULL,
+    full TEXT,
+    seen REAL NOT NULL,
+    PRIMARY KEY (device, inode)
+);
+CREATE INDEX IF NOT EXISTS fingerprints_quick ON fingerprints (quick);
+CREATE INDEX IF NOT EXISTS fingerprints_full ON fingerprints (full);
+"""
+
+
+def quick_fingerprint(path: str, stat: Optional[os.stat_result] = None) -> str:
+    """
+    Hash the size and sampled blocks of a file.
+    
+    Reads at most (STRIDE_SAMPLES + 2) * SAMPLE_SIZE bytes. The mtime is
+    left out so copies of an image share a key; it only validates the
+    memo. Different files sharing a key would need identical size and
+    samples, which the full hash settles.
+    """
+    if stat is None:
+        stat = os.stat(path)
+    size = stat.st_size
+    digest = hashlib.blake2b(digest_size=QUICK_DIGEST_SIZE)
+    digest.update(str(size).encode('ascii'))
+    
+    if size <= (STRIDE_SAMPLES + 2) * SAMPLE_SIZE:
+        offsets = [0]
+        sample_size = size
+    else:
+        stride = (size - SAMPLE_SIZE) // (STRIDE_SAMPLES + 1)
+        offsets = [index * stride for index in range(STRIDE_SAMPLES + 1)]
+        offsets.append(size - SAMPLE_SIZE)
+        sample_size = SAMPLE_SIZE
+    
+    with open(path, 'rb', buffering=0) as f:
+        for offset in offsets:
+            f.seek(offset)
+            digest.update(f.read(sample_size))
+    return digest.hexdigest()
+
+
+def full_hash(path: str, buffer_size: int = FULL_HASH_BUFFER_SIZE) -> str:
+    """BLAKE2b of the whole file, read with readinto into one reused buffer."""
+    digest = hashlib.blake2b(digest_size=FULL_DIGEST_SIZE)
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            digest.update(view[:n])
+    return digest.hexdigest()
+
+
+class FingerprintService:
+    """
+    Memoized quick and full fingerprints of image files.
+    
+    Args:
+        db_path: SQLite database; ':memory:' keeps the memo in-process
+        background: Compute full hashes in a worker thread after the
+            quick key is returned
+    """
+    
+    def __init__(self, db_path: Optional[str] = None, background: bool = True):
+        self.db_path = str(db_path) if db_path is not None else str(DEFAULT_DB_PATH)
+        self.background = background
+        self._lock = threading.Lock()
+        self._pending: Dict[tuple, Future] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        
+        if self.db_path != ':memory:':
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        with self._lock:
+            self._db.executescript(_SCHEMA)
+            self._db.commit()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def fingerprint(self, path: str) -> Dict[str, Any]:
+        """
+        Get the fingerprint of a file.
+        
+        Returns:
+            Dict with 'quick' (always set) and 'full' (None until the
+            background hash finishes), plus 'size' and 'cached'
+        """
+        stat = os.stat(path)
+        row = self._lookup(stat)
+        if row is not None:
+            quick, full = row
+            cached = True
+        else:
+            quick, full = quick_fingerprint(path, stat), None
+            cached = False
+            self._store(stat, path, quick)
+        
+        if full is None and self.background:
+            self._schedule(path, stat)
+        return {'quick': quick, 'full': full, 'size': stat.st_size, 'cached': cached}
+    
+    def full_hash(self, path: str) -> str:
+        """Get the full hash, waiting for (or computing) it if not memoized."""
+        stat = os.stat(path)
+        row = self._lookup(stat)
+        if row is not None and row[1] is not None:
+            return row[1]
+        if row is None:
+            self._store(stat, path, quick_fingerprint(path, stat))
+        
+        with self._lock:
+            future = self._pending.get(self._identity(stat))
+        if future is not None:
+            return future.result()
+        return self._compute_full(path, stat)
+    
+    def find_duplicates(self, path: str) -> List[str]:
+        """
+        Other known files with the same content.
+        
+        Files whose full hashes are both known are compared by those;
+        otherwise a quick key match counts. Paths that no longer exist
+        or have changed are skipped.
+        """
+        own = self.fingerprint(path)
+        stat = os.stat(path)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT device, inode, size, mtime_ns, path, full FROM fingerprints "
+                "WHERE quick = ? OR (full IS NOT NULL AND full = ?)",
+                (own['quick'], own['full'])
+            ).fetchall()
+        
+        duplicates = []
+        for device, inode, size, mtime_ns, other_path, other_full in rows:
+            if (device, inode) == (stat.st_dev, stat.st_ino):
+                continue
+            if own['full'] and other_full and own['full'] != other_full:
+                continue
+            try:
+                other = os.stat(other_path)
+            except OSError:
+                continue
+            if (other.st_dev, other.st_ino, other.st_size, other.st_mtime_ns) == (device, inode, size, mtime_ns):
+                duplicates.append(other_path)
+        return sorted(duplicates)
+    
+    def wait(self):
+        """Block until all background hashes are done."""
+        with self._lock:
+            futures = list(self._pending.values())
+        for future in futures:
+            try:
+                future.result()
+            except Exception:
+                pass
+    
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+    
+    @staticmethod
+    def _identity(stat: os.stat_result) -> tuple:
+        return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    
+    def _lookup(self, stat: os.stat_result) -> Optional[tuple]:
+        """(quick, full) memoized for this exact file version, or None."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT quick, full FROM fingerprints "
+                "WHERE device = ? AND inode = ? AND size = ? AND mtime_ns = ?",
+                self._identity(stat)
+            ).fetchone()
+    
+    def _store(self, stat: os.stat_result, path: str, quick: str):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO fingerprints "
+                "(device, inode, size, mtime_ns, path, quick, full, seen) "
+                "VALUES (?, ?, ?, ?, ?, ?, NULL, ?)",
+                (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns,
+                 os.path.abspath(path), quick, time.time())
+            )
+            self._db.commit()
+    
+    def _schedule(self, path: str, stat: os.stat_result):
+        identity = self._identity(stat)
+        with self._lock:
+            if identity in self._pending:
+                return
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='fingerprint')
+            self._pending[identity] = self._executor.submit(self._compute_full, path, stat)
+    
+    def _compute_full(self, path: str, stat: os.stat_result) -> str:
+        identity = self._identity(stat)
+        try:
+            digest = full_hash(path)
+            # Only record the hash if the file did not change meanwhile
+            if self._identity(os.stat(path)) == identity:
+                with self._lock:
+                    if self._db is not None:
+                        self._db.execute(
+                            "UPDATE fingerprints SET full = ? "
+                            "WHERE device = ? AND inode = ? AND size = ? AND mtime_ns = ?",
+                            (digest,) + identity
+                        )
+                        self._db.commit()
+            return digest
+        finally:
+            with self._lock:
+                self._pending.pop(identity, None)
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Image Extraction - One unpack of the input image per job
+
+The device info, DT analysis, kernel analysis, native generator and
+twrpdtgen all need parts of the same image. Opened and
+unpacked separately, the ramdisk is decompressed once per consumer and
+twrpdtgen runs a whole AIK unpack of its own on top.
+
+An ImageExtraction is that single unpack. The image is mapped once; the
+ramdisk is decompressed once, on first use, and only the files any
+consumer reads are kept; the kernel is analysed once. For twrpdtgen the
+same data is laid out on disk the way AIK leaves it (split_img/ and
+ramdisk/), so its AIK step can be replaced by an adapter reading that
+directory.
+"""
+
+import os
+import posixpath
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+from .extractors import BootImage, VendorBootImage, CpioReader, RAMDISK_PATTERNS
+from .extractors.decompress import detect_compression
+from .kernel import KernelAnalyzer
+
+
+# Ramdisk files any consumer reads: the common patterns, prop files that
+# prop.default often links to, and init scripts outside init*.rc
+EXTRACTION_PATTERNS = RAMDISK_PATTERNS + ['*/prop.default', '*.rc']
+
+# AIK's name of each split_img/ section
+AIK_SECTIONS = {
+    'kernel': 'kernel',
+    'dt': 'dt',
+    'dtb': 'dtb',
+    'recovery_dtbo': 'recovery_dtbo',
+    'second': 'second',
+}
+
+# AIK's ramdiskcomp values by detect_compression() name
+AIK_COMPRESSION_NAMES = {
+    'lz4_legacy': 'lz4-l',
+    'none': 'cpio',
+}
+
+
+class ImageExtraction:
+    """
+    The parsed and lazily unpacked contents of one boot, recovery or vendor_boot image.
+    
+    Every property is computed at most once and is safe to read from
+    several threads.
+    
+    Args:
+        image_path: Image to unpack
+        work_dir: Directory for on-disk artifacts; a temporary one is
+            created (and removed by close()) when None
+    """
+    
+    def __init__(self, image_path: str, work_dir: Optional[str] = None):
+        self.image_path = image_path
+        self._own_dir = work_dir is None
+        self.work_dir = Path(work_dir) if work_dir is not None else None
+        self._lock = threading.RLock()
+        self._ramdisk_files: Optional[Dict[str, bytes]] = None
+        self._kernel_info: Optional[Dict[str, Any]] = None
+        self._aik_dir: Optional[Path] = None
+        
+        try:
+            self.image = BootImage.open(image_path)
+        except ValueError:
+            self.image = VendorBootImage.open(image_path)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    @property
+    def is_vendor_boot(self) -> bool:
+        return isinstance(self.image, VendorBootImage)
+    
+    @property
+    def header(self) -> Dict[str, Any]:
+        return self.image.header
+    
+    def section(self, name: str) -> Optional[memoryview]:
+        """Zero-copy view of an image section."""
+        return self.image.section(name)
+    
+    @property
+    def ramdisk_compression(self) -> Optional[str]:
+        if self.is_vendor_boot:
+            ramdisks = self.image.ramdisks
+            return detect_compression(ramdisks[0].data[:8]) if ramdisks else None
+        ramdisk = self.image.ramdisk
+        return detect_compression(ramdisk[:8]) if ramdisk is not None else None
+    
+    @property
+    def kernel_compression(self) -> Optional[str]:
+        kernel = None if self.is_vendor_boot else self.image.kernel
+        return detect_compression(kernel[:8]) if kernel is not None else None
+    
+    @property
+    def ramdisk_files(self) -> Dict[str, bytes]:
+        """
+        Ramdisk files matching EXTRACTION_PATTERNS, decompressed on first use.
+        
+        Symlinks are replaced by the content of their target when the
+        target was read too; recovery ramdisks often ship prop.default
+        as a link to system/etc/prop.default.
+        """
+        with self._lock:
+            if self._ramdisk_files is None:
+                self._ramdisk_files = self._read_ramdisk()
+            return self._ramdisk_files
+    
+    def kernel_info(self) -> Dict[str, Any]:
+        """KernelAnalyzer result for the image's kernel, analysed once."""
+        with self._lock:
+            if self._kernel_info is None:
+                kernel = None if self.is_vendor_boot else self.image.section_range('kernel')
+                if kernel is None:
+                    self._kernel_info = {
+                        'success': False,
+                        'error': 'Image has no kernel'
+                    }
+                else:
+                    offset, size = kernel
+                    self._kernel_info = KernelAnalyzer().analyze(self.image.buffer, offset, offset + size)
+            return self._kernel_info
+    
+    def aik_dir(self) -> Path:
+        """
+        Lay the extraction out the way AIK's unpackimg leaves it.
+        
+        split_img/recovery.img-<field> holds the sections and header
+        fields, ramdisk/ the extracted ramdisk files. Written once.
+        """
+        with self._lock:
+            if self._aik_dir is not None:
+                return self._aik_dir
+            
+            if self.work_dir is None:
+                self.work_dir = Path(tempfile.mkdtemp(prefix="dtgen_extract_"))
+            path = self.work_dir / "aik"
+            split_img = path / "split_img"
+            ramdisk = path / "ramdisk"
+            if path.exists():
+                shutil.rmtree(path)
+            split_img.mkdir(parents=True)
+            ramdisk.mkdir()
+            
+            for section, aik_name in AIK_SECTIONS.items():
+                view = self.section(section)
+                if view is not None:
+                    with open(split_img / f"recovery.img-{aik_name}", 'wb') as f:
+                        f.write(view)
+            
+            for field, value in self._aik_fields().items():
+                if value is not None:
+                    with open(split_img / f"recovery.img-{field}", 'w', encoding='utf-8') as f:
+                        f.write(f"{value}\n")
+            
+            root = ramdisk.resolve()
+            for name, data in self.ramdisk_files.items():
+                target = (ramdisk / name).resolve()
+                if root not in target.parents:
+                    continue
+                target.parent.mkdir(parents=True, exist_ok=True)
+                with open(target, 'wb') as f:
+                    f.write(data)
+            
+            self._aik_dir = path
+            return path
+    
+    def close(self):
+        """Unmap the image and remove a temporary work directory."""
+        self.image.close()
+        if self._own_dir and self.work_dir is not None:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+            self.work_dir = None
+        self._aik_dir = None
+    
+    def _aik_fields(self) -> Dict[str, Any]:
+        """Header fields under AIK's split_img file names."""
+        header = self.header
+        header_version = header.get('header_version', 0)
+        compression = self.ramdisk_compression
+        fields = {
+            'board': header.get('board') or None,
+            'cmdline': header.get('cmdline', ''),
+            'header_version': header_version,
+            'pagesize': header.get('page_size'),
+            'origsize': os.path.getsize(self.image_path),
+            'ramdiskcomp': AIK_COMPRESSION_NAMES.get(compression, compression),
+        }
+        # v3+ boot images load at fixed addresses
+        if 'base_address' in header and (header_version < 3 or self.is_vendor_boot):
+            fields['base'] = f"0x{header['base_address']:08x}"
+            fields['ramdisk_offset'] = f"0x{header['ramdisk_offset']:08x}"
+            fields['tags_offset'] = f"0x{header['tags_offset']:08x}"
+        return fields
+    
+    def _read_ramdisk(self) -> Dict[str, bytes]:
+        if self.is_vendor_boot:
+            streams = [ramdisk.open() for ramdisk in self.image.ramdisks]
+        else:
+            streams = [self.image.open_ramdisk()] if self.image.ramdisk is not None else []
+        
+        files: Dict[str, bytes] = {}
+        links: Dict[str, str] = {}
+        for stream in streams:
+            with stream:
+                for entry in CpioReader(stream).iter_entries(EXTRACTION_PATTERNS):
+                    if entry.is_symlink:
+                        links[entry.name] = entry.link_target
+                        files.pop(entry.name, None)
+                    elif entry.is_file:
+                        files[entry.name] = entry.data
+                        links.pop(entry.name, None)
+        
+        for name, target in links.items():
+            if target.startswith('/'):
+                resolved = target.lstrip('/')
+            else:
+                resolved = posixpath.normpath(posixpath.join(posixpath.dirname(name), target))
+            if resolved in files:
+                files[name] = files[resolved]
+        return files
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Kernel Config Store - Columnar kernel config corpus
+
+Keeps the kernel configs of many devices in one compact structure so
+questions like "which devices have CONFIG_EXT4_ENCRYPTION=y" or "how do
+these two kernels differ" are answered without walking per-device dicts.
+
+Symbol names and values are interned once. Each symbol owns a column,
+an array of value ids with one slot per device; queries turn columns
+into device bitsets (Python ints) and combine them with bitwise
+operators.
+"""
+
+import base64
+import json
+import os
+import sys
+from array import array
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+
+STORE_FORMAT_VERSION = 1
+DEFAULT_STORE_PATH = Path.home() / ".cache" / "gui-dtgen" / "kconfig_store.json"
+
+# Value id 0 means the symbol does not appear in the device's config
+UNSET = 0
+
+# Columns hold 32-bit value ids; saved stores are little-endian
+_TYPECODE = 'I' if array('I').itemsize == 4 else 'L'
+
+
+class KernelConfigStore:
+    """Interned, column-per-symbol store of kernel configs across devices."""
+    
+    def __init__(self):
+        self.devices: List[str] = []
+        self._device_index: Dict[str, int] = {}
+        self.symbols: List[str] = []
+        self._symbol_index: Dict[str, int] = {}
+        self.values: List[str] = ['']
+        self._value_index: Dict[str, int] = {'': UNSET}
+        self._columns: List[array] = []
+        self._bitsets: Dict[Tuple[int, int], int] = {}
+    
+    def __len__(self) -> int:
+        return len(self.devices)
+    
+    def __contains__(self, device: str) -> bool:
+        return device in self._device_index
+    
+    def add_device(self, device: str, config: Dict[str, str]) -> int:
+        """
+        Add (or replace) the config of a device.
+        
+        Args:
+            device: Unique device name, e.g. "xiaomi/alioth"
+            config: CONFIG_* -> value dict as returned by KernelAnalyzer
+        
+        Returns:
+            Device id
+        """
+        device_id = self._device_index.get(device)
+        if device_id is None:
+            device_id = len(self.devices)
+            self.devices.append(device)
+            self._device_index[device] = device_id
+            for column in self._columns:
+                column.append(UNSET)
+        else:
+            for column in self._columns:
+                column[device_id] = UNSET
+        
+        for symbol, value in config.items():
+            self._column(symbol)[device_id] = self._intern_value(value)
+        
+        self._bitsets.clear()
+        return device_id
+    
+    def add_result(self, result: Dict[str, Any]) -> Optional[int]:
+        """Add the kernel config from a DeviceTreeProcessor result, if it has one."""
+        device_info = result.get('device_info') or {}
+        config = device_info.get('kernel_config')
+        if not config:
+            return None
+        name = f"{device_info.get('manufacturer', 'Unknown')}/{device_info.get('device', 'Unknown')}"
+        return self.add_device(name, config)
+    
+    def remove_device(self, device: str):
+        """Remove a device, compacting every column."""
+        device_id = self._device_index.pop(device)
+        del self.devices[device_id]
+        for column in self._columns:
+            del column[device_id]
+        self._device_index = {name: index for index, name in enumerate(self.devices)}
+        self._bitsets.clear()
+    
+    def get_value(self, device: str, symbol: str) -> Optional[str]:
+        """Get a device's value for symbol, or None if it is not in its config."""
+        symbol_id = self._symbol_index.get(symbol)
+        if symbol_id is None:
+            return None
+        value_id = self._columns[symbol_id][self._device_index[device]]
+        return self.values[value_id] if value_id != UNSET else None
+    
+    def get_config(self, device: str) -> Dict[str, str]:
+        """Rebuild the full config dict of one device."""
+        device_id = self._device_index[device]
+        values = self.values
+        return {
+            symbol: values[column[device_id]]
+            for symbol, column in zip(self.symbols, self._columns)
+            if column[device_id] != UNSET
+        }
+    
+    def match(self, symbol: str, value: str = 'y') -> int:
+        """
+        Get the bitset of devices whose symbol equals value.
+        
+        Matching 'n' also selects devices where the symbol is absent,
+        as Kconfig treats both the same.
+        """
+        symbol_id = self._symbol_index.get(symbol)
+        value_id = self._value_index.get(value)
+        if symbol_id is None:
+            return self.all_devices() if value == 'n' else 0
+        
+        bits = self._bitset(symbol_id, value_id) if value_id is not None else 0
+        if value == 'n':
+            bits |= self._bitset(symbol_id, UNSET)
+        return bits
+    
+    def all_devices(self) -> int:
+        return (1 << len(self.devices)) - 1
+    
+    def query(self, conditions: Iterable[str], match_any: bool = False) -> List[str]:
+        """
+        Select devices matching conditions.
+        
+        Args:
+            conditions: Expressions "SYMBOL=VALUE", "SYMBOL!=VALUE" or a
+                bare "SYMBOL" (enabled, i.e. not n); the CONFIG_ prefix
+                may be omitted
+            match_any: OR the conditions instead of ANDing them
+        
+        Returns:
+            Matching device names
+        """
+        result = 0 if match_any else self.all_devices()
+        for condition in conditions:
+            bits = self._evaluate(condition)
+            result = result | bits if match_any else result & bits
+        return self.devices_in(result)
+    
+    def devices_in(self, bits: int) -> List[str]:
+        """Decode a device bitset into device names."""
+        devices = []
+        while bits:
+            low = bits & -bits
+            devices.append(self.devices[low.bit_length() - 1])
+            bits ^= low
+        return devices
+    
+    def distribution(self, symbol: str) -> Dict[str, List[str]]:
+        """Group devices by their value of symbol ('n' includes absent)."""
+        symbol = _normalize_symbol(symbol)
+        symbol_id = self._symbol_index.get(symbol)
+        groups: Dict[str, List[str]] = {}
+        for device_id, device in enumerate(self.devices):
+            value_id = self._columns[symbol_id][device_id] if symbol_id is not None else UNSET
+            value = self.values[value_id] if value_id != UNSET else 'n'
+            groups.setdefault(value, []).append(device)
+        return groups
+    
+    def diff(self, device_a: str, device_b: str) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+        """
+        Get the symbols whose value differs between two devices.
+        
+        Absent and 'n' are the same value, as in match(); a symbol
+        absent on one side is reported as None there.
+        """
+        a = self._device_index[device_a]
+        b = self._device_index[device_b]
+        values = self.values
+        n_id = self._value_index.get('n', UNSET)
+        return {
+            symbol: (values[column[a]] if column[a] != UNSET else None,
+                     values[column[b]] if column[b] != UNSET else None)
+            for symbol, column in zip(self.symbols, self._columns)
+            if column[a] != column[b] and {column[a], column[b]} != {UNSET, n_id}
+        }
+    
+    def save(self, path: str = str(DEFAULT_STORE_PATH)):
+        """Write the store atomically as JSON with base64-packed columns."""
+        data = {
+            'version': STORE_FORMAT_VERSION,
+            'devices': self.devices,
+            'symbols': self.symbols,
+            'values': self.values,
+            'columns': [base64.b64encode(_pack(column)).decode('ascii') for column in self._columns],
+        }
+        
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+    
+    @classmethod
+    def load(cls, path: str = str(DEFAULT_STORE_PATH)) -> 'KernelConfigStore':
+        """Load a store written by save(); a missing file gives an empty store."""
+        store = cls()
+        if not Path(path).exists():
+            return store
+        
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != STORE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported kernel config store version: {data.get('version')}")
+        
+        store.devices = data['devices']
+        store._device_index = {name: index for index, name in enumerate(store.devices)}
+        store.symbols = data['symbols']
+        store._symbol_index = {name: index for index, name in enumerate(store.symbols)}
+        store.values = data['values']
+        store._value_index = {value: index for index, value in enumerate(store.values)}
+        for packed in data['columns']:
+            store._columns.append(_unpack(base64.b64decode(packed)))
+        return store
+    
+    def _column(self, symbol: str) -> array:
+        symbol_id = self._symbol_index.get(symbol)
+        if symbol_id is None:
+            symbol_id = len(self.symbols)
+            self.symbols.append(sys.intern(symbol))
+            self._symbol_index[symbol] = symbol_id
+            self._columns.append(array(_TYPECODE, bytes(4 * len(self.devices))))
+        return self._columns[symbol_id]
+    
+    def _intern_value(self, value: str) -> int:
+        value_id = self._value_index.get(value)
+        if value_id is None:
+            value_id = len(self.values)
+            self.values.append(value)
+            self._value_index[value] = value_id
+        return value_id
+    
+    def _bitset(self, symbol_id: int, value_id: int) -> int:
+        """Bitset of devices having value_id in a column, cached until the next change."""
+        key = (symbol_id, value_id)
+        bits = self._bitsets.get(key)
+        if bits is None:
+            bits = 0
+            for device_id, current in enumerate(self._columns[symbol_id]):
+                if current == value_id:
+                    bits |= 1 << device_id
+            self._bitsets[key] = bits
+        return bits
+    
+    def _evaluate(self, condition: str) -> int:
+        condition = condition.strip()
+        if '!=' in condition:
+            symbol, value = condition.split('!=', 1)
+            return self.all_devices() & ~self.match(_normalize_symbol(symbol), value.strip())
+        if '=' in condition:
+            symbol, value = condition.split('=', 1)
+            return self.match(_normalize_symbol(symbol), value.strip())
+        return self.all_devices() & ~self.match(_normalize_symbol(condition), 'n')
+
+
+def record_results(results: Iterable[Dict[str, Any]], path: str = str(DEFAULT_STORE_PATH)) -> int:
+    """
+    Add the kernel configs of successful DeviceTreeProcessor results to the store at path.
+    
+    Returns:
+        Number of devices added or updated
+    """
+    store = KernelConfigStore.load(path)
+    added = 0
+    for result in results:
+        if result.get('success') and store.add_result(result) is not None:
+            added += 1
+    if added:
+        store.save(path)
+    return added
+
+
+def _normalize_symbol(symbol: str) -> str:
+    symbol = symbol.strip()
+    return symbol if symbol.startswith('CONFIG_') else 'CONFIG_' + symbol
+
+
+def _pack(column: array) -> bytes:
+    if sys.byteorder == 'big':
+        column = array(_TYPECODE, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+def _unpack(data: bytes) -> array:
+    column = array(_TYPECODE)
+    column.frombytes(data)
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return column
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Kernel Analyzer - Kernel version and IKCONFIG extraction
+
+Finds the "Linux version" banner and the embedded kernel configuration
+(CONFIG_IKCONFIG, stored gzip-compressed between the IKCFG_ST and
+IKCFG_ED markers) in a kernel image.
+
+Uncompressed kernels are searched in place with mmap.find(). Compressed
+kernels (Image.gz, Image.lz4, ...) are decompressed as a stream and
+decoding stops as soon as both the banner and the config were seen, so
+the kernel is never held in memory or decompressed past what is needed.
+"""
+
+import mmap
+import re
+import struct
+import zlib
+from typing import Dict, Any, Optional, Tuple
+
+from .extractors import BootImage
+from .extractors.decompress import detect_compression, open_decompressed
+
+
+IKCONFIG_START = b'IKCFG_ST'
+IKCONFIG_END = b'IKCFG_ED'
+BANNER_PREFIX = b'Linux version '
+MAX_BANNER_SIZE = 1024
+
+SCAN_CHUNK_SIZE = 1024 * 1024
+
+# Compressed payloads embedded in self-decompressing images (zImage)
+EMBEDDED_MAGICS = [
+    b'\x1f\x8b\x08',
+    b'\x02\x21\x4c\x18',
+    b'\xfd7zXZ\x00',
+]
+MAX_EMBEDDED_CANDIDATES = 8
+
+_BANNER_RE = re.compile(re.escape(BANNER_PREFIX) + rb'\d')
+
+
+def parse_kernel_config(text: str) -> Dict[str, str]:
+    """
+    Parse a .config file into a symbol -> value dict.
+    
+    Symbols keep their CONFIG_ prefix. "# CONFIG_FOO is not set" lines
+    are recorded as 'n'; string values keep their quotes.
+    """
+    config = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith('CONFIG_'):
+            name, _, value = line.partition('=')
+            config[name] = value
+        elif line.startswith('# CONFIG_') and line.endswith(' is not set'):
+            config[line[2:-len(' is not set')]] = 'n'
+    return config
+
+
+def parse_banner(banner: str) -> Dict[str, Optional[str]]:
+    """Split a kernel banner into version, build host and compiler."""
+    info = {'version': None, 'build_host': None, 'compiler': None}
+    rest = banner[len('Linux version '):]
+    version, _, rest = rest.partition(' ')
+    info['version'] = version
+    
+    groups = []
+    depth = 0
+    current = ''
+    for char in rest:
+        if char == '(':
+            if depth:
+                current += char
+            depth += 1
+        elif char == ')' and depth:
+            depth -= 1
+            if depth:
+                current += char
+            else:
+                groups.append(current)
+                current = ''
+                if len(groups) == 2:
+                    break
+        elif depth:
+            current += char
+        elif char == '#':
+            break
+    
+    if groups:
+        info['build_host'] = groups[0]
+    if len(groups) > 1:
+        info['compiler'] = groups[1]
+    return info
+
+
+def detect_architecture(head) -> Optional[str]:
+    """Identify the architecture from the first bytes of an uncompressed kernel."""
+    head = bytes(head[:0x210])
+    if head[0x38:0x3C] == b'ARM\x64':
+        return 'arm64'
+    if len(head) >= 0x28 and struct.unpack_from('<I', head, 0x24)[0] == 0x016F2818:
+        return 'arm'
+    if head[0x202:0x206] == b'HdrS':
+        return 'x86'
+    return None
+
+
+def _find(buffer, sub: bytes, start: int, end: int) -> int:
+    """Search a buffer in place; mmap and bytes use their own find()."""
+    find = getattr(buffer, 'find', None)
+    if find is not None:
+        return find(sub, start, end)
+    match = re.compile(re.escape(sub)).search(buffer, start, end)
+    return match.start() if match else -1
+
+
+def _decode_config(blob) -> Dict[str, str]:
+    """Decompress the gzip payload between the IKCONFIG markers."""
+    text = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(blob)
+    return parse_kernel_config(text.decode('utf-8', errors='replace'))
+
+
+def _decode_banner(raw) -> str:
+    raw = bytes(raw).split(b'\x00', 1)[0].split(b'\n', 1)[0]
+    return raw.decode('utf-8', errors='replace').strip()
+
+
+class _StreamScanner:
+    """Finds the banner and the IKCONFIG payload in a forward-only stream."""
+    
+    OVERLAP = max(len(IKCONFIG_START), len(BANNER_PREFIX) + 1)
+    
+    def __init__(self):
+        self.head = b''
+        self.banner: Optional[str] = None
+        self.config_blob: Optional[bytes] = None
+        self._window = bytearray()
+        self._banner_start = -1
+        self._config_start = -1
+        self._config_search = 0
+    
+    @property
+    def done(self) -> bool:
+        return self.banner is not None and self.config_blob is not None
+    
+    def feed(self, chunk: bytes):
+        if len(self.head) < 0x210:
+            self.head += chunk[:0x210 - len(self.head)]
+        
+        window = self._window
+        window += chunk
+        
+        if self.banner is None:
+            if self._banner_start < 0:
+                match = _BANNER_RE.search(window)
+                if match:
+                    self._banner_start = match.start()
+            if self._banner_start >= 0:
+                end = self._banner_start + MAX_BANNER_SIZE
+                if window.find(b'\x00', self._banner_start, end) >= 0 or len(window) >= end:
+                    self.banner = _decode_banner(window[self._banner_start:end])
+                    self._banner_start = -1
+        
+        while self.config_blob is None:
+            if self._config_start < 0:
+                found = window.find(IKCONFIG_START, self._config_search)
+                if found < 0:
+                    break
+                self._config_start = found + len(IKCONFIG_START)
+            end = window.find(IKCONFIG_END, self._config_start)
+            if end < 0:
+                break
+            if window[self._config_start:self._config_start + 2] == b'\x1f\x8b':
+                self.config_blob = bytes(window[self._config_start:end])
+            else:
+                # A stray marker string, not the config payload
+                self._config_search = self._config_start
+            self._config_start = -1
+        
+        self._trim()
+    
+    def _trim(self):
+        """Drop scanned data, keeping a pending banner/config and a marker-sized overlap."""
+        keep_from = len(self._window) - self.OVERLAP
+        if self._config_start >= 0:
+            keep_from = min(keep_from, self._config_start - len(IKCONFIG_START))
+        if self._banner_start >= 0:
+            keep_from = min(keep_from, self._banner_start)
+        if keep_from <= 0:
+            return
+        
+        del self._window[:keep_from]
+        self._config_search = max(self._config_search - keep_from, 0)
+        if self._config_start >= 0:
+            self._config_start -= keep_from
+        if self._banner_start >= 0:
+            self._banner_start -= keep_from
+
+
+class KernelAnalyzer:
+    """Extracts the version banner and embedded config from kernel images."""
+    
+    def analyze(self, buffer, start: int = 0, end: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Analyze the kernel stored in buffer[start:end].
+        
+        Args:
+            buffer: mmap, bytes or memoryview holding the kernel (e.g. a
+                mapped boot image)
+            start: Offset of the kernel within buffer
+            end: End of the kernel; defaults to the end of buffer
+        
+        Returns:
+            Dict with version, banner, compiler, architecture,
+            compression and the parsed config ({} without IKCONFIG)
+        """
+        if end is None:
+            end = len(buffer)
+        
+        try:
+            compression = detect_compression(buffer[start:start + 8])
+            if compression in (None, 'none'):
+                banner, blob, head = self._scan_raw(buffer, start, end)
+                compression = None
+                if banner is None and blob is None:
+                    result = self._scan_embedded(buffer, start, end)
+                    if result is not None:
+                        compression, banner, blob, head = result
+            else:
+                banner, blob, head = self._scan_stream(buffer, start, end, compression)
+            
+            config = _decode_config(blob) if blob is not None else {}
+            info = {
+                'success': True,
+                'banner': banner,
+                'compression': compression,
+                'architecture': detect_architecture(head),
+                'has_config': blob is not None,
+                'config': config,
+            }
+            info.update(parse_banner(banner) if banner else {'version': None, 'build_host': None, 'compiler': None})
+            return info
+        
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    def analyze_file(self, kernel_path: str) -> Dict[str, Any]:
+        """Analyze a standalone kernel file (Image, Image.gz, zImage, ...)."""
+        with open(kernel_path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return self.analyze(mm)
+    
+    def analyze_image(self, image_path: str) -> Dict[str, Any]:
+        """Analyze the kernel section of a boot image, in place."""
+        try:
+            with BootImage.open(image_path) as image:
+                kernel = image.section_range('kernel')
+                if kernel is None:
+                    return {
+                        'success': False,
+                        'error': 'Boot image has no kernel'
+                    }
+                offset, size = kernel
+                return self.analyze(image.buffer, offset, offset + size)
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    def _scan_raw(self, buffer, start: int, end: int) -> Tuple[Optional[str], Optional[bytes], bytes]:
+        """Search an uncompressed kernel without copying it."""
+        banner = None
+        position = _find(buffer, BANNER_PREFIX, start, end)
+        while position >= 0:
+            digit_at = position + len(BANNER_PREFIX)
+            if bytes(buffer[digit_at:digit_at + 1]).isdigit():
+                banner = _decode_banner(buffer[position:min(position + MAX_BANNER_SIZE, end)])
+                break
+            position = _find(buffer, BANNER_PREFIX, digit_at, end)
+        
+        blob = None
+        position = _find(buffer, IKCONFIG_START, start, end)
+        while position >= 0:
+            payload = position + len(IKCONFIG_START)
+            marker_end = _find(buffer, IKCONFIG_END, payload, end)
+            if marker_end < 0:
+                break
+            if bytes(buffer[payload:payload + 2]) == b'\x1f\x8b':
+                blob = bytes(buffer[payload:marker_end])
+                break
+            position = _find(buffer, IKCONFIG_START, payload, end)
+        
+        return banner, blob, bytes(buffer[start:start + 0x210])
+    
+    def _scan_stream(self, buffer, start: int, end: int,
+                     compression: Optional[str]) -> Tuple[Optional[str], Optional[bytes], bytes]:
+        """Decompress just far enough to see the banner and the config."""
+        scanner = _StreamScanner()
+        with memoryview(buffer) as view:
+            with view[start:end] as kernel:
+                stream = open_decompressed(kernel, compression, chunk_size=SCAN_CHUNK_SIZE)
+                try:
+                    while not scanner.done:
+                        try:
+                            chunk = stream.read(SCAN_CHUNK_SIZE)
+                        except (EOFError, ValueError, zlib.error):
+                            # Trailing data (appended DTBs) or a truncated stream
+                            break
+                        if not chunk:
+                            break
+                        scanner.feed(chunk)
+                finally:
+                    stream.close()
+                    del stream
+        return scanner.banner, scanner.config_blob, scanner.head
+    
+    def _scan_embedded(self, buffer, start: int, end: int):
+        """Find and scan the compressed payload of a self-decompressing kernel."""
+        candidates = []
+        for magic in EMBEDDED_MAGICS:
+            position = _find(buffer, magic, start, end)
+            count = 0
+            while position >= 0 and count < MAX_EMBEDDED_CANDIDATES:
+                candidates.append(position)
+                position = _find(buffer, magic, position + 1, end)
+                count += 1
+        
+        for position in sorted(candidates):
+            compression = detect_compression(buffer[position:position + 8])
+            if compression is None:
+                continue
+            banner, blob, head = self._scan_stream(buffer, position, end, compression)
+            if banner is not None or blob is not None:
+                # Architecture comes from the outer image header
+                return compression, banner, blob, bytes(buffer[start:start + 0x210])
+        return None
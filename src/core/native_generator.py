@@ -0,0 +1,577 @@
+#!/usr/bin/env python3
+"""
+Native Generator - Device trees straight from the parsed image
+
+twrpdtgen clones AIK, unpacks the image with its shell scripts and cpio,
+reads the extracted files back from disk and renders Jinja2 templates.
+Everything it looks at is already available in-process: the boot image
+header, the ramdisk files streamed out of the cpio archive, and the
+props inside them. The native generator collects those in one pass over
+the mapped image and renders the same files twrpdtgen does
+(BoardConfig.mk, device.mk, Android.mk, AndroidProducts.mk,
+omni_<codename>.mk, vendorsetup.sh, recovery.fstab, the prebuilts and
+the recovery init scripts) without subprocesses or a template engine.
+
+The image is read through an ImageExtraction, normally the one the
+processor shares between all consumers of a job. Facts the processor
+has already gathered (DT board info, AVB partition sizes, the kernel
+architecture, the super.img layout) can be passed in and fill the
+gaps the ramdisk leaves, and so can files read from the vendor
+partition (build.prop, fstab). The processor writes the rendered files.
+"""
+
+import posixpath
+from typing import Dict, Any, List, Optional, Tuple
+
+from .image_extraction import ImageExtraction
+
+# Bump whenever collect() gathers different facts from the same image
+COLLECT_VERSION = 2
+
+# Prop files in the order twrpdtgen (AIK) looks for them
+PROP_FILES = [
+    'prop.default',
+    'default.prop',
+    'vendor/build.prop',
+    'system/build.prop',
+    'system/etc/prop.default',
+    'system/etc/build.prop',
+]
+
+TWRP_FSTAB = 'etc/twrp.fstab'
+FSTAB_FILES = [
+    'etc/recovery.fstab',
+    'system/etc/recovery.fstab',
+    'vendor/etc/recovery.fstab',
+]
+
+# Directories whose init scripts are copied to recovery/root
+INIT_RC_DIRS = ('', 'system/etc/init', 'vendor/etc/init')
+
+PARTITIONS = ['odm', 'product', 'system', 'system_ext', 'vendor']
+
+DEVICE_CODENAME = ['ro.product.device'] + [f'ro.product.{p}.device' for p in PARTITIONS]
+DEVICE_MANUFACTURER = ['ro.product.manufacturer'] + [f'ro.product.{p}.manufacturer' for p in PARTITIONS]
+DEVICE_BRAND = ['ro.product.brand'] + [f'ro.product.{p}.brand' for p in PARTITIONS]
+DEVICE_MODEL = ['ro.product.model'] + [f'ro.product.{p}.model' for p in PARTITIONS]
+DEVICE_ARCH = ['ro.product.cpu.abi', 'ro.product.cpu.abilist']
+DEVICE_IS_AB = ['ro.build.ab_update']
+DEVICE_PLATFORM = ['ro.board.platform', 'ro.hardware.keystore', 'ro.hardware.chipname']
+DEVICE_PIXEL_FORMAT = ['ro.minui.pixel_format']
+
+KERNEL_NAMES = {
+    'arm': 'zImage',
+    'arm64': 'Image.gz',
+    'x86': 'bzImage',
+    'x86_64': 'bzImage',
+}
+
+# arm64 kernel name by the compression found in the image
+ARM64_KERNEL_NAMES = {
+    None: 'Image',
+    'none': 'Image',
+    'gzip': 'Image.gz',
+    'lz4': 'Image.lz4',
+    'lz4_legacy': 'Image.lz4',
+}
+
+LICENSE_HEADER = """#
+# Copyright (C) 2020 The Android Open Source Project
+# Copyright (C) 2020 The TWRP Open Source Project
+#
+# SPDX-License-Identifier: Apache-2.0
+#
+"""
+
+ARCH_VARIABLES = {
+    'arm64': """TARGET_ARCH := arm64
+TARGET_ARCH_VARIANT := armv8-a
+TARGET_CPU_ABI := arm64-v8a
+TARGET_CPU_ABI2 :=
+TARGET_CPU_VARIANT := generic
+
+TARGET_2ND_ARCH := arm
+TARGET_2ND_ARCH_VARIANT := armv7-a-neon
+TARGET_2ND_CPU_ABI := armeabi-v7a
+TARGET_2ND_CPU_ABI2 := armeabi
+TARGET_2ND_CPU_VARIANT := generic
+TARGET_BOARD_SUFFIX := _64
+TARGET_USES_64_BIT_BINDER := true
+""",
+    'arm': """TARGET_ARCH := arm
+TARGET_ARCH_VARIANT := armv7-a-neon
+TARGET_CPU_ABI := armeabi-v7a
+TARGET_CPU_ABI2 := armeabi
+TARGET_CPU_VARIANT := generic
+""",
+    'x86': """TARGET_ARCH := x86
+TARGET_ARCH_VARIANT := generic
+TARGET_CPU_ABI := x86
+TARGET_CPU_ABI2 := armeabi-v7a
+TARGET_CPU_ABI_LIST := x86,armeabi-v7a,armeabi
+TARGET_CPU_ABI_LIST_32_BIT := x86,armeabi-v7a,armeabi
+TARGET_CPU_VARIANT := generic
+""",
+    'x86_64': """TARGET_ARCH := x86_64
+TARGET_ARCH_VARIANT := x86_64
+TARGET_CPU_ABI := x86_64
+TARGET_CPU_ABI2 :=
+TARGET_CPU_VARIANT := generic
+
+TARGET_2ND_ARCH := x86
+TARGET_2ND_ARCH_VARIANT := x86
+TARGET_2ND_CPU_ABI := x86
+TARGET_2ND_CPU_VARIANT := generic
+TARGET_BOARD_SUFFIX := _64
+TARGET_USES_64_BIT_BINDER := true
+""",
+}
+
+# TWRP fstab layout, see twrpdtgen's utils/fstab.py
+FSTAB_COLUMNS = (20, 10, 70)
+BOOTLOADER_PARTITIONS = ['boot', 'vendor_boot', 'recovery', 'dtbo', 'misc']
+SYSTEM_PARTITIONS = ['system', 'system_ext', 'vendor', 'product', 'odm']
+BACKUP_PARTITIONS = BOOTLOADER_PARTITIONS + SYSTEM_PARTITIONS
+IMAGE_ENTRY_PARTITIONS = SYSTEM_PARTITIONS + ['cust', 'persist']
+TWRP_FSTYPES = ('auto', 'emmc', 'ext4', 'f2fs', 'vfat', 'squashfs')
+ALTERNATIVE_MOUNT_POINTS = {
+    '/': '/system',
+    '/system_root': '/system',
+    '/sdcard': '/sdcard1',
+}
+
+
+def parse_props(text: str) -> Dict[str, str]:
+    """Parse a build.prop style file into a dict."""
+    props = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#') or '=' not in line:
+            continue
+        name, value = line.split('=', 1)
+        props[name.strip()] = value.strip()
+    return props
+
+
+def parse_arch(abi: str) -> str:
+    """Map ro.product.cpu.abi(list) to a TWRP architecture name."""
+    if abi.startswith('arm64'):
+        return 'arm64'
+    if abi.startswith('armeabi'):
+        return 'arm'
+    if abi.startswith('x86_64'):
+        return 'x86_64'
+    if abi.startswith('x86'):
+        return 'x86'
+    if abi.startswith('mips'):
+        return 'mips'
+    return 'unknown'
+
+
+def _first_prop(props: Dict[str, str], names: List[str]) -> Optional[str]:
+    for name in names:
+        value = props.get(name)
+        if value:
+            return value
+    return None
+
+
+def _fstab_line(mount_point: str, fstype: str, device: str, flags: List[str]) -> str:
+    mount_width, fstype_width, device_width = FSTAB_COLUMNS
+    return (f"{mount_point.ljust(mount_width)}{fstype.ljust(fstype_width)}"
+            f"{device.ljust(device_width)}flags={''.join(flag + ';' for flag in flags)}\n")
+
+
+def _twrp_fstab_entries(mount_point: str, fstype: str, device: str) -> List[str]:
+    """TWRP fstab line(s) for one partition, the raw image entry included."""
+    mount_point = ALTERNATIVE_MOUNT_POINTS.get(mount_point, mount_point)
+    if mount_point.count('/') > 1:
+        mount_point = f"/{mount_point.rsplit('/', 1)[1]}"
+    
+    name = mount_point[1:] if mount_point.startswith('/') else mount_point
+    is_image = name.endswith('_image') or name in BOOTLOADER_PARTITIONS
+    displayed_name = name.capitalize()
+    if is_image and name not in BOOTLOADER_PARTITIONS:
+        displayed_name = displayed_name.replace('_image', ' image')
+    
+    flags = [f'display="{displayed_name}"']
+    if is_image:
+        flags += ['backup=1', 'flashimg=1']
+    elif name in BACKUP_PARTITIONS:
+        flags.append('backup=1')
+    if not device.startswith('/'):
+        flags.append('logical')
+    
+    lines = [_fstab_line(mount_point, fstype, device, flags)]
+    if name in IMAGE_ENTRY_PARTITIONS:
+        lines += _twrp_fstab_entries(f"{mount_point}_image", 'emmc', device)
+    return lines
+
+
+def make_twrp_fstab(text: str) -> str:
+    """Convert an AOSP or TWRP syntax fstab to a TWRP recovery.fstab."""
+    lines = ["# mount point       fstype    device                                                                flags\n"]
+    for line in text.splitlines():
+        fields = line.split()
+        if line.startswith('#') or len(fields) < 3:
+            continue
+        if fields[1] in TWRP_FSTYPES:
+            mount_point, fstype, device = fields[0], fields[1], fields[2]
+        else:
+            device, mount_point, fstype = fields[0], fields[1], fields[2]
+        lines += _twrp_fstab_entries(mount_point, fstype, device)
+    return ''.join(lines)
+
+
+def _dt_fstab_text(dt_fstab: List[Dict[str, Any]]) -> str:
+    """AOSP syntax fstab from the early-mount entries of the device tree."""
+    return ''.join(
+        f"{entry['dev']} {entry['mnt_point']} {entry['type']}\n"
+        for entry in dt_fstab
+        if entry.get('dev') and entry.get('type')
+    )
+
+
+class NativeTreeGenerator:
+    """
+    Generates TWRP device trees without twrpdtgen: collect() gathers
+    the facts, render() turns them into file contents.
+    
+    The generator is stateless; one instance can serve any number of
+    jobs, from any number of threads.
+    """
+    
+    def collect(self, extraction: ImageExtraction,
+                image_info: Optional[Dict[str, Any]] = None,
+                partition_files: Optional[Dict[str, bytes]] = None) -> Dict[str, Any]:
+        """
+        Gather everything the tree is rendered from, in one pass over the extraction.
+        
+        Args:
+            extraction: The image to read
+            image_info: Facts the processor has already gathered
+            partition_files: Files from the device's partitions, by path
+                as on the device (e.g. 'vendor/build.prop'); the ramdisk's
+                own files take precedence
+        
+        Raises:
+            ValueError: The ramdisk has no usable props or fstab
+        """
+        image_info = image_info or {}
+        partition_files = partition_files or {}
+        header = extraction.header
+        ramdisk_files = extraction.ramdisk_files
+        kernel_compression = extraction.kernel_compression
+        prebuilts = {}
+        for section, name in (('kernel', 'kernel'), ('dt', 'dt.img'), ('dtb', 'dtb.img'),
+                              ('recovery_dtbo', 'dtbo.img')):
+            view = extraction.section(section)
+            if view is not None:
+                prebuilts[name] = bytes(view)
+        
+        props = {}
+        for name in reversed(PROP_FILES):
+            data = ramdisk_files.get(name, partition_files.get(name))
+            if data is not None:
+                props.update(parse_props(data.decode('utf-8', errors='replace')))
+        if not props:
+            raise ValueError("Couldn't find any build.prop in the ramdisk")
+        
+        warnings = []
+        codename = _first_prop(props, DEVICE_CODENAME)
+        if codename is None:
+            raise ValueError("Device codename could not be found in build.prop")
+        manufacturer = _first_prop(props, DEVICE_MANUFACTURER)
+        if manufacturer is None:
+            raise ValueError("Device manufacturer could not be found in build.prop")
+        manufacturer = manufacturer.split()[0].lower()
+        
+        abi = _first_prop(props, DEVICE_ARCH)
+        arch = parse_arch(abi) if abi else image_info.get('architecture') or 'unknown'
+        if arch == 'unknown':
+            warnings.append("CPU architecture could not be determined")
+        
+        platform = _first_prop(props, DEVICE_PLATFORM) or image_info.get('platform')
+        if platform is None:
+            warnings.append('Platform prop not found! Defaulting to "default"')
+            platform = 'default'
+        
+        kernel_name = KERNEL_NAMES.get(arch, 'zImage')
+        if arch == 'arm64':
+            kernel_name = ARM64_KERNEL_NAMES.get(kernel_compression, kernel_name)
+        if arch in ('arm', 'arm64') and 'dt.img' not in prebuilts and 'dtb.img' not in prebuilts:
+            kernel_name += '-dtb'
+        if 'kernel' in prebuilts:
+            prebuilts[kernel_name] = prebuilts.pop('kernel')
+        
+        fstab, fstab_source = self._recovery_fstab(ramdisk_files, image_info, partition_files)
+        if fstab is None:
+            raise ValueError("fstab not found")
+        
+        init_rcs = {
+            posixpath.basename(name): data
+            for name, data in sorted(ramdisk_files.items())
+            if name.endswith('.rc') and posixpath.basename(name) != 'init.rc'
+            and posixpath.dirname(name) in INIT_RC_DIRS
+        }
+        
+        return {
+            'codename': codename,
+            'manufacturer': manufacturer,
+            'brand': _first_prop(props, DEVICE_BRAND) or manufacturer,
+            'model': _first_prop(props, DEVICE_MODEL) or image_info.get('model') or codename,
+            'arch': arch,
+            'platform': platform,
+            'is_ab': props.get('ro.build.ab_update', '').lower() in ('1', 'true', 'yes', 'on'),
+            'pixel_format': _first_prop(props, DEVICE_PIXEL_FORMAT),
+            'header': dict(header),
+            'board_name': header.get('board') or None,
+            'cmdline': header.get('cmdline', ''),
+            'kernel_name': kernel_name,
+            'ramdisk_compression': extraction.ramdisk_compression,
+            'fstab': fstab,
+            'fstab_source': fstab_source,
+            'init_rcs': init_rcs,
+            'prebuilts': prebuilts,
+            'board_partition_sizes': image_info.get('board_partition_sizes') or {},
+            'board_super_variables': image_info.get('board_super_variables') or {},
+            'warnings': warnings,
+        }
+    
+    def render(self, device: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Render every file of the tree.
+        
+        Returns:
+            Path relative to the device directory -> str or bytes content
+        """
+        codename = device['codename']
+        files: Dict[str, Any] = {
+            'Android.mk': self._android_mk(device),
+            'AndroidProducts.mk': (f"{LICENSE_HEADER}\nPRODUCT_MAKEFILES := \\\n"
+                                   f"     $(LOCAL_DIR)/omni_{codename}.mk\n"),
+            'BoardConfig.mk': self._board_config(device),
+            'device.mk': self._device_mk(device),
+            f'omni_{codename}.mk': self._omni_mk(device),
+            'vendorsetup.sh': (f"{LICENSE_HEADER}\nadd_lunch_combo omni_{codename}-userdebug\n"
+                               f"add_lunch_combo omni_{codename}-eng\n"),
+            'recovery.fstab': device['fstab'],
+        }
+        for name, data in device['prebuilts'].items():
+            files[f'prebuilt/{name}'] = data
+        for name, data in device['init_rcs'].items():
+            files[f'recovery/root/{name}'] = data
+        return files
+    
+    @staticmethod
+    def _recovery_fstab(ramdisk_files: Dict[str, bytes], image_info: Dict[str, Any],
+                        partition_files: Dict[str, bytes]) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Pick and convert the fstab the way twrpdtgen does.
+        
+        A TWRP fstab is used as is; otherwise the first recovery.fstab
+        is converted. Failing both, the first-stage fstab in the
+        ramdisk, the vendor partition's fstab, then the device tree's
+        early-mount entries are used.
+        
+        Returns:
+            (fstab text, source) or (None, None)
+        """
+        if TWRP_FSTAB in ramdisk_files:
+            return ramdisk_files[TWRP_FSTAB].decode('utf-8', errors='replace'), TWRP_FSTAB
+        
+        for name in FSTAB_FILES:
+            if name in ramdisk_files:
+                return make_twrp_fstab(ramdisk_files[name].decode('utf-8', errors='replace')), name
+        
+        for files in (ramdisk_files, partition_files):
+            for name in sorted(files):
+                if posixpath.basename(name).startswith('fstab.'):
+                    return make_twrp_fstab(files[name].decode('utf-8', errors='replace')), name
+        
+        dt_fstab = _dt_fstab_text(image_info.get('dt_fstab') or [])
+        if dt_fstab:
+            return make_twrp_fstab(dt_fstab), 'device tree'
+        return None, None
+    
+    @staticmethod
+    def _android_mk(device: Dict[str, Any]) -> str:
+        return (f"{LICENSE_HEADER}\n"
+                f"LOCAL_PATH := $(call my-dir)\n\n"
+                f"ifeq ($(TARGET_DEVICE), {device['codename']})\n"
+                f"include $(call all-subdir-makefiles,$(LOCAL_PATH))\n"
+                f"endif\n")
+    
+    @staticmethod
+    def _board_config(device: Dict[str, Any]) -> str:
+        """BoardConfig.mk, with the variables twrpdtgen fills from AIK taken from the header."""
+        header = device['header']
+        codename = device['codename']
+        manufacturer = device['manufacturer']
+        arch = device['arch']
+        prebuilts = device['prebuilts']
+        header_version = header.get('header_version', 0)
+        page_size = header.get('page_size')
+        # v3+ boot images have fixed load addresses, there is nothing to pass
+        has_offsets = 'base_address' in header and header_version < 3
+        dtb_offset = header.get('dtb_offset') if 'dtb.img' in prebuilts else None
+        
+        lines = [LICENSE_HEADER, f"DEVICE_PATH := device/{manufacturer}/{codename}", "",
+                 "# For building with minimal manifest", "ALLOW_MISSING_DEPENDENCIES := true", "",
+                 "# Architecture"]
+        if arch in ARCH_VARIABLES:
+            lines.append(ARCH_VARIABLES[arch])
+        else:
+            lines.append("")
+        
+        lines += ["# Assert", f"TARGET_OTA_ASSERT_DEVICE := {codename}", ""]
+        if device['board_name']:
+            lines += ["# Bootloader", f"TARGET_BOOTLOADER_BOARD_NAME := {device['board_name']}", ""]
+        
+        lines.append("# File systems")
+        lines.append("BOARD_HAS_LARGE_FILESYSTEM := true")
+        # Known from the AVB footer, unlike twrpdtgen's unpacked size
+        for variable, size in sorted(device['board_partition_sizes'].items()):
+            lines.append(f"{variable} := {size}")
+        lines += ["BOARD_SYSTEMIMAGE_PARTITION_TYPE := ext4",
+                  "BOARD_USERDATAIMAGE_FILE_SYSTEM_TYPE := ext4",
+                  "BOARD_VENDORIMAGE_FILE_SYSTEM_TYPE := ext4",
+                  "TARGET_USERIMAGES_USE_EXT4 := true",
+                  "TARGET_USERIMAGES_USE_F2FS := true",
+                  "TARGET_COPY_OUT_VENDOR := vendor", ""]
+        
+        if device['board_super_variables']:
+            lines.append("# Dynamic partitions")
+            for variable, value in device['board_super_variables'].items():
+                lines.append(f"{variable} := {value}")
+            lines.append("")
+        
+        if device['is_ab']:
+            lines += ["# A/B", "AB_OTA_UPDATER := true", "TW_INCLUDE_REPACKTOOLS := true", ""]
+        
+        kernel_name = device['kernel_name']
+        lines += ["# Kernel", f"BOARD_KERNEL_CMDLINE := {device['cmdline']}"]
+        if kernel_name in prebuilts:
+            lines.append(f"TARGET_PREBUILT_KERNEL := $(DEVICE_PATH)/prebuilt/{kernel_name}")
+        if 'dt.img' in prebuilts:
+            lines.append("TARGET_PREBUILT_DT := $(DEVICE_PATH)/prebuilt/dt.img")
+        if 'dtb.img' in prebuilts:
+            lines.append("TARGET_PREBUILT_DTB := $(DEVICE_PATH)/prebuilt/dtb.img")
+        if 'dtbo.img' in prebuilts:
+            lines.append("BOARD_PREBUILT_DTBOIMAGE := $(DEVICE_PATH)/prebuilt/dtbo.img")
+            lines.append("BOARD_INCLUDE_RECOVERY_DTBO := true")
+        if header_version:
+            lines.append(f"BOARD_BOOTIMG_HEADER_VERSION := {header_version}")
+        if has_offsets:
+            lines.append(f"BOARD_KERNEL_BASE := 0x{header['base_address']:08x}")
+        if page_size:
+            lines.append(f"BOARD_KERNEL_PAGESIZE := {page_size}")
+        if has_offsets:
+            lines.append(f"BOARD_RAMDISK_OFFSET := 0x{header['ramdisk_offset']:08x}")
+            lines.append(f"BOARD_KERNEL_TAGS_OFFSET := 0x{header['tags_offset']:08x}")
+            if dtb_offset:
+                lines.append(f"BOARD_DTB_OFFSET := 0x{dtb_offset:08x}")
+        if page_size:
+            lines.append(f"BOARD_FLASH_BLOCK_SIZE := {page_size * 64} # (BOARD_KERNEL_PAGESIZE * 64)")
+        if has_offsets:
+            lines.append("BOARD_MKBOOTIMG_ARGS += --ramdisk_offset $(BOARD_RAMDISK_OFFSET)")
+            lines.append("BOARD_MKBOOTIMG_ARGS += --tags_offset $(BOARD_KERNEL_TAGS_OFFSET)")
+            if dtb_offset:
+                lines.append("BOARD_MKBOOTIMG_ARGS += --dtb_offset $(BOARD_DTB_OFFSET)")
+        if 'dt.img' in prebuilts:
+            lines.append("BOARD_MKBOOTIMG_ARGS += --dt $(TARGET_PREBUILT_DT)")
+        if 'dtb.img' in prebuilts:
+            lines.append("BOARD_MKBOOTIMG_ARGS += --dtb $(TARGET_PREBUILT_DTB)")
+        if header_version:
+            lines.append("BOARD_MKBOOTIMG_ARGS += --header_version $(BOARD_BOOTIMG_HEADER_VERSION)")
+        lines += [f"BOARD_KERNEL_IMAGE_NAME := {kernel_name}",
+                  f"TARGET_KERNEL_ARCH := {arch}",
+                  f"TARGET_KERNEL_HEADER_ARCH := {arch}",
+                  f"TARGET_KERNEL_SOURCE := kernel/{manufacturer}/{codename}",
+                  f"TARGET_KERNEL_CONFIG := {codename}_defconfig", ""]
+        
+        if device['ramdisk_compression'] == 'lzma':
+            lines += ["# Ramdisk compression", "LZMA_RAMDISK_TARGETS := recovery", ""]
+        
+        lines += ["# Platform", f"TARGET_BOARD_PLATFORM := {device['platform']}", ""]
+        
+        if device['pixel_format']:
+            lines += ["# Recovery", f"TARGET_RECOVERY_PIXEL_FORMAT := {device['pixel_format']}", ""]
+        
+        lines += ["# Hack: prevent anti rollback",
+                  "PLATFORM_SECURITY_PATCH := 2099-12-31",
+                  "VENDOR_SECURITY_PATCH := 2099-12-31",
+                  "PLATFORM_VERSION := 16.1.0", "",
+                  "# TWRP Configuration",
+                  "TW_THEME := portrait_hdpi",
+                  "TW_EXTRA_LANGUAGES := true",
+                  "TW_SCREEN_BLANK_ON_BOOT := true",
+                  'TW_INPUT_BLACKLIST := "hbtp_vm"',
+                  "TW_USE_TOOLBOX := true", ""]
+        return '\n'.join(lines)
+    
+    @staticmethod
+    def _device_mk(device: Dict[str, Any]) -> str:
+        text = (f"{LICENSE_HEADER}\n"
+                f"LOCAL_PATH := device/{device['manufacturer']}/{device['codename']}\n")
+        if not device['is_ab']:
+            return text
+        platform = device['platform']
+        return text + f"""
+# A/B
+AB_OTA_PARTITIONS += \\
+    boot \\
+    system \\
+    vendor
+
+AB_OTA_POSTINSTALL_CONFIG += \\
+    RUN_POSTINSTALL_system=true \\
+    POSTINSTALL_PATH_system=system/bin/otapreopt_script \\
+    FILESYSTEM_TYPE_system=ext4 \\
+    POSTINSTALL_OPTIONAL_system=true
+
+# Boot control HAL
+PRODUCT_PACKAGES += \\
+    android.hardware.boot@1.0-impl \\
+    android.hardware.boot@1.0-service
+
+PRODUCT_PACKAGES += \\
+    bootctrl.{platform}
+
+PRODUCT_STATIC_BOOT_CONTROL_HAL := \\
+    bootctrl.{platform} \\
+    libgptutils \\
+    libz \\
+    libcutils
+
+PRODUCT_PACKAGES += \\
+    otapreopt_script \\
+    cppreopts.sh \\
+    update_engine \\
+    update_verifier \\
+    update_engine_sideload
+"""
+    
+    @staticmethod
+    def _omni_mk(device: Dict[str, Any]) -> str:
+        codename = device['codename']
+        manufacturer = device['manufacturer']
+        lines = [LICENSE_HEADER, "# Inherit from those products. Most specific first."]
+        if device['arch'] in ('arm64', 'x86_64'):
+            lines.append("$(call inherit-product, $(SRC_TARGET_DIR)/product/core_64_bit.mk)")
+        lines += ["$(call inherit-product-if-exists, $(SRC_TARGET_DIR)/product/embedded.mk)",
+                  "$(call inherit-product, $(SRC_TARGET_DIR)/product/full_base_telephony.mk)",
+                  "$(call inherit-product, $(SRC_TARGET_DIR)/product/languages_full.mk)", "",
+                  f"# Inherit from {codename} device",
+                  f"$(call inherit-product, device/{manufacturer}/{codename}/device.mk)", "",
+                  "# Inherit some common Omni stuff.",
+                  "$(call inherit-product, vendor/omni/config/common.mk)",
+                  "$(call inherit-product, vendor/omni/config/gsm.mk)", "",
+                  "# Device identifier. This must come after all inclusions",
+                  f"PRODUCT_DEVICE := {codename}",
+                  f"PRODUCT_NAME := omni_{codename}",
+                  f"PRODUCT_BRAND := {device['brand']}",
+                  f"PRODUCT_MODEL := {device['model']}",
+                  f"PRODUCT_MANUFACTURER := {manufacturer}",
+                  f"PRODUCT_RELEASE_NAME := {device['brand']} {device['model']}", ""]
+        return '\n'.join(lines)
@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""
+Pipeline - Stage graph executor
+
+A job is a set of stages, each declaring the context values it reads
+and the ones it produces. The executor starts every stage whose inputs
+are available on a thread pool, so stages that do not depend on each
+other (image analysis and twrpdtgen, git init and validation) overlap.
+Threads rather than processes: stages share the job's memory-mapped
+extraction, and the heavy lifting (zlib, lzma, hashing, file I/O)
+releases the GIL.
+
+Every stage is measured: wall time, CPU time of its thread, and bytes
+moved through read/write calls (Linux only; reads through the mmap'd
+image are page faults and not counted).
+
+Stages can be incremental. A pure stage (output depends only on its
+inputs) runs only when a stage that runs needs its outputs. A memoized
+stage also gets a key: a hash of its name, version, options and the
+digests of its inputs, where a stage output's digest is derived from
+the key of the stage producing it. Its outputs are stored under that
+key, and a later run with the same key loads them instead of running
+the stage (or anything it depends on).
+"""
+
+import hashlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, Callable, Iterable, List, Optional, Tuple
+
+from .extraction_cache import ExtractionCache
+
+
+_THREAD_IO_PATH = '/proc/thread-self/io'
+
+# Marks a bytes value stored as a file of a memo entry
+_BYTES_MARKER = '__bytes__'
+
+
+class StageError(Exception):
+    """A stage failed with a message meant for the user."""
+
+
+def _thread_io() -> Optional[Tuple[int, int]]:
+    """(bytes read, bytes written) by the calling thread, or None if unknown."""
+    try:
+        with open(_THREAD_IO_PATH, 'rb') as f:
+            counters = dict(line.split(b':', 1) for line in f.read().splitlines())
+        return int(counters[b'rchar']), int(counters[b'wchar'])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def digest(value: Any) -> str:
+    """Digest of a JSON-representable value, for keying stage inputs."""
+    data = json.dumps(value, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def source_digest(module) -> str:
+    """
+    Digest of a module's source file, as the version of a stage defined by it.
+    
+    Falls back to the module name where the source is not available
+    (frozen executables).
+    """
+    try:
+        with open(module.__file__, 'rb') as f:
+            return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+    except (AttributeError, TypeError, OSError):
+        return module.__name__
+
+
+class StageMemo:
+    """
+    Stage outputs persisted in an ExtractionCache, under the stage key.
+    
+    Outputs are stored as JSON, with bytes values (kernels, prebuilts)
+    split out into files of the entry. JSON turns tuples into lists and
+    anything else it cannot represent into strings.
+    """
+    
+    def __init__(self, cache: ExtractionCache):
+        self.cache = cache
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Stored outputs, or None on a miss."""
+        try:
+            with self.cache.lookup(key) as entry:
+                if entry is None:
+                    return None
+                return self._decode(entry.info, entry)
+        except (OSError, ValueError):
+            return None
+    
+    def put(self, key: str, outputs: Dict[str, Any]) -> bool:
+        """Store outputs; failures are ignored."""
+        files: Dict[str, bytes] = {}
+        try:
+            info = self._encode(outputs, files)
+            return self.cache.put(key, files=files, info=info)
+        except (OSError, TypeError, ValueError):
+            return False
+    
+    def _encode(self, value: Any, files: Dict[str, bytes]) -> Any:
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            name = str(len(files))
+            files[name] = bytes(value)
+            return {_BYTES_MARKER: name}
+        if isinstance(value, dict):
+            return {key: self._encode(item, files) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self._encode(item, files) for item in value]
+        return value
+    
+    def _decode(self, value: Any, entry) -> Any:
+        if isinstance(value, dict):
+            if set(value) == {_BYTES_MARKER}:
+                data = entry.read_file(value[_BYTES_MARKER])
+                if data is None:
+                    raise ValueError(f"Memo entry {entry.key} is missing a file")
+                return data
+            return {key: self._decode(item, entry) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self._decode(item, entry) for item in value]
+        return value
+
+
+class Stage:
+    """
+    One step of a pipeline.
+    
+    Args:
+        name: Unique stage name, used as the key of its metrics
+        func: Called with a dict holding the declared inputs; returns a
+            dict with (at least) the declared outputs
+        inputs: Context values the stage needs
+        outputs: Context values the stage produces
+        description: Progress message shown while the stage runs
+        version: Part of the stage key; change it whenever the outputs
+            change for the same inputs
+        options: Settings the outputs depend on besides the inputs;
+            part of the stage key
+        pure: The stage has no side effects, so it only runs when a
+            running stage needs its outputs
+        memoize: Persist the outputs under the stage key (implies pure)
+    """
+    
+    def __init__(self, name: str, func: Callable[[Dict[str, Any]], Dict[str, Any]],
+                 inputs: Iterable[str] = (), outputs: Iterable[str] = (),
+                 description: Optional[str] = None, version: Any = 1,
+                 options: Optional[Dict[str, Any]] = None,
+                 pure: bool = False, memoize: bool = False):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.description = description or name
+        self.version = version
+        self.options = dict(options or {})
+        self.pure = pure or memoize
+        self.memoize = memoize
+    
+    def __repr__(self):
+        return f"Stage({self.name!r}, inputs={self.inputs}, outputs={self.outputs})"
+
+
+class Pipeline:
+    """
+    A DAG of stages run with as much concurrency as the dependencies allow.
+    
+    Args:
+        stages: The stages; each output must be produced by one stage only
+        max_workers: Threads running stages concurrently
+        memo: Store of memoized stage outputs; without one every needed
+            stage runs
+    """
+    
+    def __init__(self, stages: List[Stage], max_workers: Optional[int] = None,
+                 memo: Optional[StageMemo] = None):
+        self.stages = list(stages)
+        self.max_workers = max_workers or max(1, len(self.stages))
+        self.memo = memo
+        
+        names = set()
+        self._producers: Dict[str, Stage] = {}
+        for stage in self.stages:
+            if stage.name in names:
+                raise ValueError(f"Duplicate stage name '{stage.name}'")
+            names.add(stage.name)
+            for output in stage.outputs:
+                if output in self._producers:
+                    raise ValueError(
+                        f"'{output}' is produced by both '{self._producers[output].name}' and '{stage.name}'"
+                    )
+                self._producers[output] = stage
+        self._check_acyclic()
+    
+    def dependencies(self, stage: Stage) -> List[str]:
+        """Names of the stages whose outputs stage reads."""
+        return sorted({self._producers[name].name for name in stage.inputs if name in self._producers})
+    
+    def keys(self, digests: Dict[str, str]) -> Dict[str, str]:
+        """
+        Key of every stage, given digests of the initial context values.
+        
+        The digest of a stage output is derived from the stage key, so a
+        key covers everything upstream of the stage.
+        """
+        digests = dict(digests)
+        keys = {}
+        for stage in self._ordered():
+            key = digest([stage.name, stage.version, stage.options,
+                          [[name, digests.get(name)] for name in stage.inputs]])
+            keys[stage.name] = key
+            for output in stage.outputs:
+                digests[output] = digest([key, output])
+        return keys
+    
+    def run(
+        self,
+        context: Optional[Dict[str, Any]] = None,
+        on_stage_start: Optional[Callable[[Stage], None]] = None,
+        on_stage_done: Optional[Callable[[Stage, Dict[str, Any]], None]] = None,
+        digests: Optional[Dict[str, str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Run every needed stage once its inputs are available.
+        
+        Stages with side effects are always needed, pure stages only
+        when a stage that runs reads their outputs. Memoized stages with
+        stored outputs for their key are loaded instead of run. After a
+        failure no new stage is started; running ones finish.
+        
+        Args:
+            context: Initial values (job parameters); updated in place
+                with every stage's outputs
+            on_stage_start: Called from the scheduling thread as a stage starts
+            on_stage_done: Called with the stage and its metrics as it
+                ends, or as its outputs are loaded from the memo
+            digests: Content digests of initial values that refer to
+                content (e.g. file path -> hash of the file); other
+                initial values are digested as they are
+        
+        Returns:
+            Dict with success, context, stages (name -> metrics with
+            status, wall_time, cpu_time, bytes_read, bytes_written, and
+            key for memoized stages), wall_time, and error/failed_stage
+            on failure. A stage's status is done, cached, failed,
+            skipped (after a failure) or unused (pure and not needed).
+        """
+        context = {} if context is None else context
+        start = time.perf_counter()
+        keys = {}
+        if self.memo is not None:
+            initial = {name: digest(value) for name, value in context.items()}
+            initial.update(digests or {})
+            keys = self.keys(initial)
+        
+        metrics, loaded = self._plan(keys)
+        for stage, outputs in loaded:
+            context.update(outputs)
+            if on_stage_done:
+                on_stage_done(stage, metrics[stage.name])
+        
+        pending = [stage for stage in self.stages if metrics[stage.name]['status'] == 'pending']
+        running = {}
+        error = failed_stage = None
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='stage') as pool:
+            while pending or running:
+                if error is None:
+                    for stage in [stage for stage in pending if all(name in context for name in stage.inputs)]:
+                        pending.remove(stage)
+                        metrics[stage.name]['status'] = 'running'
+                        if on_stage_start:
+                            on_stage_start(stage)
+                        inputs = {name: context[name] for name in stage.inputs}
+                        running[pool.submit(self._run_stage, stage, inputs, keys.get(stage.name))] = stage
+                
+                if not running:
+                    if pending and error is None:
+                        missing = sorted({name for stage in pending for name in stage.inputs
+                                          if name not in context})
+                        error = f"No stage provides: {', '.join(missing)}"
+                        failed_stage = pending[0].name
+                    break
+                
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    outputs, stage_metrics, stage_error = future.result()
+                    metrics[stage.name].update(stage_metrics)
+                    if stage_error is None:
+                        missing = [name for name in stage.outputs if name not in outputs]
+                        if missing:
+                            stage_error = f"Stage '{stage.name}' did not produce {', '.join(missing)}"
+                            metrics[stage.name]['status'] = 'failed'
+                            metrics[stage.name]['error'] = stage_error
+                    if stage_error is not None:
+                        if error is None:
+                            error, failed_stage = stage_error, stage.name
+                    else:
+                        context.update(outputs)
+                    if on_stage_done:
+                        on_stage_done(stage, metrics[stage.name])
+        
+        for stage in pending:
+            metrics[stage.name]['status'] = 'skipped'
+        
+        result = {
+            'success': error is None,
+            'context': context,
+            'stages': {stage.name: metrics[stage.name] for stage in self.stages},
+            'wall_time': time.perf_counter() - start,
+        }
+        if error is not None:
+            result['error'] = error
+            result['failed_stage'] = failed_stage
+        return result
+    
+    def _plan(self, keys: Dict[str, str]) -> Tuple[Dict[str, Dict[str, Any]], List[Tuple[Stage, Dict[str, Any]]]]:
+        """
+        Work out which stages run, loading memoized outputs on the way.
+        
+        Walks back from the stages with side effects. A memoized stage
+        found in the memo ends the walk: its dependencies are not
+        needed for it.
+        
+        Returns:
+            (stage name -> initial metrics, [(stage, outputs) loaded])
+        """
+        by_name = {stage.name: stage for stage in self.stages}
+        metrics: Dict[str, Dict[str, Any]] = {}
+        loaded = []
+        
+        def need(stage: Stage):
+            if stage.name in metrics:
+                return
+            if stage.memoize and stage.name in keys:
+                outputs, stage_metrics = self._measure(lambda: self.memo.get(keys[stage.name]))
+                if outputs is not None and all(name in outputs for name in stage.outputs):
+                    stage_metrics['status'] = 'cached'
+                    metrics[stage.name] = stage_metrics
+                    loaded.append((stage, outputs))
+                    return
+            metrics[stage.name] = {'status': 'pending'}
+            for dependency in self.dependencies(stage):
+                need(by_name[dependency])
+        
+        for stage in self.stages:
+            if not stage.pure:
+                need(stage)
+        for stage in self.stages:
+            stage_metrics = metrics.setdefault(stage.name, {'status': 'unused'})
+            if stage.memoize and stage.name in keys:
+                stage_metrics['key'] = keys[stage.name]
+        return metrics, loaded
+    
+    def _run_stage(self, stage: Stage, inputs: Dict[str, Any],
+                   key: Optional[str]) -> Tuple[Dict[str, Any], Dict[str, Any], Optional[str]]:
+        """Run one stage in a worker thread, measuring it and storing memoized outputs."""
+        error = None
+        
+        def call() -> Dict[str, Any]:
+            nonlocal error
+            try:
+                outputs = stage.func(inputs) or {}
+            except StageError as e:
+                error = str(e)
+                return {}
+            except Exception as e:
+                error = f"{stage.name} failed: {type(e).__name__}: {e}"
+                return {}
+            if stage.memoize and key is not None and all(name in outputs for name in stage.outputs):
+                self.memo.put(key, {name: outputs[name] for name in stage.outputs})
+            return outputs
+        
+        outputs, stage_metrics = self._measure(call)
+        stage_metrics['status'] = 'failed' if error else 'done'
+        if error:
+            stage_metrics['error'] = error
+        return outputs, stage_metrics, error
+    
+    @staticmethod
+    def _measure(func: Callable[[], Any]) -> Tuple[Any, Dict[str, Any]]:
+        """Call func, measuring wall time, CPU time of the thread and bytes read/written."""
+        io_start = _thread_io()
+        cpu_start = time.thread_time()
+        wall_start = time.perf_counter()
+        result = func()
+        io_end = _thread_io()
+        return result, {
+            'wall_time': time.perf_counter() - wall_start,
+            'cpu_time': time.thread_time() - cpu_start,
+            'bytes_read': io_end[0] - io_start[0] if io_start and io_end else None,
+            'bytes_written': io_end[1] - io_start[1] if io_start and io_end else None,
+        }
+    
+    def _ordered(self) -> List[Stage]:
+        """Stages in dependency order."""
+        by_name = {stage.name: stage for stage in self.stages}
+        ordered: List[Stage] = []
+        seen = set()
+        
+        def visit(stage: Stage):
+            if stage.name in seen:
+                return
+            seen.add(stage.name)
+            for dependency in self.dependencies(stage):
+                visit(by_name[dependency])
+            ordered.append(stage)
+        
+        for stage in self.stages:
+            visit(stage)
+        return ordered
+    
+    def _check_acyclic(self):
+        """Reject graphs where a stage (indirectly) depends on itself."""
+        state: Dict[str, int] = {}
+        by_name = {stage.name: stage for stage in self.stages}
+        
+        def visit(stage: Stage, path: List[str]):
+            if state.get(stage.name) == 2:
+                return
+            if state.get(stage.name) == 1:
+                cycle = path[path.index(stage.name):] + [stage.name]
+                raise ValueError(f"Stage cycle: {' -> '.join(cycle)}")
+            state[stage.name] = 1
+            for dependency in self.dependencies(stage):
+                visit(by_name[dependency], path + [stage.name])
+            state[stage.name] = 2
+        
+        for stage in self.stages:
+            visit(stage, [])
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Process Runner - Subprocesses without pipe deadlocks
+
+Reading a child's stdout to EOF before touching stderr hangs as soon as
+the child fills the stderr pipe buffer. The runner drains both pipes
+concurrently on an asyncio loop, forwards each line as a structured
+event while the child runs, and keeps only the last few KB of each
+stream for error reports. Jobs can be given a timeout, and killed from
+any thread. The child runs in its own process group so a kill also
+reaches the processes it started (AIK's shell scripts, cpio).
+"""
+
+import asyncio
+import os
+import signal
+import subprocess
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Callable, List, Optional
+
+
+DEFAULT_TAIL_BYTES = 64 * 1024
+READ_CHUNK_SIZE = 64 * 1024
+MAX_LINE_BYTES = 1024 * 1024
+
+# Seconds between SIGTERM and SIGKILL
+KILL_GRACE_SECONDS = 3
+
+# Seconds to wait for the pipes to close once the group is killed
+PIPE_CLOSE_SECONDS = 0.5
+
+_POLL_SECONDS = 0.05
+
+if os.name == 'nt':
+    _GROUP_OPTIONS = {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+else:
+    _GROUP_OPTIONS = {'start_new_session': True}
+
+
+class OutputTail:
+    """Last max_bytes worth of lines of a stream."""
+    
+    def __init__(self, max_bytes: int = DEFAULT_TAIL_BYTES):
+        self.max_bytes = max_bytes
+        self._lines = deque()
+        self._size = 0
+        self.dropped_lines = 0
+    
+    def append(self, line: str):
+        line = line[-self.max_bytes:]
+        size = len(line) + 1
+        self._lines.append(line)
+        self._size += size
+        while self._size > self.max_bytes and len(self._lines) > 1:
+            self._size -= len(self._lines.popleft()) + 1
+            self.dropped_lines += 1
+    
+    @property
+    def lines(self) -> List[str]:
+        return list(self._lines)
+    
+    @property
+    def text(self) -> str:
+        return '\n'.join(self._lines)
+
+
+class ProcessRunner:
+    """
+    Runs one command, streaming its output as events.
+    
+    Events passed to event_callback are dicts with a 'type' of
+    'started' (pid), 'line' (stream, text), 'timeout' or 'exited'
+    (returncode), plus 'time', the seconds since the start.
+    
+    Args:
+        cmd: Command and arguments
+        cwd: Working directory
+        env: Environment, inherited when None
+        timeout: Seconds before the process is killed
+        tail_bytes: Output kept per stream for the result
+        event_callback: Called from the runner's thread for every event
+    """
+    
+    def __init__(
+        self,
+        cmd: List[str],
+        cwd: Optional[str] = None,
+        env: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+        tail_bytes: int = DEFAULT_TAIL_BYTES,
+        event_callback: Optional[Callable[[Dict[str, Any]], None]] = None
+    ):
+        self.cmd = [str(part) for part in cmd]
+        self.cwd = cwd
+        self.env = env
+        self.timeout = timeout
+        self.event_callback = event_callback
+        self.stdout = OutputTail(tail_bytes)
+        self.stderr = OutputTail(tail_bytes)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._process = None
+        self._readers = None
+        self._finished = False
+        self._kill_requested = False
+        self._start = 0.0
+    
+    def run(self) -> Dict[str, Any]:
+        """Run to completion on a private event loop; see run_async()."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.run_async())
+        
+        # Called from inside a running loop: use a helper thread
+        result = {}
+        thread = threading.Thread(target=lambda: result.update(asyncio.run(self.run_async())))
+        thread.start()
+        thread.join()
+        return result
+    
+    async def run_async(self) -> Dict[str, Any]:
+        """
+        Run the command.
+        
+        Returns:
+            Dict with returncode, stdout and stderr (the kept tails),
+            timed_out, killed and duration
+        """
+        self._loop = asyncio.get_running_loop()
+        self._start = time.monotonic()
+        try:
+            self._process = await asyncio.create_subprocess_exec(
+                *self.cmd,
+                cwd=self.cwd,
+                env=self.env,
+                stdin=subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                **_GROUP_OPTIONS
+            )
+        except OSError as e:
+            return {
+                'returncode': None,
+                'stdout': '',
+                'stderr': str(e),
+                'timed_out': False,
+                'killed': False,
+                'duration': time.monotonic() - self._start,
+                'error': str(e)
+            }
+        
+        self._emit({'type': 'started', 'pid': self._process.pid})
+        self._readers = asyncio.gather(
+            self._drain(self._process.stdout, 'stdout', self.stdout),
+            self._drain(self._process.stderr, 'stderr', self.stderr)
+        )
+        if self._kill_requested:
+            await self._terminate()
+        
+        timed_out = False
+        try:
+            try:
+                await asyncio.wait_for(asyncio.shield(self._readers), self.timeout)
+            except asyncio.TimeoutError:
+                timed_out = True
+                self._emit({'type': 'timeout'})
+                await self._terminate()
+                await self._readers
+            returncode = await self._process.wait()
+        finally:
+            self._finished = True
+            self._close_transport()
+        
+        self._emit({'type': 'exited', 'returncode': returncode})
+        return {
+            'returncode': returncode,
+            'stdout': self.stdout.text,
+            'stderr': self.stderr.text,
+            'timed_out': timed_out,
+            'killed': self._kill_requested or timed_out,
+            'duration': time.monotonic() - self._start
+        }
+    
+    def kill(self):
+        """Terminate the process (SIGKILL after a grace period); safe from any thread."""
+        self._kill_requested = True
+        loop = self._loop
+        if loop is not None and self._process is not None and not loop.is_closed():
+            try:
+                asyncio.run_coroutine_threadsafe(self._terminate(), loop)
+            except RuntimeError:
+                # The loop finished in the meantime
+                pass
+    
+    async def _terminate(self):
+        """Stop the child's whole process group and make sure its pipes close."""
+        if self._process is None or self._readers is None or self._finished:
+            return
+        self._signal_group(force=False)
+        deadline = time.monotonic() + KILL_GRACE_SECONDS
+        while time.monotonic() < deadline and not (self._readers.done() and self._process.returncode is not None):
+            await asyncio.sleep(_POLL_SECONDS)
+        # Also reaps group members that outlived the child
+        self._signal_group(force=True)
+        
+        try:
+            await asyncio.wait_for(asyncio.shield(self._readers), PIPE_CLOSE_SECONDS)
+        except asyncio.TimeoutError:
+            # A process that left the group still holds the pipes
+            self._close_transport()
+    
+    def _signal_group(self, force: bool):
+        pid = self._process.pid
+        try:
+            if os.name == 'nt':
+                if not force:
+                    # taskkill /T walks the tree from the still-running child
+                    subprocess.run(['taskkill', '/T', '/F', '/PID', str(pid)],
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                   timeout=KILL_GRACE_SECONDS)
+                elif self._process.returncode is None:
+                    self._process.kill()
+            else:
+                os.killpg(pid, signal.SIGKILL if force else signal.SIGTERM)
+        except (OSError, subprocess.SubprocessError):
+            # The group is already gone
+            pass
+    
+    def _close_transport(self):
+        """Close the pipes; otherwise the transport outlives the event loop."""
+        # asyncio.subprocess.Process exposes no close() of its own
+        transport = getattr(self._process, '_transport', None)
+        if transport is not None:
+            transport.close()
+    
+    async def _drain(self, reader: asyncio.StreamReader, stream: str, tail: OutputTail):
+        """Forward complete lines as they arrive; chunked reads tolerate any line length."""
+        partial = b''
+        while True:
+            chunk = await reader.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            lines = (partial + chunk).split(b'\n')
+            partial = lines.pop()
+            for line in lines:
+                self._line(stream, tail, line)
+            if len(partial) > MAX_LINE_BYTES:
+                # Output without newlines is forwarded in pieces
+                self._line(stream, tail, partial)
+                partial = b''
+        if partial:
+            self._line(stream, tail, partial)
+    
+    def _line(self, stream: str, tail: OutputTail, raw: bytes):
+        text = raw.rstrip(b'\r').decode('utf-8', errors='replace')
+        tail.append(text)
+        self._emit({'type': 'line', 'stream': stream, 'text': text})
+    
+    def _emit(self, event: Dict[str, Any]):
+        if self.event_callback is None:
+            return
+        event['time'] = time.monotonic() - self._start
+        try:
+            self.event_callback(event)
+        except Exception:
+            # A failing observer must not wedge the pipes
+            pass
+
+
+def run_process(
+    cmd: List[str],
+    line_callback: Optional[Callable[[str, str], None]] = None,
+    timeout: Optional[float] = None,
+    cwd: Optional[str] = None,
+    tail_bytes: int = DEFAULT_TAIL_BYTES
+) -> Dict[str, Any]:
+    """
+    Run a command, draining stdout and stderr concurrently.
+    
+    Args:
+        cmd: Command and arguments
+        line_callback: Called as (stream, line) for every output line
+        timeout: Seconds before the process is killed
+        cwd: Working directory
+        tail_bytes: Output kept per stream for the result
+    
+    Returns:
+        Dict as returned by ProcessRunner.run_async()
+    """
+    def forward(event: Dict[str, Any]):
+        if event['type'] == 'line':
+            line_callback(event['stream'], event['text'])
+    
+    runner = ProcessRunner(cmd, cwd=cwd, timeout=timeout, tail_bytes=tail_bytes,
+                           event_callback=forward if line_callback else None)
+    return runner.run()
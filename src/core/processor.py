@@ -6,22 +6,73 @@ Handles boot image processing and device tree generation.
 """
 
 import os
-import sys
 import shutil
 import subprocess
 import tempfile
+import threading
 import json
+import sqlite3
 from pathlib import Path
-from typing import Dict, Callable, Optional, Any
+from typing import Dict, Callable, List, Optional, Any
 import time
 
+from .extractors import read_avb_info, board_partition_sizes
+from .extractors.super_image import read_super_info
+from .extractors.filesystem import read_partition_files
+from .extractors.payload import extract_payload_partitions, is_ota_package
+from .extractors.container import open_boot_member
+from .extractors.twrpdtgen_engine import TwrpdtgenEngine
+from .toolchain import ToolchainRegistry, get_toolchain, twrpdtgen_requirements
+from .fdt_overlay import resolve_board_variants
+from .kernel import KernelAnalyzer
+from .extraction_cache import ExtractionCache, extractor_version
+from .fingerprint import FingerprintService, full_hash
+from . import native_generator
+from .native_generator import NativeTreeGenerator, COLLECT_VERSION
+from .image_extraction import ImageExtraction
+from .pipeline import Pipeline, Stage, StageError, StageMemo, source_digest
+
+
+# Backends a TWRP tree can be generated with
+GENERATORS = ('twrpdtgen', 'native')
+
+# Files the native generator reads from the vendor partition
+VENDOR_FILE_PATTERNS = ['build.prop', 'etc/fstab.*']
+
 
 class DeviceTreeProcessor:
     """Main processor for device tree generation."""
     
-    def __init__(self):
+    def __init__(self, cache: Optional[ExtractionCache] = None, use_cache: bool = True,
+                 engine: Optional[TwrpdtgenEngine] = None,
+                 toolchain: Optional[ToolchainRegistry] = None,
+                 job_timeout: Optional[float] = None, work_root: Optional[str] = None):
+        """
+        Args:
+            cache: Extraction cache to share; the default one under
+                ~/.cache is used when None
+            use_cache: Set to False to always extract from scratch
+            engine: twrpdtgen engine to share; an in-process one (with
+                subprocess fallback) is used when None
+            toolchain: Registry of external tools; the process-wide one
+                is used when None
+            job_timeout: Seconds a twrpdtgen run may take before it is
+                killed; None waits indefinitely
+            work_root: Directory the job work directories are created
+                in; the system temporary directory when None
+        """
         self.temp_dir = None
         self.work_dir = None
+        self.extraction = None
+        self._extraction_lock = threading.Lock()
+        self.engine = engine or TwrpdtgenEngine()
+        self.native_generator = NativeTreeGenerator()
+        self.toolchain = toolchain or get_toolchain()
+        self.job_timeout = job_timeout
+        self.work_root = work_root
+        self.cache = (cache or ExtractionCache()) if use_cache else None
+        self.memo = StageMemo(self.cache) if self.cache is not None else None
+        self._fingerprints = None
     
     def process_image(
         self,
@@ -31,11 +82,17 @@ class DeviceTreeProcessor:
         init_git: bool = True,
         validate: bool = True,
         progress_callback: Optional[Callable] = None,
-        log_callback: Optional[Callable] = None
+        log_callback: Optional[Callable] = None,
+        generator: str = "twrpdtgen"
     ) -> Dict[str, Any]:
         """
         Process boot image and generate device tree.
         
+        The job runs as a graph of stages (see _build_pipeline); stages
+        that do not depend on each other run concurrently, and stages
+        whose inputs are unchanged since an earlier run are loaded from
+        the cache instead of run.
+        
         Args:
             image_path: Path to boot/recovery image
             output_dir: Output directory for generated device tree
@@ -44,40 +101,79 @@ class DeviceTreeProcessor:
             validate: Validate generated device tree
             progress_callback: Callback for progress updates
             log_callback: Callback for log messages
+            generator: Backend generating the tree, one of GENERATORS;
+                'native' builds it in-process from the parsed image
         
         Returns:
-            Dict containing success status, output path, and device info
+            Dict containing success status, output path, device info,
+            and 'stages' with the status (done, cached, ...), wall time,
+            CPU time and bytes read/written of every stage
         """
+        if generator not in GENERATORS:
+            return {
+                'success': False,
+                'error': f"Unknown generator '{generator}'. Use one of: {', '.join(GENERATORS)}"
+            }
+        if tree_type != "twrp":
+            return {
+                'success': False,
+                'error': f"Tree type '{tree_type}' not yet supported. Use 'twrp' for now."
+            }
+        
         try:
             self._create_work_directory()
             
             if log_callback:
                 log_callback("Initializing device tree generation...")
             
-            if tree_type == "twrp":
-                result = self._process_with_twrpdtgen(
-                    image_path, output_dir, init_git,
-                    progress_callback, log_callback
-                )
-            else:
+            # Stage outputs are memoized under the content of the input
+            content_digest = self._content_digest(image_path) if self.memo is not None else None
+            memo = self.memo if content_digest is not None else None
+            pipeline = self._build_pipeline(generator, init_git, validate, log_callback, memo)
+            finished = []
+            
+            def stage_started(stage: Stage):
+                if progress_callback:
+                    progress_callback(0.1 + 0.85 * len(finished) / len(pipeline.stages), stage.description)
+            
+            def stage_done(stage: Stage, metrics: Dict[str, Any]):
+                finished.append(stage.name)
+                if metrics['status'] == 'cached' and log_callback:
+                    log_callback(f"Inputs of {stage.name} unchanged, reusing its cached result")
+            
+            # The layout of a super.img and the vendor files beside the
+            # selected file; as plain values, their digests key the
+            # stages reading them
+            context = {
+                'source_path': image_path,
+                'source_name': os.path.basename(image_path),
+                'output_dir': output_dir,
+                'super_info': self._extract_super_info(image_path),
+                'vendor_files': self._extract_vendor_files(image_path) if generator == "native" else {},
+            }
+            run = pipeline.run(context,
+                               on_stage_start=stage_started, on_stage_done=stage_done,
+                               digests={'source_path': content_digest})
+            if not run['success']:
                 return {
                     'success': False,
-                    'error': f"Tree type '{tree_type}' not yet supported. Use 'twrp' for now."
+                    'error': run['error'],
+                    'stages': run['stages']
                 }
             
-            if result['success'] and validate:
-                if progress_callback:
-                    progress_callback(0.9, "Validating device tree...")
-                if log_callback:
-                    log_callback("Validating generated device tree...")
-                
-                validation = self._validate_device_tree(result['output_path'])
-                result['validation'] = validation
-                
-                if not validation['valid']:
-                    if log_callback:
-                        log_callback(f"Warning: Validation issues found: {', '.join(validation['warnings'])}")
-            
+            context = run['context']
+            device_info = context['device_info']
+            result = {
+                'success': True,
+                'output_path': output_dir,
+                'device_name': device_info.get('device', 'Unknown'),
+                'manufacturer': device_info.get('manufacturer', 'Unknown'),
+                'device_info': device_info,
+                'stages': run['stages'],
+                'pipeline_time': run['wall_time']
+            }
+            if validate:
+                result['validation'] = context['validation']
             return result
         
         except Exception as e:
@@ -87,11 +183,124 @@ class DeviceTreeProcessor:
             }
         
         finally:
+            self._close_extraction()
             self._cleanup_work_directory()
     
+    def _build_pipeline(
+        self,
+        generator: str,
+        init_git: bool,
+        validate: bool,
+        log_callback: Optional[Callable],
+        memo: Optional[StageMemo] = None
+    ) -> Pipeline:
+        """
+        Declare the stages of a job and the values they pass each other.
+        
+        resolve -> image_info -> the generator's stages, which produce
+        the tree as relative path -> content, then write, device_info,
+        git and validate. Everything up to the tree is pure and memoized
+        (see core.pipeline): a rerun on the same image loads the tree
+        and image info instead of unpacking and analysing the image
+        again, and a change to the native templates re-renders from the
+        memoized facts only.
+        """
+        native = generator == "native"
+        
+        def resolve(ctx):
+            return {'image_path': self._resolve_input_image(ctx['source_path'], None, log_callback)}
+        
+        def image_info(ctx):
+            if log_callback:
+                log_callback("Analyzing boot image...")
+            return {'image_info': self._extract_image_info(ctx['image_path'])}
+        
+        def collect(ctx):
+            extraction = self._extraction_for(ctx['image_path'])
+            if extraction is None:
+                raise StageError("Native generation failed: image could not be parsed")
+            try:
+                device = self.native_generator.collect(extraction, {**ctx['image_info'], **ctx['super_info']},
+                                                       partition_files=ctx['vendor_files'])
+            except Exception as e:
+                raise StageError(f"Native generation failed: {type(e).__name__}: {e}")
+            if log_callback:
+                log_callback(f"Device: {device['manufacturer']}/{device['codename']} "
+                             f"({device['arch']}, platform {device['platform']})")
+                for warning in device['warnings']:
+                    log_callback(f"Warning: {warning}")
+            return {'device': device}
+        
+        def render(ctx):
+            device = ctx['device']
+            prefix = f"{device['manufacturer']}/{device['codename']}"
+            files = self.native_generator.render(device)
+            return {'tree_files': {f"{prefix}/{name}": content for name, content in files.items()}}
+        
+        def twrpdtgen(ctx):
+            return {'tree_files': self._generate_with_twrpdtgen(ctx['image_path'], log_callback)}
+        
+        def write(ctx):
+            names = self._write_tree(ctx['output_dir'], ctx['tree_files'])
+            if log_callback:
+                log_callback(f"Wrote {len(ctx['tree_files'])} files to {ctx['output_dir']}")
+            return {'generated': names}
+        
+        def device_info(ctx):
+            info = self._extract_device_info(ctx['output_dir'], image_info=ctx['image_info'])
+            info.update(ctx['super_info'])
+            return {'device_info': info}
+        
+        def git(ctx):
+            if log_callback:
+                log_callback("Initializing git repository...")
+            self._initialize_git(ctx['output_dir'], log_callback)
+            return {'git_initialized': True}
+        
+        def validation(ctx):
+            if log_callback:
+                log_callback("Validating generated device tree...")
+            result = self._validate_device_tree(ctx['output_dir'])
+            if not result['valid'] and log_callback:
+                log_callback(f"Warning: Validation issues found: {', '.join(result['warnings'])}")
+            return {'validation': result}
+        
+        stages = [
+            Stage('resolve', resolve, ['source_path'], ['image_path'], "Reading input image...",
+                  pure=True),
+            # The file name names the partition when AVB does not
+            # (board_partition_sizes), so it is part of the key
+            Stage('image_info', image_info, ['image_path', 'source_name'], ['image_info'],
+                  "Analyzing device information...", version=extractor_version(), memoize=True),
+        ]
+        if native:
+            stages += [
+                Stage('collect', collect, ['image_path', 'image_info', 'super_info', 'vendor_files'],
+                      ['device'], "Reading device facts...", version=COLLECT_VERSION, memoize=True),
+                # Any change to the templates re-renders
+                Stage('render', render, ['device'], ['tree_files'], "Generating device tree files...",
+                      version=source_digest(native_generator), memoize=True),
+            ]
+        else:
+            stages.append(Stage('generate', twrpdtgen, ['image_path'], ['tree_files'],
+                                "Generating device tree files...", version=extractor_version(),
+                                memoize=True))
+        stages += [
+            Stage('write', write, ['output_dir', 'tree_files'], ['generated'], "Writing device tree..."),
+            Stage('device_info', device_info, ['output_dir', 'super_info', 'image_info', 'generated'],
+                  ['device_info'], "Reading device information..."),
+        ]
+        if init_git:
+            stages.append(Stage('git', git, ['output_dir', 'generated'], ['git_initialized'],
+                                "Initializing git repository..."))
+        if validate:
+            stages.append(Stage('validate', validation, ['output_dir', 'generated'], ['validation'],
+                                "Validating device tree..."))
+        return Pipeline(stages, memo=memo)
+    
     def _create_work_directory(self):
         """Create temporary working directory."""
-        self.temp_dir = tempfile.mkdtemp(prefix="dtgen_")
+        self.temp_dir = tempfile.mkdtemp(prefix="dtgen_", dir=self.work_root)
         self.work_dir = Path(self.temp_dir)
     
     def _cleanup_work_directory(self):
@@ -102,130 +311,196 @@ class DeviceTreeProcessor:
             except Exception:
                 pass
     
-    def _process_with_twrpdtgen(
+    def _extraction_for(self, image_path: str) -> Optional[ImageExtraction]:
+        """
+        The job's single extraction of image_path, opened on first use.
+        
+        Every consumer (image analysis, native generator, twrpdtgen) reads
+        from it, so the image is unpacked once per job.
+        
+        Returns:
+            The extraction, or None if the image cannot be parsed
+        """
+        # Pipeline stages ask for it concurrently
+        with self._extraction_lock:
+            if self.extraction is not None and self.extraction.image_path == image_path:
+                return self.extraction
+            
+            self._close_extraction()
+            work_dir = str(self.work_dir / "extraction") if self.work_dir is not None else None
+            try:
+                self.extraction = ImageExtraction(image_path, work_dir)
+            except (OSError, ValueError):
+                return None
+            return self.extraction
+    
+    def _close_extraction(self):
+        if self.extraction is not None:
+            self.extraction.close()
+            self.extraction = None
+    
+    def _resolve_input_image(
         self,
         image_path: str,
-        output_dir: str,
-        init_git: bool,
         progress_callback: Optional[Callable],
         log_callback: Optional[Callable]
-    ) -> Dict[str, Any]:
+    ) -> str:
         """
-        Process image using twrpdtgen.
+        Turn the selected file into a boot/recovery image path.
         
-        This method integrates with the twrpdtgen CLI tool to generate
-        TWRP-compatible device trees.
+        A/B OTA zips and payload.bin files get only the partitions the
+        generator needs extracted into the work directory; recovery.img
+        is preferred, then boot.img (A/B devices boot recovery from it),
+        then vendor_boot.img. Tar (including Samsung .tar.md5), zip, gzip
+        and lz4 inputs are searched for the same images and the chosen
+        one is decompressed straight into the work directory. Bare boot
+        images are returned unchanged.
         """
-        try:
-            if not self._check_twrpdtgen_installed():
-                return {
-                    'success': False,
-                    'error': 'twrpdtgen not installed. Install with: pip install twrpdtgen'
-                }
-            
-            if progress_callback:
-                progress_callback(0.3, "Extracting boot image...")
+        if is_ota_package(image_path):
             if log_callback:
-                log_callback("Extracting boot image contents...")
-            
-            os.makedirs(output_dir, exist_ok=True)
-            
-            cmd = [
-                sys.executable, "-m", "twrpdtgen",
-                image_path,
-                "-o", output_dir
-            ]
-            
-            if log_callback:
-                log_callback(f"Running: {' '.join(cmd)}")
-            
+                log_callback("OTA package detected, extracting boot partitions from payload...")
             if progress_callback:
-                progress_callback(0.4, "Analyzing device information...")
+                progress_callback(0.1, "Extracting partitions from OTA payload...")
             
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True
-            )
-            
-            stdout_lines = []
-            stderr_lines = []
-            
-            for line in process.stdout:
-                line = line.strip()
-                if line:
-                    stdout_lines.append(line)
+            extracted = extract_payload_partitions(image_path, str(self.work_dir / "payload"))
+            for name in ('recovery', 'boot', 'vendor_boot'):
+                if name in extracted:
                     if log_callback:
-                        log_callback(line)
+                        log_callback(f"Using {name}.img from the OTA payload")
+                    return extracted[name]
             
-            for line in process.stderr:
-                line = line.strip()
-                if line:
-                    stderr_lines.append(line)
-            
-            process.wait()
-            
-            if process.returncode != 0:
-                error_msg = "\n".join(stderr_lines) if stderr_lines else "Unknown error during generation"
-                return {
-                    'success': False,
-                    'error': f"twrpdtgen failed: {error_msg}"
-                }
-            
-            if progress_callback:
-                progress_callback(0.7, "Generating device tree files...")
-            if log_callback:
-                log_callback("Device tree files generated successfully")
-            
-            device_info = self._extract_device_info(output_dir)
-            
-            if init_git:
-                if progress_callback:
-                    progress_callback(0.85, "Initializing git repository...")
-                if log_callback:
-                    log_callback("Initializing git repository...")
-                
-                self._initialize_git(output_dir, log_callback)
-            
-            return {
-                'success': True,
-                'output_path': output_dir,
-                'device_name': device_info.get('device', 'Unknown'),
-                'manufacturer': device_info.get('manufacturer', 'Unknown'),
-                'device_info': device_info
-            }
+            raise ValueError("OTA payload contains no boot, recovery or vendor_boot partition")
+        
+        member = open_boot_member(image_path)
+        if member is None:
+            return image_path
         
+        if log_callback:
+            log_callback(f"Using {member.name} from {os.path.basename(image_path)}")
+        if progress_callback:
+            progress_callback(0.1, f"Reading {member.kind} image from archive...")
+        return member.extract(str(self.work_dir / "input"))
+    
+    def _generate_with_twrpdtgen(self, image_path: str, log_callback: Optional[Callable]) -> Dict[str, bytes]:
+        """
+        Generate the tree with twrpdtgen, on the job's extraction when possible.
+        
+        twrpdtgen writes to a scratch directory which is read back, so
+        the tree can be memoized like the native one. Its own git
+        repository is not created; the git stage makes one for the
+        whole output directory.
+        
+        Returns:
+            Path relative to the output directory -> content
+        
+        Raises:
+            StageError: twrpdtgen or a tool it needs is missing, or it failed
+        """
+        if not self._check_twrpdtgen_installed():
+            raise StageError('twrpdtgen not installed. Install with: pip install twrpdtgen')
+        
+        # twrpdtgen in another interpreter cannot use our extraction
+        extraction = self._extraction_for(image_path) if self.engine.mode != 'subprocess' else None
+        missing = self.toolchain.missing(twrpdtgen_requirements(pre_extracted=extraction is not None))
+        if missing:
+            raise StageError(f"twrpdtgen needs {', '.join(missing)}, which could not be found on PATH")
+        
+        if log_callback:
+            log_callback("Extracting boot image contents...")
+        aik_dir = str(extraction.aik_dir()) if extraction is not None else None
+        
+        scratch = self.work_dir / "twrpdtgen"
+        scratch.mkdir(parents=True, exist_ok=True)
+        
+        if log_callback:
+            log_callback(f"Running twrpdtgen ({self.engine.mode})...")
+        
+        try:
+            generation = self.engine.generate(image_path, str(scratch), no_git=True,
+                                              log_callback=log_callback,
+                                              timeout=self.job_timeout, aik_dir=aik_dir)
         except FileNotFoundError:
-            return {
-                'success': False,
-                'error': 'twrpdtgen not found. Please install it with: pip install twrpdtgen'
-            }
-        except Exception as e:
-            return {
-                'success': False,
-                'error': f"Error during processing: {str(e)}"
-            }
+            raise StageError('twrpdtgen not found. Please install it with: pip install twrpdtgen')
+        
+        if not generation['success']:
+            raise StageError(f"twrpdtgen failed: {generation['error']}")
+        
+        if log_callback:
+            log_callback("Device tree files generated successfully")
+        return self._read_tree(scratch)
+    
+    @staticmethod
+    def _read_tree(directory: Path) -> Dict[str, bytes]:
+        """Files under directory, as relative POSIX path -> content."""
+        files = {}
+        for root, dirs, names in os.walk(directory):
+            dirs.sort()
+            for name in sorted(names):
+                path = Path(root) / name
+                with open(path, 'rb') as f:
+                    files[path.relative_to(directory).as_posix()] = f.read()
+        return files
+    
+    @staticmethod
+    def _write_tree(output_dir: str, files: Dict[str, Any]) -> List[str]:
+        """
+        Write a generated tree into output_dir.
+        
+        Each <manufacturer>/<codename> directory in files replaces the
+        one already there. Shell scripts are made executable.
+        
+        Returns:
+            Top-level names written
+        """
+        output_path = Path(output_dir)
+        for device_dir in sorted({'/'.join(name.split('/')[:2]) for name in files if name.count('/') >= 2}):
+            shutil.rmtree(output_path / device_dir, ignore_errors=True)
+        
+        for name, content in files.items():
+            path = output_path / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if isinstance(content, str):
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(content)
+            else:
+                with open(path, 'wb') as f:
+                    f.write(content)
+            if name.endswith('.sh'):
+                os.chmod(path, 0o755)
+        return sorted({name.split('/')[0] for name in files})
+    
+    def _content_digest(self, path: str) -> Optional[str]:
+        """Content hash of a file, memoized per file version; None if it cannot be read."""
+        try:
+            # Memoized per file version, so reruns skip the full read
+            if self._fingerprints is None:
+                self._fingerprints = FingerprintService(background=False)
+            return self._fingerprints.full_hash(path)
+        except (OSError, sqlite3.Error):
+            try:
+                return full_hash(path)
+            except OSError:
+                return None
     
     def _check_twrpdtgen_installed(self) -> bool:
         """Check if twrpdtgen is installed."""
-        try:
-            result = subprocess.run(
-                [sys.executable, "-m", "twrpdtgen", "--version"],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            return result.returncode == 0
-        except Exception:
-            return False
+        return self.engine.available
     
-    def _extract_device_info(self, output_dir: str) -> Dict[str, str]:
+    def _extract_device_info(
+        self,
+        output_dir: str,
+        image_path: Optional[str] = None,
+        image_info: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
         """
         Extract device information from generated device tree.
         
         Parses the generated files to extract device codename,
-        manufacturer, and other relevant information.
+        manufacturer, and other relevant information. When the source
+        image is given, the model, platform and early-mount fstab are
+        read from its device tree blobs with DTBO overlays applied;
+        image_info passes in the result of an earlier image analysis
+        instead.
         """
         device_info = {
             'device': 'Unknown',
@@ -237,8 +512,9 @@ class DeviceTreeProcessor:
         try:
             output_path = Path(output_dir)
             
-            for item in output_path.iterdir():
-                if item.is_dir():
+            for item in sorted(output_path.iterdir()):
+                # .git may be appearing concurrently
+                if item.is_dir() and not item.name.startswith('.'):
                     manufacturer = item.name
                     device_info['manufacturer'] = manufacturer
                     
@@ -266,12 +542,159 @@ class DeviceTreeProcessor:
         except Exception as e:
             pass
         
+        if image_info is None and image_path:
+            image_info = self._extract_image_info(image_path)
+        
+        if image_info:
+            architecture = device_info['architecture']
+            device_info.update(image_info)
+            # The generated BoardConfig.mk wins over the kernel's guess
+            if architecture != 'Unknown':
+                device_info['architecture'] = architecture
+        
+        if image_path:
+            device_info.update(self._extract_super_info(image_path))
+        
         return device_info
     
+    def _extract_image_info(self, image_path: str) -> Dict[str, Any]:
+        """
+        Analyze the source image itself: DT, AVB and kernel info.
+        
+        Depends only on the image content, which is what makes the
+        result cacheable. The super.img next to it is read separately.
+        """
+        image_info = {}
+        extraction = self._extraction_for(image_path)
+        
+        image_info.update(self._extract_dt_info(image_path))
+        
+        image_info.update(self._extract_avb_info(image_path))
+        
+        if extraction is not None:
+            kernel_info = extraction.kernel_info()
+        else:
+            kernel_info = KernelAnalyzer().analyze_image(image_path)
+        if kernel_info['success']:
+            image_info['kernel_version'] = kernel_info['version']
+            image_info['kernel_config'] = kernel_info['config']
+            if kernel_info['architecture']:
+                image_info['architecture'] = kernel_info['architecture']
+        
+        return image_info
+    
+    def _extract_avb_info(self, image_path: str) -> Dict[str, Any]:
+        """
+        Read partition sizes and rollback index from the image's AVB footer.
+        
+        The footed image is exactly as large as its partition, which is
+        what BOARD_*IMAGE_PARTITION_SIZE must be set to.
+        """
+        try:
+            avb = read_avb_info(image_path)
+        except Exception:
+            return {}
+        if avb is None:
+            return {}
+        
+        return {
+            'partition_size': avb['partition_size'],
+            'board_partition_sizes': board_partition_sizes(avb, image_path),
+            'avb': {
+                'algorithm': avb['algorithm'],
+                'rollback_index': avb['rollback_index'],
+                'rollback_index_location': avb['rollback_index_location'],
+                'partitions': sorted(avb['partitions']),
+                'properties': avb['properties'],
+            }
+        }
+    
+    def _extract_super_info(self, image_path: str) -> Dict[str, Any]:
+        """
+        Read dynamic partition layout from a super.img next to the image.
+        
+        Firmware packages ship super.img beside boot/recovery; its liblp
+        metadata gives the BOARD_SUPER_PARTITION_* variables.
+        """
+        super_path = Path(image_path).with_name('super.img')
+        if not super_path.is_file() or super_path == Path(image_path):
+            return {}
+        
+        try:
+            info = read_super_info(str(super_path))
+        except Exception:
+            return {}
+        if info is None:
+            return {}
+        
+        return {
+            'board_super_variables': info['board_variables'],
+            'dynamic_partitions': sorted(info['partitions']),
+        }
+    
+    def _extract_vendor_files(self, image_path: str) -> Dict[str, bytes]:
+        """
+        Read vendor build.prop and fstab from a vendor.img, or else the
+        vendor partition of a super.img, next to the image.
+        
+        Returns:
+            Dict mapping device paths (e.g. 'vendor/build.prop') to contents
+        """
+        directory = Path(image_path).parent
+        for path, partition in ((directory / 'vendor.img', None), (directory / 'super.img', 'vendor')):
+            if not path.is_file() or path == Path(image_path):
+                continue
+            try:
+                files = read_partition_files(str(path), VENDOR_FILE_PATTERNS, partition)
+            except Exception:
+                continue
+            return {f"vendor/{name}": data for name, data in files.items()}
+        return {}
+    
+    def _extract_dt_info(self, image_path: str) -> Dict[str, Any]:
+        """
+        Read board information from the DTB/DTBO sections of a boot image.
+        
+        Boot images (v2) carry both the base DTBs and recovery_dtbo;
+        vendor_boot images carry the DTBs only.
+        """
+        dt_info = {}
+        
+        try:
+            extraction = self._extraction_for(image_path)
+            if extraction is None:
+                return dt_info
+            dtb, dtbo = extraction.section('dtb'), extraction.section('recovery_dtbo')
+            if dtb is None:
+                return dt_info
+            
+            variants = resolve_board_variants(dtb, dtbo)
+            if not variants:
+                return dt_info
+            
+            primary = variants[0]
+            if primary['model']:
+                dt_info['model'] = primary['model']
+            if primary['platform']:
+                dt_info['platform'] = primary['platform']
+            dt_info['compatible'] = primary['compatible']
+            dt_info['dt_fstab'] = primary['fstab']
+            dt_info['dt_variants'] = variants
+        
+        except Exception:
+            pass
+        
+        return dt_info
+    
     def _initialize_git(self, directory: str, log_callback: Optional[Callable] = None):
         """
         Initialize git repository in the output directory.
         """
+        if not self.toolchain.is_available('git'):
+            if log_callback:
+                log_callback("Warning: Git not found. Skipping git initialization.")
+            return
+        
         try:
             result = subprocess.run(
                 ['git', 'init'],
@@ -330,8 +753,8 @@ class DeviceTreeProcessor:
         try:
             output_path = Path(output_dir)
             
-            for item in output_path.iterdir():
-                if item.is_dir():
+            for item in sorted(output_path.iterdir()):
+                if item.is_dir() and not item.name.startswith('.'):
                     for device_dir in item.iterdir():
                         if device_dir.is_dir():
                             for required_file in required_files:
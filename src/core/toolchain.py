@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Toolchain - Registry of the external tools the generator relies on
+
+twrpdtgen needs cpio (and clones AIK with git), trees are committed
+with git, and lz4/dtc are handy for inspecting images by hand. Probing
+them one by one with a subprocess each, every launch and every job,
+adds seconds of dead time on a cold machine.
+
+The registry resolves every tool on PATH without spawning anything,
+runs the version probes that are actually needed concurrently, and
+keeps the results in a manifest next to the other caches. A tool is
+probed again only when PATH changes or its binary's path or mtime does,
+so a normal launch answers from the manifest after a few stat calls.
+"""
+
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, Callable, List, Optional
+
+
+MANIFEST_VERSION = 1
+DEFAULT_MANIFEST_PATH = Path.home() / ".cache" / "gui-dtgen" / "toolchain.json"
+
+PROBE_TIMEOUT = 5
+
+# Binary tools and the arguments printing their version
+BINARY_TOOLS = {
+    'git': ['--version'],
+    'cpio': ['--version'],
+    'lz4': ['--version'],
+    'dtc': ['--version'],
+}
+
+# Python packages probed through the import system
+MODULE_TOOLS = ('twrpdtgen',)
+
+TOOL_NAMES = tuple(BINARY_TOOLS) + MODULE_TOOLS
+
+
+def twrpdtgen_requirements(pre_extracted: bool = False) -> List[str]:
+    """
+    Tools twrpdtgen cannot run without: git clones AIK, AIK unpacks with cpio.
+    
+    A pre-extracted image skips AIK; git is still used for the
+    repository twrpdtgen creates in the tree.
+    """
+    if pre_extracted:
+        return ['git']
+    if platform.system() in ('Linux', 'Darwin'):
+        return ['git', 'cpio']
+    return ['git']
+
+
+def _module_origin(name: str) -> Optional[str]:
+    try:
+        spec = importlib.util.find_spec(name)
+    except (ImportError, ValueError):
+        return None
+    if spec is None:
+        return None
+    return spec.origin or (list(spec.submodule_search_locations or [None])[0])
+
+
+def _module_version(name: str) -> Optional[str]:
+    try:
+        from importlib.metadata import version, PackageNotFoundError
+    except ImportError:
+        return None
+    try:
+        return version(name)
+    except PackageNotFoundError:
+        return None
+
+
+def _first_line(text: str) -> Optional[str]:
+    for line in text.splitlines():
+        line = line.strip()
+        if line:
+            return line
+    return None
+
+
+def _probe_binary(path: str, args: List[str], timeout: float) -> Dict[str, Any]:
+    """Run a version probe; only reached for new or changed binaries."""
+    try:
+        result = subprocess.run([path] + args, capture_output=True, text=True,
+                                timeout=timeout, errors='replace')
+    except subprocess.TimeoutExpired:
+        return {'available': True, 'version': None, 'error': f'version probe timed out after {timeout}s'}
+    except OSError as e:
+        return {'available': False, 'version': None, 'error': str(e)}
+    # Some tools print their version to stderr or exit non-zero for it
+    return {'available': True, 'version': _first_line(result.stdout) or _first_line(result.stderr)}
+
+
+class ToolchainRegistry:
+    """
+    Availability, path and version of external tools, probed once.
+    
+    Args:
+        manifest_path: JSON manifest of earlier probes; None keeps
+            results in memory only
+        timeout: Seconds a single version probe may take
+    """
+    
+    def __init__(self, manifest_path: Optional[str] = str(DEFAULT_MANIFEST_PATH),
+                 timeout: float = PROBE_TIMEOUT):
+        self.manifest_path = manifest_path
+        self.timeout = timeout
+        self._tools: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._probed = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def probe(self, force: bool = False) -> Dict[str, Dict[str, Any]]:
+        """
+        Bring every tool's entry up to date.
+        
+        Tools whose path and mtime match the manifest (under the same
+        PATH) are taken from it; the rest are probed in parallel.
+        
+        Args:
+            force: Ignore the manifest and probe everything
+        
+        Returns:
+            Tool name -> dict with available, path, version, mtime
+        """
+        search_path = os.environ.get('PATH', '')
+        previous = {} if force else self._load_manifest(search_path)
+        
+        tools: Dict[str, Dict[str, Any]] = {}
+        to_probe = {}
+        for name, args in BINARY_TOOLS.items():
+            path = shutil.which(name)
+            if path is None:
+                tools[name] = {'available': False, 'path': None, 'version': None, 'mtime': None}
+                continue
+            mtime = os.stat(path).st_mtime_ns
+            known = previous.get(name)
+            if known and known.get('path') == path and known.get('mtime') == mtime:
+                tools[name] = known
+            else:
+                tools[name] = {'available': True, 'path': path, 'version': None, 'mtime': mtime}
+                to_probe[name] = (path, args)
+        
+        for name in MODULE_TOOLS:
+            origin = _module_origin(name)
+            tools[name] = {
+                'available': origin is not None,
+                'path': origin,
+                'version': _module_version(name) if origin else None,
+                'mtime': None,
+            }
+        
+        if to_probe:
+            with ThreadPoolExecutor(max_workers=len(to_probe)) as pool:
+                futures = {name: pool.submit(_probe_binary, path, args, self.timeout)
+                           for name, (path, args) in to_probe.items()}
+                for name, future in futures.items():
+                    tools[name].update(future.result())
+        
+        with self._lock:
+            self._tools = tools
+        self._probed.set()
+        
+        if to_probe or force or not previous:
+            self._save_manifest(search_path, tools)
+        return tools
+    
+    def probe_async(self, callback: Optional[Callable] = None) -> threading.Thread:
+        """
+        Probe in a background thread; callback gets the results.
+        
+        Lookups made meanwhile wait for the probe to finish.
+        """
+        def run():
+            try:
+                tools = self.probe()
+            except Exception:
+                tools = {}
+                self._probed.set()
+            if callback:
+                callback(tools)
+        
+        self._thread = threading.Thread(target=run, name='toolchain-probe', daemon=True)
+        self._thread.start()
+        return self._thread
+    
+    def get(self, name: str) -> Dict[str, Any]:
+        """Entry of a tool, probing first if nothing was probed yet."""
+        if name not in TOOL_NAMES:
+            raise KeyError(f"Unknown tool '{name}'")
+        if not self._probed.is_set():
+            if self._thread is not None:
+                self._probed.wait()
+            else:
+                self.probe()
+        with self._lock:
+            return dict(self._tools.get(name) or {'available': False, 'path': None,
+                                                    'version': None, 'mtime': None})
+    
+    def is_available(self, name: str) -> bool:
+        return self.get(name)['available']
+    
+    def path(self, name: str) -> Optional[str]:
+        return self.get(name)['path']
+    
+    def missing(self, names: Optional[List[str]] = None) -> List[str]:
+        """Tools from names (all known tools by default) that are not installed."""
+        return [name for name in (names or TOOL_NAMES) if not self.is_available(name)]
+    
+    def _load_manifest(self, search_path: str) -> Dict[str, Dict[str, Any]]:
+        if self.manifest_path is None:
+            return {}
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if (data.get('version') != MANIFEST_VERSION or data.get('path') != search_path
+                or data.get('python') != sys.executable):
+            return {}
+        return data.get('tools', {})
+    
+    def _save_manifest(self, search_path: str, tools: Dict[str, Dict[str, Any]]):
+        """Write the manifest atomically; failures only cost a re-probe."""
+        if self.manifest_path is None:
+            return
+        data = {
+            'version': MANIFEST_VERSION,
+            'path': search_path,
+            'python': sys.executable,
+            'tools': tools,
+        }
+        path = Path(self.manifest_path)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=1)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+_default_registry: Optional[ToolchainRegistry] = None
+_default_lock = threading.Lock()
+
+
+def get_toolchain() -> ToolchainRegistry:
+    """Process-wide registry shared by the processor, extractor and GUI."""
+    global _default_registry
+    with _default_lock:
+        if _default_registry is None:
+            _default_registry = ToolchainRegistry()
+        return _default_registry
@@ -8,23 +8,41 @@ Validates that the selected file is a valid boot or recovery image.
 import os
 import mimetypes
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+from .extractors.avb import read_avb_info
+from .extractors.sparse import SPARSE_MAGIC_BYTES, get_sparse_info
+from .extractors.super_image import read_super_info
+from .extractors.payload import PAYLOAD_MAGIC, is_ota_package
+from .extractors.container import is_container
+from .fingerprint import FingerprintService
 
 
 class ImageValidator:
     """Validator for boot/recovery images."""
     
-    VALID_EXTENSIONS = ['.img', '.tar', '.gz', '.lz4', '.zip']
+    VALID_EXTENSIONS = ['.img', '.tar', '.md5', '.gz', '.lz4', '.zip', '.bin']
     MIN_SIZE_MB = 1
     MAX_SIZE_MB = 500
     
     def __init__(self):
         self.magic_bytes = {
             'android_boot': b'ANDROID!',
+            'vendor_boot': b'VNDRBOOT',
+            'sparse': SPARSE_MAGIC_BYTES,
+            'payload': PAYLOAD_MAGIC,
             'gzip': b'\x1f\x8b',
             'lz4': b'\x04\x22\x4d\x18',
             'tar': b'ustar'
         }
+        self._fingerprints = None
+    
+    @property
+    def fingerprints(self) -> FingerprintService:
+        """Fingerprint service, opened on first use."""
+        if self._fingerprints is None:
+            self._fingerprints = FingerprintService()
+        return self._fingerprints
     
     def validate_image(self, filepath: str) -> Dict[str, Any]:
         """
@@ -59,7 +77,8 @@ class ImageValidator:
                 'type': None
             }
         
-        if file_size_mb > self.MAX_SIZE_MB:
+        # OTA packages and firmware archives are read in place, whatever their size
+        if file_size_mb > self.MAX_SIZE_MB and not (is_ota_package(filepath) or is_container(filepath)):
             return {
                 'valid': False,
                 'message': f'File too large ({file_size_mb:.2f} MB). Maximum size: {self.MAX_SIZE_MB} MB',
@@ -97,7 +116,13 @@ class ImageValidator:
             with open(filepath, 'rb') as f:
                 header = f.read(512)
             
-            if self.magic_bytes['android_boot'] in header:
+            if header.startswith(self.magic_bytes['sparse']):
+                return 'Android Sparse Image'
+            elif header.startswith(self.magic_bytes['payload']):
+                return 'A/B OTA Payload'
+            elif header.startswith(self.magic_bytes['vendor_boot']):
+                return 'Android Vendor Boot Image'
+            elif self.magic_bytes['android_boot'] in header:
                 return 'Android Boot Image'
             elif header.startswith(self.magic_bytes['gzip']):
                 return 'GZip Compressed Image'
@@ -110,7 +135,7 @@ class ImageValidator:
                 if extension == '.img':
                     return 'Raw Image File'
                 elif extension == '.zip':
-                    return 'ZIP Archive'
+                    return 'A/B OTA Package' if is_ota_package(filepath) else 'ZIP Archive'
                 else:
                     return 'Unknown Format'
         
@@ -139,5 +164,48 @@ class ImageValidator:
             'size_mb': stat.st_size / (1024 * 1024),
             'modified_time': stat.st_mtime,
             'extension': Path(filepath).suffix.lower(),
-            'type': self._detect_file_type(filepath)
+            'type': self._detect_file_type(filepath),
+            'avb': self._read_avb(filepath),
+            'sparse': self._read_sparse(filepath),
+            'super': self._read_super(filepath),
+            'fingerprint': self._read_fingerprint(filepath)
         }
+    
+    def find_duplicates(self, filepath: str) -> list:
+        """Other previously seen files with the same content."""
+        try:
+            return self.fingerprints.find_duplicates(filepath)
+        except Exception:
+            return []
+    
+    def _read_avb(self, filepath: str) -> Optional[Dict[str, Any]]:
+        """Read the AVB footer/vbmeta of the image, if it has one."""
+        try:
+            return read_avb_info(filepath)
+        except Exception:
+            return None
+    
+    def _read_sparse(self, filepath: str) -> Optional[Dict[str, Any]]:
+        """Read the sparse header and chunk statistics, if the image is sparse."""
+        try:
+            return get_sparse_info(filepath)
+        except Exception:
+            return None
+    
+    def _read_super(self, filepath: str) -> Optional[Dict[str, Any]]:
+        """Read the logical partition table, if the image is a super image."""
+        try:
+            return read_super_info(filepath)
+        except Exception:
+            return None
+    
+    def _read_fingerprint(self, filepath: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the quick fingerprint; the full hash follows in the background.
+        
+        'full' is set once a previous visit has finished hashing.
+        """
+        try:
+            return self.fingerprints.fingerprint(filepath)
+        except Exception:
+            return None
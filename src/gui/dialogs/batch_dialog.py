@@ -1,22 +1,47 @@
 #!/usr/bin/env python3
 """
-Batch Dialog - Batch processing setup
+Batch Dialog - Batch processing of many images
 """
 
+import os
+import threading
+import tkinter as tk
 import customtkinter as ctk
+from tkinter import filedialog, messagebox
+from typing import Dict, Any, List, Optional
+
+from core.batch import BatchProcessor, BatchJob, find_images, plan_workers
+
+STATUS_COLORS = {
+    'queued': 'gray',
+    'running': '#2196F3',
+    'done': '#4CAF50',
+    'failed': '#F44336',
+    'cancelled': 'gray',
+}
 
 
 class BatchDialog(ctk.CTkToplevel):
-    """Batch processing configuration dialog."""
+    """Batch processing dialog: queue images, run them in parallel, follow each job."""
     
-    def __init__(self, parent):
+    def __init__(self, parent, output_dir: Optional[str] = None, generator: str = "twrpdtgen"):
         super().__init__(parent)
         
         self.title("Batch Processing")
         self.geometry("700x600")
         
+        self.paths: List[str] = []
+        self.output_dir = output_dir or "./output"
+        self.generator_var = ctk.StringVar(value="Native" if generator == "native" else "twrpdtgen")
+        self.init_git_var = ctk.BooleanVar(value=True)
+        self.validate_var = ctk.BooleanVar(value=True)
+        self.batch: Optional[BatchProcessor] = None
+        self.rows: Dict[int, Dict[str, Any]] = {}
+        self._closed = False
+        
         self._setup_ui()
         
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
         self.transient(parent)
         self.grab_set()
     
@@ -30,7 +55,7 @@ class BatchDialog(ctk.CTkToplevel):
             text="📊 Batch Processing",
             font=("Helvetica", 16, "bold")
         )
-        title.pack(pady=(0, 20))
+        title.pack(pady=(0, 10))
         
         info = ctk.CTkLabel(
             main_frame,
@@ -39,11 +64,233 @@ class BatchDialog(ctk.CTkToplevel):
         )
         info.pack(pady=(0, 10))
         
-        ctk.CTkLabel(main_frame, text="Feature coming in v1.1!", font=("Helvetica", 12)).pack(pady=20)
+        input_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        input_frame.pack(fill="x", pady=(0, 5))
         
+        ctk.CTkButton(input_frame, text="Add Images", command=self._add_images, width=110).pack(side="left", padx=(0, 10))
+        ctk.CTkButton(input_frame, text="Add Folder", command=self._add_folder, width=110).pack(side="left", padx=(0, 10))
         ctk.CTkButton(
-            main_frame,
+            input_frame,
+            text="Clear",
+            command=self._clear,
+            width=80,
+            fg_color="#8B0000",
+            hover_color="#A52A2A"
+        ).pack(side="left")
+        
+        options_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        options_frame.pack(fill="x", pady=5)
+        
+        ctk.CTkButton(options_frame, text="Output...", command=self._select_output, width=80).pack(side="left", padx=(0, 10))
+        self.output_label = ctk.CTkLabel(options_frame, text=self.output_dir, font=("Helvetica", 10), text_color="gray")
+        self.output_label.pack(side="left")
+        
+        ctk.CTkOptionMenu(
+            options_frame,
+            values=["twrpdtgen", "Native"],
+            variable=self.generator_var,
+            width=110
+        ).pack(side="right")
+        ctk.CTkLabel(options_frame, text="Generator:", font=("Helvetica", 11)).pack(side="right", padx=(10, 5))
+        
+        checks_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        checks_frame.pack(fill="x", pady=5)
+        ctk.CTkCheckBox(checks_frame, text="Initialize Git repositories", variable=self.init_git_var).pack(side="left", padx=(0, 20))
+        ctk.CTkCheckBox(checks_frame, text="Validate device trees", variable=self.validate_var).pack(side="left")
+        
+        self.jobs_frame = ctk.CTkScrollableFrame(main_frame, height=280)
+        self.jobs_frame.pack(fill="both", expand=True, pady=10)
+        self.jobs_frame.columnconfigure(0, weight=1)
+        
+        self.summary_label = ctk.CTkLabel(main_frame, text="No images queued", font=("Helvetica", 11))
+        self.summary_label.pack(anchor="w")
+        
+        button_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        button_frame.pack(side="bottom", fill="x", pady=(10, 0))
+        
+        ctk.CTkButton(
+            button_frame,
             text="Close",
-            command=self.destroy,
+            command=self._on_close,
             width=100
-        ).pack(side="bottom", pady=(20, 0))
+        ).pack(side="right", padx=(10, 0))
+        
+        self.cancel_btn = ctk.CTkButton(
+            button_frame,
+            text="Cancel",
+            command=self._cancel,
+            width=100,
+            state="disabled"
+        )
+        self.cancel_btn.pack(side="right", padx=(10, 0))
+        
+        self.start_btn = ctk.CTkButton(
+            button_frame,
+            text="🚀 Start Batch",
+            command=self._start,
+            width=140,
+            fg_color="#4CAF50",
+            hover_color="#45A049"
+        )
+        self.start_btn.pack(side="right")
+    
+    def _add_images(self):
+        """Queue image files."""
+        filenames = filedialog.askopenfilenames(
+            parent=self,
+            title="Select Boot/Recovery Images",
+            filetypes=[("Image Files", "*.img *.tar *.md5 *.gz *.lz4 *.zip *.bin"), ("All Files", "*.*")]
+        )
+        if filenames:
+            self._queue(list(filenames))
+    
+    def _add_folder(self):
+        """Queue every image found in a folder."""
+        directory = filedialog.askdirectory(parent=self, title="Select Folder With Images")
+        if directory:
+            self._queue([directory])
+    
+    def _queue(self, paths: List[str]):
+        if self.batch is not None:
+            return
+        self.paths = find_images(self.paths + paths)
+        self._show_queue()
+    
+    def _clear(self):
+        if self.batch is not None:
+            return
+        self.paths = []
+        self._show_queue()
+    
+    def _select_output(self):
+        directory = filedialog.askdirectory(parent=self, title="Select Output Directory")
+        if directory:
+            self.output_dir = directory
+            self.output_label.configure(text=directory)
+    
+    def _show_queue(self):
+        """One row per queued image, with the concurrency the batch would get."""
+        for row in self.rows.values():
+            row['frame'].destroy()
+        self.rows = {}
+        
+        for index, path in enumerate(self.paths):
+            self._add_row(index, os.path.basename(path))
+        
+        if self.paths:
+            plan = plan_workers(self.paths)
+            self.summary_label.configure(
+                text=f"{len(self.paths)} images queued, {plan['workers']} at a time"
+            )
+        else:
+            self.summary_label.configure(text="No images queued")
+    
+    def _add_row(self, index: int, name: str):
+        frame = ctk.CTkFrame(self.jobs_frame)
+        frame.grid(row=index, column=0, sticky="ew", pady=2)
+        frame.columnconfigure(1, weight=1)
+        
+        ctk.CTkLabel(frame, text=name, width=160, anchor="w", font=("Helvetica", 11)).grid(
+            row=0, column=0, padx=(10, 5), pady=(4, 0), sticky="w")
+        status = ctk.CTkLabel(frame, text="queued", width=70, anchor="w", text_color=STATUS_COLORS['queued'])
+        status.grid(row=0, column=2, padx=(5, 10), pady=(4, 0))
+        progress = ctk.CTkProgressBar(frame, height=8)
+        progress.grid(row=0, column=1, sticky="ew", padx=5, pady=(4, 0))
+        progress.set(0)
+        message = ctk.CTkLabel(frame, text="", anchor="w", font=("Helvetica", 10), text_color="gray")
+        message.grid(row=1, column=0, columnspan=3, padx=10, pady=(0, 4), sticky="w")
+        
+        self.rows[index] = {'frame': frame, 'status': status, 'progress': progress, 'message': message}
+    
+    def _start(self):
+        """Run the batch in a background thread."""
+        if self.batch is not None:
+            return
+        if not self.paths:
+            messagebox.showwarning("No Images", "Add images or a folder first.", parent=self)
+            return
+        
+        self.batch = BatchProcessor(
+            self.output_dir,
+            generator=self.generator_var.get().lower(),
+            init_git=self.init_git_var.get(),
+            validate=self.validate_var.get()
+        )
+        self._show_queue()
+        self.start_btn.configure(state="disabled", text="⏳ Processing...")
+        self.cancel_btn.configure(state="normal")
+        
+        thread = threading.Thread(target=self._run_batch, args=(self.batch, list(self.paths)), daemon=True)
+        thread.start()
+    
+    def _run_batch(self, batch: BatchProcessor, paths: List[str]):
+        try:
+            result = batch.run(paths, status_callback=self._on_status)
+        except Exception as e:
+            result = {
+                'success': False,
+                'error': str(e)
+            }
+        self._call_in_ui(lambda: self._on_finished(result))
+    
+    def _on_status(self, job: BatchJob, stats: Dict[str, Any]):
+        """Called from the batch threads; hands the update to the Tk loop."""
+        state = (job.index, job.status, job.progress, job.message)
+        self._call_in_ui(lambda: self._show_status(*state, stats))
+    
+    def _call_in_ui(self, callback):
+        """Schedule callback on the Tk loop unless the dialog is gone."""
+        def run():
+            if not self._closed:
+                callback()
+        
+        if self._closed:
+            return
+        try:
+            if self.winfo_exists():
+                self.after(0, run)
+        except tk.TclError:
+            pass
+    
+    def _show_status(self, index: int, status: str, progress: float, message: str, stats: Dict[str, Any]):
+        row = self.rows.get(index)
+        if row is not None:
+            row['status'].configure(text=status, text_color=STATUS_COLORS.get(status, 'gray'))
+            row['progress'].set(progress)
+            row['message'].configure(text=message[:100])
+        
+        self.summary_label.configure(
+            text=(f"{stats['done']} done, {stats['failed']} failed, {stats['running']} running, "
+                  f"{stats['queued']} queued of {stats['total']} · "
+                  f"{stats['images_per_minute']:.1f} images/min · {stats['workers']} workers")
+        )
+    
+    def _on_finished(self, result: Dict[str, Any]):
+        self.batch = None
+        self.start_btn.configure(state="normal", text="🚀 Start Batch")
+        self.cancel_btn.configure(state="disabled")
+        
+        if 'stats' not in result:
+            messagebox.showerror("Batch Failed", result.get('error', 'Unknown error'), parent=self)
+            return
+        
+        stats = result['stats']
+        messagebox.showinfo(
+            "Batch Complete",
+            f"{stats['done']} of {stats['total']} device trees generated "
+            f"({stats['failed']} failed, {stats['cancelled']} cancelled) "
+            f"in {stats['elapsed']:.1f} s, {stats['images_per_minute']:.1f} images/min.\n\n"
+            f"Output: {self.output_dir}",
+            parent=self
+        )
+    
+    def _cancel(self):
+        if self.batch is not None:
+            self.batch.cancel()
+            self.cancel_btn.configure(state="disabled")
+    
+    def _on_close(self):
+        """Cancel queued jobs before closing; running ones finish in the background."""
+        self._closed = True
+        self._cancel()
+        self.destroy()
@@ -15,7 +15,10 @@ import customtkinter as ctk
 from typing import Optional
 
 from core.processor import DeviceTreeProcessor
+from core.kconfig_store import record_results
 from core.validator import ImageValidator
+from core.toolchain import get_toolchain, twrpdtgen_requirements
+from gui.dialogs import BatchDialog
 from utils.logger import Logger
 
 
@@ -28,17 +31,22 @@ class DeviceTreeGeneratorApp:
         self.root.geometry("1000x700")
         self.root.minsize(900, 650)
         
-        self.processor = DeviceTreeProcessor()
+        self.toolchain = get_toolchain()
+        self.processor = DeviceTreeProcessor(toolchain=self.toolchain)
         self.validator = ImageValidator()
         self.logger = Logger()
         
         self.selected_image_path: Optional[str] = None
         self.output_directory: Optional[str] = None
         self.is_processing = False
+        self.probed_tools: Optional[dict] = None
         
         self._setup_ui()
         self._setup_drag_drop()
         
+        # Probe external tools without blocking the window
+        self.toolchain.probe_async(self._on_toolchain_probed)
+        
     def _setup_ui(self):
         """Setup the main user interface."""
         main_container = ctk.CTkFrame(self.root)
@@ -120,6 +128,15 @@ class DeviceTreeGeneratorApp:
         )
         clear_btn.pack(side="left")
         
+        batch_btn = ctk.CTkButton(
+            button_frame,
+            text="Batch...",
+            command=self.open_batch_dialog,
+            width=100,
+            height=35
+        )
+        batch_btn.pack(side="right")
+        
     def _create_options_section(self, parent):
         """Create the options configuration section."""
         options_frame = ctk.CTkFrame(parent)
@@ -170,6 +187,19 @@ class DeviceTreeGeneratorApp:
         )
         tree_dropdown.grid(row=1, column=1, sticky="w", padx=(10, 0), pady=5)
         
+        generator_label = ctk.CTkLabel(content, text="Generator:", font=("Helvetica", 12))
+        generator_label.grid(row=2, column=0, sticky="w", pady=5)
+        
+        self.generator_var = tk.StringVar(value="twrpdtgen")
+        generator_dropdown = ctk.CTkOptionMenu(
+            content,
+            values=["twrpdtgen", "Native"],
+            variable=self.generator_var,
+            width=200
+        )
+        generator_dropdown.grid(row=2, column=1, sticky="w", padx=(10, 0), pady=5)
+        self.generator_var.trace_add("write", lambda *args: self._check_required_tools())
+        
         self.init_git_var = tk.BooleanVar(value=True)
         git_checkbox = ctk.CTkCheckBox(
             content,
@@ -177,7 +207,7 @@ class DeviceTreeGeneratorApp:
             variable=self.init_git_var,
             font=("Helvetica", 11)
         )
-        git_checkbox.grid(row=2, column=0, columnspan=2, sticky="w", pady=5)
+        git_checkbox.grid(row=3, column=0, columnspan=2, sticky="w", pady=5)
         
         self.validate_var = tk.BooleanVar(value=True)
         validate_checkbox = ctk.CTkCheckBox(
@@ -186,7 +216,7 @@ class DeviceTreeGeneratorApp:
             variable=self.validate_var,
             font=("Helvetica", 11)
         )
-        validate_checkbox.grid(row=3, column=0, columnspan=2, sticky="w", pady=5)
+        validate_checkbox.grid(row=4, column=0, columnspan=2, sticky="w", pady=5)
         
     def _create_action_section(self, parent):
         """Create the action buttons section."""
@@ -248,7 +278,7 @@ class DeviceTreeGeneratorApp:
     def select_image(self):
         """Open file dialog to select boot image."""
         file_types = [
-            ("Image Files", "*.img *.tar *.gz *.lz4"),
+            ("Image Files", "*.img *.tar *.md5 *.gz *.lz4 *.zip *.bin"),
             ("All Files", "*.*")
         ]
         
@@ -260,6 +290,14 @@ class DeviceTreeGeneratorApp:
         if filename:
             self.set_selected_image(filename)
     
+    def open_batch_dialog(self):
+        """Open the batch processing dialog with the current output and generator."""
+        BatchDialog(
+            self.root,
+            output_dir=self.output_directory,
+            generator=self.generator_var.get().lower()
+        )
+    
     def select_output_directory(self):
         """Open dialog to select output directory."""
         directory = filedialog.askdirectory(title="Select Output Directory")
@@ -348,7 +386,8 @@ class DeviceTreeGeneratorApp:
                 init_git=self.init_git_var.get(),
                 validate=self.validate_var.get(),
                 progress_callback=self.update_progress,
-                log_callback=self.log_message
+                log_callback=self.log_message,
+                generator=self.generator_var.get().lower()
             )
             
             if result['success']:
@@ -359,6 +398,12 @@ class DeviceTreeGeneratorApp:
                 self.log_message(f"Device: {result.get('device_name', 'Unknown')}")
                 self.log_message("="*60)
                 
+                try:
+                    if record_results([result]):
+                        self.log_message("Kernel config added to the kernel config store")
+                except (OSError, ValueError) as e:
+                    self.log_message(f"Warning: Could not update the kernel config store: {e}")
+                
                 self.root.after(0, lambda: self.show_success(
                     "Generation Complete",
                     f"Device tree successfully generated!\n\nLocation: {result['output_path']}"
@@ -390,6 +435,36 @@ class DeviceTreeGeneratorApp:
                 text="🚀 Generate Device Tree"
             ))
     
+    def _on_toolchain_probed(self, tools: dict):
+        """Report missing external tools once the background probe is done."""
+        self.root.after(0, lambda: self._report_tools(tools))
+    
+    def _report_tools(self, tools: dict):
+        self.probed_tools = tools
+        self._check_required_tools()
+        
+        twrpdtgen_tools = self._twrpdtgen_tools()
+        optional = [name for name, tool in tools.items() if name not in twrpdtgen_tools and not tool['available']]
+        if optional:
+            self.log_message(f"Optional tools not found: {', '.join(optional)}")
+    
+    def _twrpdtgen_tools(self) -> list:
+        """Tools the twrpdtgen generator needs with the processor's engine."""
+        pre_extracted = self.processor.engine.mode != 'subprocess'
+        return ['twrpdtgen'] + twrpdtgen_requirements(pre_extracted=pre_extracted)
+    
+    def _check_required_tools(self):
+        """Warn about missing tools the selected generator cannot run without."""
+        if self.probed_tools is None:
+            return
+        
+        # The native generator runs entirely in-process
+        generator = self.generator_var.get()
+        required = [] if generator.lower() == "native" else self._twrpdtgen_tools()
+        missing = [name for name in required if not self.probed_tools.get(name, {}).get('available')]
+        if missing:
+            self.log_message(f"Warning: tools required by {generator} not found: {', '.join(missing)}")
+    
     def update_progress(self, value: float, message: str = ""):
         """Update progress bar and message."""
         def update():
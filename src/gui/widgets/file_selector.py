@@ -93,7 +93,7 @@ class FileSelector(ctk.CTkFrame):
     def browse_file(self):
         """Open file browser dialog."""
         file_types = [
-            ("Image Files", "*.img *.tar *.gz *.lz4 *.zip"),
+            ("Image Files", "*.img *.tar *.md5 *.gz *.lz4 *.zip *.bin"),
             ("All Files", "*.*")
         ]
         
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Kernel Config CLI - Query kernel configs across devices
+
+Command line front end for the kernel config store: collect configs from
+boot images, kernels or .config files, then ask set and diff questions
+across the whole corpus.
+
+Examples:
+    dtgen-kconfig add boot.img --name xiaomi/alioth
+    dtgen-kconfig query EXT4_ENCRYPTION=y "CONFIG_KASAN!=y"
+    dtgen-kconfig values CONFIG_HZ
+    dtgen-kconfig diff xiaomi/alioth oneplus/kebab
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+from core.kconfig_store import KernelConfigStore, DEFAULT_STORE_PATH
+from core.kernel import KernelAnalyzer, parse_kernel_config
+
+
+def load_config(path: str):
+    """Read a config from a .config file, a boot image or a kernel image."""
+    with open(path, 'rb') as f:
+        head = f.read(64)
+    
+    if head.startswith((b'#', b'CONFIG_')):
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            return parse_kernel_config(f.read())
+    
+    analyzer = KernelAnalyzer()
+    result = analyzer.analyze_image(path) if head.startswith(b'ANDROID!') else analyzer.analyze_file(path)
+    if not result['success']:
+        raise ValueError(result['error'])
+    if not result['has_config']:
+        raise ValueError("kernel was built without CONFIG_IKCONFIG")
+    return result['config']
+
+
+def cmd_add(store: KernelConfigStore, args) -> int:
+    if args.name and len(args.paths) > 1:
+        print("Error: --name can only be used with a single input", file=sys.stderr)
+        return 1
+    
+    failed = 0
+    for path in args.paths:
+        name = args.name or Path(path).stem
+        try:
+            config = load_config(path)
+        except Exception as e:
+            print(f"{path}: {e}", file=sys.stderr)
+            failed += 1
+            continue
+        store.add_device(name, config)
+        print(f"{name}: {len(config)} symbols")
+    
+    store.save(args.store)
+    return 1 if failed else 0
+
+
+def cmd_remove(store: KernelConfigStore, args) -> int:
+    for name in args.devices:
+        if name not in store:
+            print(f"Unknown device: {name}", file=sys.stderr)
+            return 1
+        store.remove_device(name)
+    store.save(args.store)
+    return 0
+
+
+def cmd_list(store: KernelConfigStore, args) -> int:
+    for name in store.devices:
+        print(name)
+    return 0
+
+
+def cmd_query(store: KernelConfigStore, args) -> int:
+    devices = store.query(args.conditions, match_any=args.any)
+    for name in devices:
+        print(name)
+    if args.count:
+        print(f"{len(devices)}/{len(store)} devices")
+    return 0
+
+
+def cmd_values(store: KernelConfigStore, args) -> int:
+    groups = store.distribution(args.symbol)
+    for value, devices in sorted(groups.items(), key=lambda item: -len(item[1])):
+        print(f"{value}: {len(devices)}")
+        if args.verbose:
+            for name in devices:
+                print(f"    {name}")
+    return 0
+
+
+def cmd_diff(store: KernelConfigStore, args) -> int:
+    for name in (args.device_a, args.device_b):
+        if name not in store:
+            print(f"Unknown device: {name}", file=sys.stderr)
+            return 1
+    
+    for symbol, (a, b) in sorted(store.diff(args.device_a, args.device_b).items()):
+        print(f"{symbol}: {a if a is not None else '-'} -> {b if b is not None else '-'}")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='dtgen-kconfig',
+        description='Query kernel configs across devices'
+    )
+    parser.add_argument('--store', default=str(DEFAULT_STORE_PATH),
+                        help=f'Store file (default: {DEFAULT_STORE_PATH})')
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    add = commands.add_parser('add', help='Add configs from boot images, kernels or .config files')
+    add.add_argument('paths', nargs='+')
+    add.add_argument('--name', help='Device name (default: file name)')
+    add.set_defaults(handler=cmd_add)
+    
+    remove = commands.add_parser('remove', help='Remove devices')
+    remove.add_argument('devices', nargs='+')
+    remove.set_defaults(handler=cmd_remove)
+    
+    listing = commands.add_parser('list', help='List devices')
+    listing.set_defaults(handler=cmd_list)
+    
+    query = commands.add_parser('query', help='List devices matching SYMBOL[=|!=VALUE] conditions')
+    query.add_argument('conditions', nargs='+')
+    query.add_argument('--any', action='store_true', help='Match any condition instead of all')
+    query.add_argument('--count', action='store_true', help='Print the number of matches')
+    query.set_defaults(handler=cmd_query)
+    
+    values = commands.add_parser('values', help='Show how devices set a symbol')
+    values.add_argument('symbol')
+    values.add_argument('-v', '--verbose', action='store_true', help='List the devices per value')
+    values.set_defaults(handler=cmd_values)
+    
+    diff = commands.add_parser('diff', help='Show symbols that differ between two devices')
+    diff.add_argument('device_a')
+    diff.add_argument('device_b')
+    diff.set_defaults(handler=cmd_diff)
+    
+    return parser
+
+
+def main(argv=None) -> int:
+    """Kernel config CLI entry point."""
+    args = build_parser().parse_args(argv)
+    try:
+        store = KernelConfigStore.load(args.store)
+        return args.handler(store, args)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,6 +9,7 @@ License: MIT
 
 import sys
 import os
+import multiprocessing
 import tkinter as tk
 from pathlib import Path
 
@@ -55,4 +56,6 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
+    # Batch workers of the frozen executable start through here
+    multiprocessing.freeze_support()
     main()